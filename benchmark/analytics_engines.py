@@ -0,0 +1,36 @@
+"""
+Compares analytics engines on the same dataset (current content of
+kannact.biometrics). Usage:
+
+    python -m benchmark.analytics_engines --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+from src.etl.infrastructure.biometrics_analytics_batch import \
+    BiometricsAnalyticsBatch
+
+ENGINES = ["pandas", "sql", "partitioned", "streaming"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=ENGINES)
+    args = parser.parse_args()
+
+    batch = BiometricsAnalyticsBatch()
+    print(f"{'engine':<12}{'best (s)':>12}{'median (s)':>12}")
+    for engine in args.engines:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            batch.calculate_metrics(engine=engine)
+            timings.append(time.perf_counter() - start)
+        print(f"{engine:<12}{min(timings):>12.3f}"
+              f"{statistics.median(timings):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
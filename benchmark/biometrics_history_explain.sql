@@ -0,0 +1,121 @@
+-- Plans of a history page (get_biometrics) on 100M biometrics with the
+-- previous index, the patient covering index and hash partitions.
+-- Tables are created in a separate schema. Usage:
+--
+--     psql -h <host> -U postgres -d kannact \
+--         -f benchmark/biometrics_history_explain.sql
+--
+-- Size can be changed with -v rows=<n> -v patients=<n>.
+
+\if :{?rows}
+\else
+    \set rows 100000000
+\endif
+\if :{?patients}
+\else
+    \set patients 100000
+\endif
+\timing on
+
+CREATE SCHEMA IF NOT EXISTS kannact_benchmark;
+DROP TABLE IF EXISTS kannact_benchmark.biometrics_previous_index,
+    kannact_benchmark.biometrics_covering_index,
+    kannact_benchmark.biometrics_partitioned;
+
+-- Readings of a patient are spread over the table, as when they arrive
+CREATE UNLOGGED TABLE kannact_benchmark.biometrics_previous_index AS
+SELECT (random() * (:patients - 1))::bigint + 1 AS patient_id,
+       biometrics_id,
+       date '2020-01-01' + (biometrics_id % 1500)::int AS test_date,
+       (70 + random() * 150)::smallint AS glucose,
+       (90 + random() * 80)::smallint AS systolic,
+       (50 + random() * 40)::smallint AS diastolic,
+       (50000 + random() * 50000)::integer AS weight
+FROM generate_series(1, :rows) AS biometrics_id;
+
+ALTER TABLE kannact_benchmark.biometrics_previous_index
+    ADD PRIMARY KEY (biometrics_id);
+CREATE INDEX ON kannact_benchmark.biometrics_previous_index
+    (biometrics_id DESC NULLS LAST, test_date DESC NULLS LAST);
+
+CREATE UNLOGGED TABLE kannact_benchmark.biometrics_covering_index AS
+SELECT * FROM kannact_benchmark.biometrics_previous_index;
+ALTER TABLE kannact_benchmark.biometrics_covering_index
+    ADD PRIMARY KEY (biometrics_id);
+CREATE INDEX ON kannact_benchmark.biometrics_covering_index
+    (patient_id, biometrics_id, test_date)
+    INCLUDE (glucose, systolic, diastolic, weight);
+
+CREATE UNLOGGED TABLE kannact_benchmark.biometrics_partitioned
+(LIKE kannact_benchmark.biometrics_previous_index)
+PARTITION BY HASH (patient_id);
+DO $$
+BEGIN
+    FOR remainder IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE UNLOGGED TABLE kannact_benchmark.biometrics_p%s '
+            'PARTITION OF kannact_benchmark.biometrics_partitioned '
+            'FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            remainder, remainder
+        );
+    END LOOP;
+END
+$$;
+INSERT INTO kannact_benchmark.biometrics_partitioned
+SELECT * FROM kannact_benchmark.biometrics_previous_index;
+ALTER TABLE kannact_benchmark.biometrics_partitioned
+    ADD PRIMARY KEY (patient_id, biometrics_id);
+CREATE INDEX ON kannact_benchmark.biometrics_partitioned
+    (patient_id, biometrics_id, test_date)
+    INCLUDE (glucose, systolic, diastolic, weight);
+
+VACUUM ANALYZE kannact_benchmark.biometrics_previous_index;
+VACUUM ANALYZE kannact_benchmark.biometrics_covering_index;
+VACUUM ANALYZE kannact_benchmark.biometrics_partitioned;
+
+-- Same query as PostgreSQLBiometricsRepository.get_biometrics, second
+-- page of a patient
+PREPARE history_previous_index AS
+SELECT patient_id, biometrics_id, test_date, glucose, systolic, diastolic,
+weight
+FROM kannact_benchmark.biometrics_previous_index
+WHERE patient_id=$1 AND (biometrics_id, test_date) > ($2, $3)
+ORDER BY biometrics_id, test_date LIMIT $4;
+
+PREPARE history_covering_index AS
+SELECT patient_id, biometrics_id, test_date, glucose, systolic, diastolic,
+weight
+FROM kannact_benchmark.biometrics_covering_index
+WHERE patient_id=$1 AND (biometrics_id, test_date) > ($2, $3)
+ORDER BY biometrics_id, test_date LIMIT $4;
+
+PREPARE history_partitioned AS
+SELECT patient_id, biometrics_id, test_date, glucose, systolic, diastolic,
+weight
+FROM kannact_benchmark.biometrics_partitioned
+WHERE patient_id=$1 AND (biometrics_id, test_date) > ($2, $3)
+ORDER BY biometrics_id, test_date LIMIT $4;
+
+SELECT biometrics_id AS page_biometrics_id, test_date AS page_test_date
+FROM kannact_benchmark.biometrics_covering_index
+WHERE patient_id = 42
+ORDER BY biometrics_id, test_date
+OFFSET 9 LIMIT 1 \gset
+
+-- Expected: scan of the biometrics_id index filtering other patients
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+EXECUTE history_previous_index(42, :page_biometrics_id,
+                               :'page_test_date', 10);
+
+-- Expected: Index Only Scan, Heap Fetches: 0
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+EXECUTE history_covering_index(42, :page_biometrics_id,
+                               :'page_test_date', 10);
+
+-- Expected: a single partition scanned (Subplans Removed with generic
+-- plans)
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+EXECUTE history_partitioned(42, :page_biometrics_id,
+                            :'page_test_date', 10);
+
+-- DROP SCHEMA kannact_benchmark CASCADE;
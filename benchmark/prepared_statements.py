@@ -0,0 +1,75 @@
+"""
+Latency of the hot read queries (biometrics page, patients page and
+analytics of a patient) with and without prepared statements, run by
+concurrent threads sharing a connection pool. Usage:
+
+    python -m benchmark.prepared_statements --threads 8 --requests 2000
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.etl.infrastructure.postgresql_biometrics_repository import \
+    PostgreSQLBiometricsRepository
+from src.etl.infrastructure.postgresql_connection_pool import \
+    PostgreSQLConnectionPool
+from src.etl.infrastructure.postgresql_patient_repository import \
+    PostgreSQLPatientRepository
+
+
+def run(prepare_statements: bool, threads: int, requests: int,
+        patient_ids: list[int]) -> tuple[list[float], dict]:
+    pool = PostgreSQLConnectionPool(max_size=threads,
+                                    prepare_statements=prepare_statements)
+    biometrics_repository = PostgreSQLBiometricsRepository(pool)
+    patient_repository = PostgreSQLPatientRepository(pool)
+    queries = [
+        lambda patient_id: biometrics_repository.get_biometrics(patient_id),
+        lambda patient_id: patient_repository.get_patients(patient_id),
+        lambda patient_id: biometrics_repository.get_biometrics_analytics(
+            patient_id),
+    ]
+
+    def request(i: int) -> float:
+        start = time.perf_counter()
+        queries[i % len(queries)](random.choice(patient_ids))
+        return time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = list(executor.map(request, range(requests)))
+        return latencies, pool.stats()
+    finally:
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    patient_id_range = PostgreSQLBiometricsRepository().get_patient_id_range()
+    if patient_id_range is None:
+        raise SystemExit("kannact.biometrics is empty")
+    patient_ids = list(range(patient_id_range[0], patient_id_range[1] + 1))
+
+    print(f"{'mode':<12}{'p50 (ms)':>12}{'p95 (ms)':>12}{'req/s':>12}"
+          f"{'prepares':>12}{'executes':>12}")
+    for prepare_statements in [False, True]:
+        start = time.perf_counter()
+        latencies, stats = run(prepare_statements, args.threads,
+                               args.requests, patient_ids)
+        elapsed = time.perf_counter() - start
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+        mode = "prepared" if prepare_statements else "plain"
+        print(f"{mode:<12}{statistics.median(latencies_ms):>12.3f}"
+              f"{p95:>12.3f}{len(latencies) / elapsed:>12.1f}"
+              f"{stats['prepares']:>12}{stats['prepared_executes']:>12}")
+
+
+if __name__ == "__main__":
+    main()
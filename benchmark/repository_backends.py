@@ -0,0 +1,145 @@
+"""
+Service and ETL cost without the database: the same workloads run on the
+in-memory, SQLite and (optionally) PostgreSQL repositories, so the time
+spent in the application layers can be told apart from the time spent in
+the database. Synthetic biometrics are loaded into the in process
+backends, PostgreSQL uses the rows already stored (nothing is loaded, but
+the analytics tables are written).
+Usage:
+
+    python -m benchmark.repository_backends --patients 10000 --rows 1000000
+    python -m benchmark.repository_backends --backends memory postgresql
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date
+
+import numpy as np
+from pandas import DataFrame, Timestamp, to_timedelta
+
+from src.etl.application.biometrics_service import BiometricsService
+from src.etl.domain.biometrics_repository import IBiometricsRepository
+from src.etl.domain.patient import Patient
+from src.etl.domain.patient_repository import IPatientRepository
+from src.etl.infrastructure.in_memory_biometrics_repository import \
+    InMemoryBiometricsRepository
+from src.etl.infrastructure.in_memory_patient_repository import \
+    InMemoryPatientRepository
+from src.etl.infrastructure.sqlite_biometrics_repository import \
+    SQLiteBiometricsRepository
+from src.etl.infrastructure.sqlite_database import SQLiteDatabase
+from src.etl.infrastructure.sqlite_patient_repository import \
+    SQLitePatientRepository
+
+
+def in_memory_repositories() -> tuple[IBiometricsRepository,
+                                      IPatientRepository]:
+    patient_repo = InMemoryPatientRepository()
+    return InMemoryBiometricsRepository(patient_repo), patient_repo
+
+
+def sqlite_repositories() -> tuple[IBiometricsRepository, IPatientRepository]:
+    database = SQLiteDatabase()
+    return (SQLiteBiometricsRepository(database),
+            SQLitePatientRepository(database))
+
+
+def postgresql_repositories() -> tuple[IBiometricsRepository,
+                                       IPatientRepository]:
+    from src.etl.infrastructure.postgresql_biometrics_repository import \
+        PostgreSQLBiometricsRepository
+    from src.etl.infrastructure.postgresql_patient_repository import \
+        PostgreSQLPatientRepository
+    return PostgreSQLBiometricsRepository(), PostgreSQLPatientRepository()
+
+
+BACKENDS = {
+    "memory": in_memory_repositories,
+    "sqlite": sqlite_repositories,
+    "postgresql": postgresql_repositories,
+}
+
+
+def synthetic_patients(patients: int) -> list[Patient]:
+    return [Patient(name=f"Patient {i}", date_of_birth=date(1980, 1, 1),
+                    gender="female", address=f"Main street {i}",
+                    email=f"patient{i}@example.com", phone="555-0100",
+                    sex="female")
+            for i in range(patients)]
+
+
+def synthetic_biometrics(patients: int, rows: int, seed: int) -> DataFrame:
+    generator = np.random.default_rng(seed)
+    systolic = generator.integers(90, 180, rows)
+    return DataFrame({
+        "patient_id": generator.integers(1, patients + 1, rows),
+        "test_date": Timestamp("2024-01-01") + to_timedelta(
+            generator.integers(0, 365, rows), unit="D"),
+        "glucose": generator.integers(70, 250, rows),
+        "systolic": systolic,
+        "diastolic": systolic - generator.integers(20, 50, rows),
+        "weight": generator.integers(40000, 150000, rows),
+    })
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def page_latencies(service: BiometricsService, patient_ids: list[int],
+                   requests: int) -> list[float]:
+    return sorted(
+        timed(lambda: service.get_biometrics(random.choice(patient_ids),
+                                             weight_unit="metric"))
+        for _ in range(requests)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"],
+                        choices=list(BACKENDS))
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    patients = synthetic_patients(args.patients)
+    df = synthetic_biometrics(args.patients, args.rows, args.seed)
+    random.seed(args.seed)
+    print(f"{'backend':<12}{'load (s)':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}"
+          f"{'streaming (s)':>15}{'incremental (s)':>17}")
+    for backend in args.backends:
+        repository, patient_repository = BACKENDS[backend]()
+        service = BiometricsService(biometrics_repo=repository)
+        load = None
+        if backend != "postgresql":
+            # Biometrics reference patients (ids 1 to --patients)
+            patient_repository.copy_patients(patients)
+            load = timed(lambda: repository.copy_biometrics_dataframe(df))
+
+        patient_id_range = repository.get_patient_id_range()
+        if patient_id_range is None:
+            print(f"{backend:<12} no biometrics")
+            continue
+        latencies = page_latencies(
+            service, list(range(patient_id_range[0], patient_id_range[1] + 1)),
+            args.requests
+        )
+        streaming = timed(service.calculate_biometrics_analytics_streaming)
+        incremental = timed(service.update_biometrics_analytics_incremental)
+
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        print(f"{backend:<12}"
+              f"{'-' if load is None else f'{load:.2f}':>10}"
+              f"{statistics.median(latencies) * 1000:>10.3f}{p95:>10.3f}"
+              f"{streaming:>15.2f}{incremental:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,5 @@ from src.etl.infrastructure.biometrics_analytics_batch import \
 
 biometrics_analytics_batch = BiometricsAnalyticsBatch()
 biometrics_analytics_batch.calculate_metrics()
+biometrics_analytics_batch.calculate_window_metrics()
+biometrics_analytics_batch.calculate_percentiles()
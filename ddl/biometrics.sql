@@ -22,12 +22,13 @@ TABLESPACE pg_default;
 
 ALTER TABLE IF EXISTS kannact.biometrics
     OWNER to postgres;
--- Index: biometrics_pagination_index
+-- Index: biometrics_patient_pagination_index
+-- History pages of a patient, metrics included for index only scans
 
-DROP INDEX IF EXISTS kannact.biometrics_pagination_index;
+DROP INDEX IF EXISTS kannact.biometrics_patient_pagination_index;
 
-CREATE INDEX IF NOT EXISTS biometrics_pagination_index
+CREATE INDEX IF NOT EXISTS biometrics_patient_pagination_index
     ON kannact.biometrics USING btree
-    (biometrics_id DESC NULLS LAST, test_date DESC NULLS LAST)
-    WITH (deduplicate_items=True)
+    (patient_id ASC, biometrics_id ASC, test_date ASC)
+    INCLUDE (glucose, systolic, diastolic, weight)
     TABLESPACE pg_default;
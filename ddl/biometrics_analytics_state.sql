@@ -0,0 +1,49 @@
+-- Table: kannact.biometrics_analytics_state
+-- Running aggregates used by incremental analytics,
+-- mean is calculated as sum / count
+
+-- DROP TABLE IF EXISTS kannact.biometrics_analytics_state;
+
+CREATE TABLE IF NOT EXISTS kannact.biometrics_analytics_state
+(
+    patient_id bigint NOT NULL,
+    glucose_count bigint,
+    glucose_sum bigint,
+    glucose_min integer,
+    glucose_max integer,
+    systolic_count bigint,
+    systolic_sum bigint,
+    systolic_min integer,
+    systolic_max integer,
+    diastolic_count bigint,
+    diastolic_sum bigint,
+    diastolic_min integer,
+    diastolic_max integer,
+    weight_count bigint,
+    weight_sum bigint,
+    weight_min integer,
+    weight_max integer,
+    CONSTRAINT biometrics_analytics_state_pkey PRIMARY KEY (patient_id)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS kannact.biometrics_analytics_state
+    OWNER to postgres;
+
+-- Table: kannact.biometrics_watermark
+-- Last biometrics_id processed by each incremental job
+
+-- DROP TABLE IF EXISTS kannact.biometrics_watermark;
+
+CREATE TABLE IF NOT EXISTS kannact.biometrics_watermark
+(
+    job_name text COLLATE pg_catalog."default" NOT NULL,
+    biometrics_id bigint NOT NULL,
+    CONSTRAINT biometrics_watermark_pkey PRIMARY KEY (job_name)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS kannact.biometrics_watermark
+    OWNER to postgres;
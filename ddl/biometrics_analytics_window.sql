@@ -0,0 +1,40 @@
+-- Table: kannact.biometrics_analytics_window
+-- Rolling windows (7, 30 and 90 days) ending at as_of
+
+-- DROP TABLE IF EXISTS kannact.biometrics_analytics_window;
+
+CREATE TABLE IF NOT EXISTS kannact.biometrics_analytics_window
+(
+    patient_id bigint NOT NULL,
+    window_days smallint NOT NULL,
+    as_of date NOT NULL,
+    glucose_mean integer,
+    glucose_min integer,
+    glucose_max integer,
+    systolic_mean integer,
+    systolic_min integer,
+    systolic_max integer,
+    diastolic_mean integer,
+    diastolic_min integer,
+    diastolic_max integer,
+    weight_mean integer,
+    weight_min integer,
+    weight_max integer,
+    CONSTRAINT biometrics_analytics_window_pkey 
+        PRIMARY KEY (patient_id, window_days)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS kannact.biometrics_analytics_window
+    OWNER to postgres;
+
+-- Index: biometrics_test_date_index
+-- Windows only read recent biometrics
+
+DROP INDEX IF EXISTS kannact.biometrics_test_date_index;
+
+CREATE INDEX IF NOT EXISTS biometrics_test_date_index
+    ON kannact.biometrics USING btree
+    (test_date ASC NULLS LAST)
+    TABLESPACE pg_default;
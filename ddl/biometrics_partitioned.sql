@@ -0,0 +1,80 @@
+-- Migration (optional): hash partitioning of kannact.biometrics by
+-- patient_id. Queries filtering by patient_id only read one partition.
+-- The table is rebuilt, run it in a maintenance window. Requires
+-- PostgreSQL 15 or newer (MERGE on partitioned tables).
+
+BEGIN;
+
+-- New sequence, kannact.biometrics_biometrics_id_seq belongs to the
+-- identity column of the current table (and is dropped with it)
+CREATE SEQUENCE kannact.biometrics_partitioned_biometrics_id_seq
+    AS bigint;
+
+CREATE TABLE kannact.biometrics_partitioned
+(
+    patient_id bigint NOT NULL,
+    -- Identity columns are not supported in partitioned tables before
+    -- PostgreSQL 17, a sequence keeps ids unique across partitions
+    biometrics_id bigint NOT NULL
+        DEFAULT nextval('kannact.biometrics_partitioned_biometrics_id_seq'),
+    test_date date,
+    glucose smallint,
+    systolic smallint,
+    diastolic smallint,
+    weight integer,
+    -- Primary keys of partitioned tables must contain the partition key
+    CONSTRAINT biometrics_partitioned_pkey
+        PRIMARY KEY (patient_id, biometrics_id),
+    CONSTRAINT biometrics_partitioned_patient_id FOREIGN KEY (patient_id)
+        REFERENCES kannact.patients (patient_id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+) PARTITION BY HASH (patient_id);
+
+DO $$
+BEGIN
+    FOR remainder IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE kannact.biometrics_p%s '
+            'PARTITION OF kannact.biometrics_partitioned '
+            'FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            remainder, remainder
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO kannact.biometrics_partitioned
+(patient_id, biometrics_id, test_date, glucose, systolic, diastolic, weight)
+SELECT patient_id, biometrics_id, test_date, glucose, systolic, diastolic, 
+weight
+FROM kannact.biometrics;
+
+SELECT setval('kannact.biometrics_partitioned_biometrics_id_seq',
+              coalesce(max(biometrics_id), 0) + 1, false)
+FROM kannact.biometrics_partitioned;
+ALTER SEQUENCE kannact.biometrics_partitioned_biometrics_id_seq
+    OWNED BY kannact.biometrics_partitioned.biometrics_id;
+
+-- Created once on the parent, one index per partition
+CREATE INDEX biometrics_partitioned_pagination_index
+    ON kannact.biometrics_partitioned USING btree
+    (patient_id ASC, biometrics_id ASC, test_date ASC)
+    INCLUDE (glucose, systolic, diastolic, weight);
+
+CREATE INDEX biometrics_partitioned_test_date_index
+    ON kannact.biometrics_partitioned USING btree
+    (test_date ASC NULLS LAST);
+
+ALTER TABLE kannact.biometrics RENAME TO biometrics_unpartitioned;
+ALTER TABLE kannact.biometrics_partitioned RENAME TO biometrics;
+
+ALTER TABLE IF EXISTS kannact.biometrics
+    OWNER to postgres;
+
+COMMIT;
+
+ANALYZE kannact.biometrics;
+
+-- Once checked
+-- DROP TABLE kannact.biometrics_unpartitioned;
@@ -0,0 +1,16 @@
+-- Migration: patient scoped covering index for kannact.biometrics
+-- History pages filter by patient_id and paginate by (biometrics_id,
+-- test_date), metrics are included so pages are read with index only
+-- scans. CONCURRENTLY does not block writes, run it outside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS biometrics_patient_pagination_index
+    ON kannact.biometrics USING btree
+    (patient_id ASC, biometrics_id ASC, test_date ASC)
+    INCLUDE (glucose, systolic, diastolic, weight)
+    TABLESPACE pg_default;
+
+-- Pagination is always scoped to a patient, ranges of biometrics_id use
+-- the primary key
+DROP INDEX CONCURRENTLY IF EXISTS kannact.biometrics_pagination_index;
+
+ANALYZE kannact.biometrics;
@@ -0,0 +1,19 @@
+-- Table: kannact.biometrics_sketch
+-- Per patient quantile sketches (serialized HistogramSketch), folded
+-- incrementally using the 'biometrics_percentiles' watermark
+
+-- DROP TABLE IF EXISTS kannact.biometrics_sketch;
+
+CREATE TABLE IF NOT EXISTS kannact.biometrics_sketch
+(
+    patient_id bigint NOT NULL,
+    glucose bytea,
+    systolic bytea,
+    diastolic bytea,
+    CONSTRAINT biometrics_sketch_pkey PRIMARY KEY (patient_id)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS kannact.biometrics_sketch
+    OWNER to postgres;
@@ -1,12 +1,25 @@
+from contextlib import asynccontextmanager
 from typing import Any
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
+from kink import di
 
+from src.etl.infrastructure.asyncpg_connection_pool import \
+    AsyncPGConnectionPool
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
 from src.etl.infrastructure.controller import router as patient_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await di[AsyncPGConnectionPool].close()
+    await di[AsyncPGReadRouter].close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(patient_router)
 
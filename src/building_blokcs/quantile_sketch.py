@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class HistogramSketch:
+    """
+    Quantile sketch for integers in a bounded range [low, high], one
+    counter per value. Sketches of the same range are merged adding their
+    counters, so partial sketches (new readings, parallel workers) can be
+    combined in any order. Quantiles are exact and their cost only depends
+    on the range size. Values out of the range are clipped.
+    """
+
+    def __init__(self, low: int, high: int, counts: np.ndarray | None = None):
+        self.low = low
+        self.high = high
+        self._counts = (np.zeros(high - low + 1, dtype=np.int64)
+                        if counts is None else counts.astype(np.int64))
+
+    def add(self, values, counts=None):
+        """
+        Adds values (array-like of integers), optionally with how many
+        times each one was seen.
+        """
+        positions = np.clip(np.asarray(values, dtype=np.int64),
+                            self.low, self.high) - self.low
+        self._counts += np.bincount(positions, weights=counts,
+                                    minlength=len(self._counts)).astype(
+            np.int64)
+
+    def merge(self, other: "HistogramSketch") -> "HistogramSketch":
+        if (self.low, self.high) != (other.low, other.high):
+            raise ValueError("Only sketches of the same range can be merged")
+        return HistogramSketch(self.low, self.high,
+                               self._counts + other._counts)
+
+    def __len__(self) -> int:
+        return int(self._counts.sum())
+
+    def quantile(self, q: float) -> int | None:
+        """
+        Nearest-rank quantile (q between 0 and 1), None if empty.
+        """
+        total = len(self)
+        if not total:
+            return None
+        rank = max(int(np.ceil(q * total)), 1)
+        position = np.searchsorted(np.cumsum(self._counts), rank)
+        return int(position) + self.low
+
+    def to_bytes(self) -> bytes:
+        """
+        Sparse format, number of values seen (uint32) followed by their
+        offsets (uint32) and counts (uint32), little endian.
+        """
+        offsets = np.flatnonzero(self._counts)
+        return (len(offsets).to_bytes(4, "little")
+                + offsets.astype("<u4").tobytes()
+                + self._counts[offsets].astype("<u4").tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, low: int, high: int) -> "HistogramSketch":
+        size = int.from_bytes(data[:4], "little")
+        offsets = np.frombuffer(data, dtype="<u4", count=size, offset=4)
+        counts = np.frombuffer(data, dtype="<u4", count=size,
+                               offset=4 + 4 * size)
+        sketch = cls(low, high)
+        sketch._counts[offsets] = counts
+        return sketch
@@ -1,3 +1,8 @@
+import numpy as np
+from pandas import Series, to_numeric
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+
 def pounds_to_grams(value: float) -> int:
     return int(value * 453.59237)
 
@@ -13,3 +18,67 @@ def grams_to_pounds(value: float) -> float:
 def grams_to_kilograms(value: float) -> float:
     return value / 1000
 
+
+GRAMS_PER_POUND = 453.59237
+GRAMS_PER_KILOGRAM = 1000
+
+# Aliases accepted as unit (lower case), weight_unit values are included
+_WEIGHT_UNITS = {
+    "metric": GRAMS_PER_KILOGRAM,
+    "kg": GRAMS_PER_KILOGRAM,
+    "kgs": GRAMS_PER_KILOGRAM,
+    "kilogram": GRAMS_PER_KILOGRAM,
+    "kilograms": GRAMS_PER_KILOGRAM,
+    "imperial": GRAMS_PER_POUND,
+    "lb": GRAMS_PER_POUND,
+    "lbs": GRAMS_PER_POUND,
+    "pound": GRAMS_PER_POUND,
+    "pounds": GRAMS_PER_POUND,
+    "g": 1,
+    "gr": 1,
+    "gram": 1,
+    "grams": 1,
+}
+
+_SUFFIXED_VALUE_PATTERN = (r"^\s*([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)"
+                           r"(?:[eE][+-]?[0-9]+)?)\s*([a-zA-Z]*)\s*$")
+
+
+def normalize_weight_to_grams(
+        values: Series, units: Series | str | None = None,
+        default_unit: str = "metric"
+) -> Series:
+    """
+    Converts a weight column to grams in one pass. Values can be numbers or
+    strings with a unit suffix ("160 lb", "72.5kg"). Unit is taken from
+    the suffix, then from units (per row column or a single unit) and
+    finally from default_unit. Values with an unknown unit or that can not
+    be parsed are returned as NaN. Non metric default units are treated
+    as pounds like pounds_to_grams does.
+    Truncation is the same as the scalar functions.
+    """
+    if is_numeric_dtype(values) and not is_bool_dtype(values):
+        numbers = values.astype(float)
+        suffixes = Series(None, index=values.index, dtype=object)
+    else:
+        parts = values.astype(str).str.extract(_SUFFIXED_VALUE_PATTERN)
+        numeric = values.map(
+            lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)
+        )
+        numbers = to_numeric(parts[0], errors="coerce").astype(float)
+        numbers[numeric] = values[numeric].astype(float)
+        suffixes = parts[1].where(parts[1] != "").where(~numeric)
+
+    default_factor = _WEIGHT_UNITS.get(default_unit.lower(), GRAMS_PER_POUND)
+    factors = Series(default_factor, index=values.index, dtype=float)
+    if isinstance(units, Series):
+        row_units = units.where(units.notna() & (units.astype(str) != ""))
+        factors = row_units.astype(str).str.strip().str.lower().map(
+            _WEIGHT_UNITS).where(row_units.notna(), factors)
+    elif units is not None:
+        factors[:] = _WEIGHT_UNITS.get(units.lower(), np.nan)
+    factors = suffixes.str.lower().map(_WEIGHT_UNITS).where(suffixes.notna(),
+                                                           factors)
+
+    grams = numbers * factors.astype(float)
+    return np.trunc(grams.where(np.isfinite(grams)))
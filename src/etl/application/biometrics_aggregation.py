@@ -0,0 +1,100 @@
+"""
+Mergeable per patient aggregates (count, sum, min and max) of biometrics.
+Partial aggregates computed for different sets of rows can be merged, mean
+is only calculated at the end (sum / count).
+"""
+from datetime import date
+
+import numpy as np
+from pandas import DataFrame, Timedelta, Timestamp, concat, to_datetime
+
+METRICS = ["glucose", "systolic", "diastolic", "weight"]
+AGGREGATES = ["count", "sum", "min", "max"]
+STATE_COLUMNS = [f"{metric}_{aggregate}"
+                 for metric in METRICS for aggregate in AGGREGATES]
+# Same columns and order than kannact.biometrics_analytics
+ANALYTICS_COLUMNS = ["patient_id"] + [f"{metric}_{statistic}"
+                                      for metric in METRICS
+                                      for statistic in ["mean", "min", "max"]]
+# Days of the rolling windows, ending at the calculation date (included)
+WINDOWS = [7, 30, 90]
+WINDOW_ANALYTICS_COLUMNS = ["patient_id", "window_days",
+                            *ANALYTICS_COLUMNS[1:]]
+
+
+def aggregate_biometrics(df: DataFrame) -> DataFrame:
+    """
+    Returns one row per patient (patient_id as index) with count, sum, min
+    and max for each metric. NULL values are not counted.
+    """
+    if not len(df):
+        return DataFrame(columns=STATE_COLUMNS,
+                         index=df.index[:0].rename("patient_id"))
+
+    aggregated = df.groupby("patient_id")[METRICS].agg(AGGREGATES)
+    aggregated.columns = [f"{metric}_{aggregate}"
+                          for metric, aggregate in aggregated.columns]
+    return aggregated[STATE_COLUMNS]
+
+
+def merge_aggregates(*aggregates: DataFrame) -> DataFrame:
+    """
+    Merges partial aggregates, patients can be in any of them.
+    """
+    aggregates = [a for a in aggregates if len(a)]
+    if not aggregates:
+        return DataFrame(columns=STATE_COLUMNS)
+
+    grouped = concat(aggregates).groupby(level=0)
+    merged = DataFrame(index=grouped.size().index)
+    for metric in METRICS:
+        merged[f"{metric}_count"] = grouped[f"{metric}_count"].sum()
+        merged[f"{metric}_sum"] = grouped[f"{metric}_sum"].sum()
+        merged[f"{metric}_min"] = grouped[f"{metric}_min"].min()
+        merged[f"{metric}_max"] = grouped[f"{metric}_max"].max()
+    merged.index.name = "patient_id"
+    return merged
+
+
+def finalize_aggregates(aggregates: DataFrame) -> DataFrame:
+    """
+    Returns patient_id plus mean, min and max for each metric, same columns
+    than BiometricsAnalyticsDTO.
+    """
+    result = DataFrame(index=aggregates.index)
+    for metric in METRICS:
+        count = aggregates[f"{metric}_count"].astype(float)
+        result[f"{metric}_mean"] = (
+            aggregates[f"{metric}_sum"].astype(float) / count.where(count > 0)
+        )
+        result[f"{metric}_min"] = aggregates[f"{metric}_min"]
+        result[f"{metric}_max"] = aggregates[f"{metric}_max"]
+    return result.reset_index()
+
+
+def window_aggregates(df: DataFrame, as_of: date,
+                      windows: list[int] = WINDOWS) -> DataFrame:
+    """
+    Mean, min and max of each metric per patient and window. A window of N
+    days contains test dates in (as_of - N days, as_of]. Patients without
+    biometrics in a window have no row for it.
+    """
+    test_date = to_datetime(df["test_date"])
+    as_of = Timestamp(as_of)
+    results = []
+    for days in windows:
+        in_window = (test_date > as_of - Timedelta(days=days)) & (
+                test_date <= as_of)
+        result = finalize_aggregates(aggregate_biometrics(df[in_window]))
+        result.insert(1, "window_days", days)
+        results.append(result)
+    return concat(results, ignore_index=True)[WINDOW_ANALYTICS_COLUMNS]
+
+
+def to_analytics_columns(analytics: DataFrame,
+                         columns: list[str] = ANALYTICS_COLUMNS) -> DataFrame:
+    """
+    Analytics as stored in biometrics_analytics, decimals truncated (same
+    as int()) and nullable integers so missing metrics are written as NULL.
+    """
+    return analytics[columns].astype(float).apply(np.trunc).astype("Int64")
@@ -0,0 +1,16 @@
+"""
+Columns and dtypes of biometrics DataFrames, shared by every repository
+backend.
+"""
+# Columns written when biometrics are loaded, biometrics_id is generated
+BIOMETRICS_COPY_COLUMNS = ("patient_id", "test_date", "glucose", "systolic",
+                           "diastolic", "weight")
+# Smallest dtypes able to hold the column types, NULL allowed for metrics
+BIOMETRICS_DATAFRAME_DTYPES = {
+    "patient_id": "int64",
+    "biometrics_id": "int64",
+    "glucose": "Int16",
+    "systolic": "Int16",
+    "diastolic": "Int16",
+    "weight": "Int32",
+}
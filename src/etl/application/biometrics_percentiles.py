@@ -0,0 +1,94 @@
+"""
+Per patient quantile sketches of glucose and blood pressure. Sketches are
+built from any set of rows and merged later, so only new biometrics need
+to be read to keep percentiles up to date.
+"""
+from pandas import DataFrame, Index
+
+from src.building_blokcs.quantile_sketch import HistogramSketch
+from src.etl.application.biometrics_validation import GLUCOSE_RANGE, \
+    SYSTOLIC_RANGE, DIASTOLIC_RANGE
+
+PERCENTILE_METRICS = {
+    "glucose": GLUCOSE_RANGE,
+    "systolic": SYSTOLIC_RANGE,
+    "diastolic": DIASTOLIC_RANGE,
+}
+PERCENTILES = {"median": 0.5, "p95": 0.95}
+
+
+def sketch_biometrics(df: DataFrame,
+                      patient_ids: list[int] | None = None) -> DataFrame:
+    """
+    Returns one row per patient (patient_id as index) with a sketch for
+    each metric. NULL values are not added. If patient_ids is provided
+    all of them are returned, the ones without biometrics with empty
+    sketches.
+    """
+    if patient_ids is None:
+        patient_ids = df["patient_id"].unique()
+    sketches = DataFrame(index=Index(patient_ids, name="patient_id"))
+    for metric, (low, high) in PERCENTILE_METRICS.items():
+        sketches[metric] = [HistogramSketch(low, high)
+                            for _ in range(len(sketches))]
+        counts = df.groupby(["patient_id", metric]).size()
+        for patient_id, patient_counts in counts.groupby(level=0):
+            sketches.at[patient_id, metric].add(
+                patient_counts.index.get_level_values(1),
+                counts=patient_counts.values
+            )
+    return sketches
+
+
+def merge_sketches(*sketches: DataFrame) -> DataFrame:
+    """
+    Merges partial sketches, patients can be in any of them.
+    """
+    merged = {}
+    for partial in sketches:
+        for patient_id, row in partial.iterrows():
+            if patient_id in merged:
+                merged[patient_id] = {
+                    metric: merged[patient_id][metric].merge(row[metric])
+                    for metric in PERCENTILE_METRICS
+                }
+            else:
+                merged[patient_id] = row.to_dict()
+    result = DataFrame.from_dict(merged, orient="index",
+                                 columns=list(PERCENTILE_METRICS))
+    result.index.name = "patient_id"
+    return result
+
+
+def serialize_sketches(sketches: DataFrame) -> DataFrame:
+    return sketches.map(lambda sketch: sketch.to_bytes())
+
+
+def deserialize_sketches(serialized: DataFrame) -> DataFrame:
+    sketches = serialized.copy()
+    for metric, (low, high) in PERCENTILE_METRICS.items():
+        sketches[metric] = [HistogramSketch.from_bytes(bytes(data), low, high)
+                            for data in serialized[metric]]
+    return sketches
+
+
+def deserialize_sketch(serialized: dict[str, bytes]) -> dict:
+    """
+    Sketches of one patient, {metric: serialized sketch} as input.
+    """
+    return {
+        metric: HistogramSketch.from_bytes(bytes(serialized[metric]), low,
+                                           high)
+        for metric, (low, high) in PERCENTILE_METRICS.items()
+    }
+
+
+def sketch_percentiles(sketches: dict[str, HistogramSketch]) -> dict:
+    """
+    Returns {metric}_{percentile} values, None if the metric has no values.
+    """
+    return {
+        f"{metric}_{name}": sketches[metric].quantile(q)
+        for metric in PERCENTILE_METRICS
+        for name, q in PERCENTILES.items()
+    }
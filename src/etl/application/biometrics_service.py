@@ -1,14 +1,31 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 from kink import inject
+from pandas import DataFrame
 
 from src.building_blokcs.unit_conversor import pounds_to_grams, \
     kilograms_to_grams, grams_to_pounds, grams_to_kilograms
-from src.etl.application.dto import BiometricsDTO, BiometricsAnalyticsDTO
-from src.etl.domain.biometrics_analytics import BiometricsAnalytics
+from src.etl.application.biometrics_aggregation import \
+    aggregate_biometrics, merge_aggregates, finalize_aggregates, \
+    to_analytics_columns, window_aggregates, WINDOWS, WINDOW_ANALYTICS_COLUMNS
+from src.etl.application.biometrics_percentiles import sketch_biometrics, \
+    merge_sketches, serialize_sketches, deserialize_sketches, \
+    deserialize_sketch, sketch_percentiles
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe
+from src.etl.application.dto import BiometricsDTO, BiometricsAnalyticsDTO, \
+    BiometricsAnalyticsWindowDTO, BiometricsPercentilesDTO
+from src.etl.domain.async_biometrics_repository import \
+    IAsyncBiometricsRepository
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
 from src.etl.domain.biometrics_repository import IBiometricsRepository
 from src.etl.domain.biometrics import Biometrics
 
+# Watermark names used by incremental analytics
+BIOMETRICS_ANALYTICS_JOB = 'biometrics_analytics'
+BIOMETRICS_PERCENTILES_JOB = 'biometrics_percentiles'
+
 
 @inject
 class BiometricsService:
@@ -19,7 +36,7 @@ class BiometricsService:
     def get_biometrics(self, patient_id, weight_unit: str,
                        biometrics_id: int = 0,
                        test_date: datetime = datetime(1970, 1, 1),
-                       limit: int = 10
+                       limit: int = 10, use_primary: bool = False
                        ) -> list[BiometricsDTO]:
 
         biometrics_list: list[
@@ -27,31 +44,16 @@ class BiometricsService:
             patient_id=patient_id,
             biometrics_id=biometrics_id,
             test_date=test_date,
-            limit=limit)
-
-        biometrics_dto_list: list[BiometricsDTO] = []
-        for biometrics in biometrics_list:
-            if weight_unit != 'metric':
-                weight = grams_to_pounds(biometrics.weight)
-            else:
-                weight = grams_to_kilograms(biometrics.weight)
+            limit=limit,
+            use_primary=use_primary)
 
-            biometrics_dto: BiometricsDTO = BiometricsDTO(
-                patient_id=biometrics.patient_id,
-                biometrics_id=biometrics.biometrics_id,
-                test_date=biometrics.test_date,
-                glucose=biometrics.glucose,
-                systolic=biometrics.systolic,
-                diastolic=biometrics.diastolic,
-                weight=weight
-            )
-
-            biometrics_dto_list.append(biometrics_dto)
-
-        return biometrics_dto_list
+        return _map_biometrics_to_biometrics_dto(
+            weight_unit=weight_unit, biometrics_list=biometrics_list
+        )
 
     def insert_biometrics(
-            self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO]
+            self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO],
+            bulk: bool = False
     ) -> list[BiometricsDTO]:
         biometrics_list, biometrics_error = (
             self._map_biometrics_dto_to_biometrics(
@@ -59,10 +61,49 @@ class BiometricsService:
             )
         )
 
-        self._biometrics_repo.insert_biometrics(biometrics_list=biometrics_list)
+        if bulk:
+            self._biometrics_repo.copy_biometrics(
+                biometrics_list=biometrics_list
+            )
+        else:
+            self._biometrics_repo.insert_biometrics(
+                biometrics_list=biometrics_list
+            )
 
         return biometrics_error
 
+    def insert_biometrics_dataframe(
+            self, weight_unit: str, df: DataFrame
+    ) -> DataFrame:
+        """
+        Columnar insert, the whole DataFrame is validated at once and valid
+        rows are bulk loaded. Rejected rows are returned with a reason column.
+        """
+        valid, rejected = validate_biometrics_dataframe(
+            df=df, weight_unit=weight_unit
+        )
+
+        self.insert_valid_biometrics_dataframe(df=valid)
+
+        return rejected
+
+    def insert_valid_biometrics_dataframe(self, df: DataFrame):
+        """
+        Bulk load of rows already validated by validate_biometrics_dataframe,
+        used when validation is done by other processes.
+        """
+        if len(df):
+            self._biometrics_repo.copy_biometrics_dataframe(df=df)
+
+    def export_biometrics_parquet(self, root_path: str) -> int:
+        """
+        Biometrics exported as partitioned Parquet (weight in grams), so
+        analytics can run without querying the database.
+        """
+        return self._biometrics_repo.export_biometrics_parquet(
+            root_path=root_path
+        )
+
     def update_biometrics(
             self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO]
     ) -> BiometricsDTO:
@@ -73,6 +114,9 @@ class BiometricsService:
             )
         )
         self._biometrics_repo.update_biometrics(biometrics_list=biometrics_list)
+        self.recompute_biometrics_analytics(
+            patient_ids=list({b.patient_id for b in biometrics_list})
+        )
 
     def upsert_biometrics(
             self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO]
@@ -84,6 +128,9 @@ class BiometricsService:
         )
 
         self._biometrics_repo.upsert_biometrics(biometrics_list=biometrics_list)
+        self.recompute_biometrics_analytics(
+            patient_ids=list({b.patient_id for b in biometrics_list})
+        )
 
     def delete_biometrics(
             self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO]
@@ -95,6 +142,9 @@ class BiometricsService:
             )
         )
         self._biometrics_repo.delete_biometrics(biometrics_list=biometrics_list)
+        self.recompute_biometrics_analytics(
+            patient_ids=list({b.patient_id for b in biometrics_list})
+        )
 
     def get_patient_biometrics_analytics(
             self, patient_id: int
@@ -105,23 +155,7 @@ class BiometricsService:
             )
         )
 
-        if biometrics_analytics is None:
-            return None
-
-        biometrics_analytics.weight_mean = grams_to_kilograms(
-            biometrics_analytics.weight_mean
-        )
-        biometrics_analytics.weight_min = grams_to_kilograms(
-            biometrics_analytics.weight_min
-        )
-        biometrics_analytics.weight_max = grams_to_kilograms(
-            biometrics_analytics.weight_max
-        )
-
-        biometrics_analytics_dto: BiometricsAnalyticsDTO = (
-            BiometricsAnalyticsDTO(**biometrics_analytics.dict())
-        )
-        return biometrics_analytics_dto
+        return _map_biometrics_analytics_to_dto(biometrics_analytics)
 
     def upsert_biometrics_analytics(
             self,
@@ -156,6 +190,248 @@ class BiometricsService:
             biometrics_analytics_list
         )
 
+    def upsert_biometrics_analytics_dataframe(self, df: DataFrame) -> int:
+        """
+        Bulk version of upsert_biometrics_analytics, df has patient_id plus
+        mean, min and max of each metric. No objects are built per row.
+        """
+        return self._biometrics_repo.copy_biometrics_analytics_dataframe(
+            to_analytics_columns(df)
+        )
+
+    def aggregate_biometrics_analytics_in_database(self) -> int:
+        """
+        Analytics calculated by the database (push-down), returns the
+        number of patients updated.
+        """
+        return self._biometrics_repo.aggregate_biometrics_analytics()
+
+    def calculate_biometrics_analytics_streaming(
+            self, chunk_size: int = 100000
+    ) -> int:
+        """
+        Whole table analytics in constant memory, biometrics are streamed
+        ordered by patient and each chunk is aggregated and written. Only
+        the last patient of a chunk is kept, its rows may continue in the
+        next one. Chunks are written while the stream is open, repositories
+        on a connection pool need at least 2 connections (one streaming, one
+        writing). Returns the number of patients updated.
+        """
+        patients = 0
+        pending = None
+        for df in self._biometrics_repo.iter_dataframe_biometrics(
+                chunk_size=chunk_size, order_by_patient=True
+        ):
+            aggregates = aggregate_biometrics(df)
+            if pending is not None:
+                aggregates = merge_aggregates(pending, aggregates)
+            pending = aggregates.iloc[-1:]
+            completed = aggregates.iloc[:-1]
+            if len(completed):
+                patients += self.upsert_biometrics_analytics_dataframe(
+                    finalize_aggregates(completed)
+                )
+
+        if pending is not None:
+            patients += self.upsert_biometrics_analytics_dataframe(
+                finalize_aggregates(pending)
+            )
+        return patients
+
+    def calculate_biometrics_analytics_range(
+            self, min_patient_id: int, max_patient_id: int
+    ) -> int:
+        """
+        Analytics for a range of patients (both limits included), returns
+        the number of patients updated.
+        """
+        df: DataFrame = self._biometrics_repo.get_dataframe_biometrics(
+            min_patient_id=min_patient_id, max_patient_id=max_patient_id
+        )
+        if not len(df):
+            return 0
+
+        analytics = finalize_aggregates(aggregate_biometrics(df))
+        self.upsert_biometrics_analytics_dataframe(analytics)
+        return len(analytics)
+
+    def update_biometrics_analytics_windows(
+            self, as_of: date | None = None
+    ) -> int:
+        """
+        Rolling windows (7, 30 and 90 days) ending at as_of (today by
+        default). Only biometrics of the longest window are read, so the
+        cost depends on recent activity instead of the whole history.
+        Returns the number of windows stored.
+        """
+        as_of = as_of or date.today()
+        df: DataFrame = self._biometrics_repo.get_dataframe_recent_biometrics(
+            min_test_date=as_of - timedelta(days=max(WINDOWS) - 1)
+        )
+        windows = to_analytics_columns(window_aggregates(df, as_of=as_of),
+                                       columns=WINDOW_ANALYTICS_COLUMNS)
+        return self._biometrics_repo.replace_biometrics_analytics_windows(
+            df=windows, as_of=as_of
+        )
+
+    def get_patient_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindowDTO]:
+        return _map_windows_to_windows_dto(
+            self._biometrics_repo.get_biometrics_analytics_windows(
+                patient_id=patient_id
+            )
+        )
+
+    def update_biometrics_analytics_incremental(self) -> int:
+        """
+        Folds biometrics newer than the watermark into the running
+        aggregates of their patients, other patients are not touched.
+        Returns the number of biometrics processed.
+        Only rows up to the settled id are read and the watermark moves to
+        it: an id reserved by a transaction still in progress is smaller
+        than the settled id only after that transaction ended, so it is
+        never skipped.
+        """
+        watermark = self._biometrics_repo.get_biometrics_watermark(
+            job_name=BIOMETRICS_ANALYTICS_JOB
+        )
+        df, settled_id = self._get_unfolded_biometrics(watermark)
+        if not len(df):
+            return 0
+
+        new_aggregates = aggregate_biometrics(df)
+        state = merge_aggregates(
+            self._biometrics_repo.get_biometrics_analytics_state(
+                patient_ids=new_aggregates.index.tolist()
+            ),
+            new_aggregates
+        )
+
+        self.upsert_biometrics_analytics_dataframe(finalize_aggregates(state))
+        self._biometrics_repo.save_biometrics_analytics_state(
+            state=state, job_name=BIOMETRICS_ANALYTICS_JOB,
+            watermark=settled_id
+        )
+        return len(df)
+
+    def recompute_biometrics_analytics(self, patient_ids: list[int]):
+        """
+        Recalculates running aggregates and percentile sketches of the
+        patients from scratch, used when biometrics are modified or deleted.
+        Only rows up to the watermark are used, newer ones are folded by the
+        next incremental run. Nothing is done if incremental analytics was
+        never executed.
+        """
+        self.recompute_biometrics_percentiles(patient_ids=patient_ids)
+        watermark = self._biometrics_repo.get_biometrics_watermark(
+            job_name=BIOMETRICS_ANALYTICS_JOB
+        )
+        if watermark is None or not patient_ids:
+            return
+
+        df: DataFrame = self._biometrics_repo.get_dataframe_biometrics(
+            patient_ids=patient_ids, max_biometrics_id=watermark
+        )
+        state = aggregate_biometrics(df)
+
+        # Patients without biometrics anymore
+        removed = set(patient_ids) - set(state.index)
+        if removed:
+            self._biometrics_repo.delete_biometrics_analytics(
+                patient_ids=list(removed)
+            )
+
+        if len(state):
+            self.upsert_biometrics_analytics_dataframe(
+                finalize_aggregates(state)
+            )
+            self._biometrics_repo.save_biometrics_analytics_state(
+                state=state, job_name=BIOMETRICS_ANALYTICS_JOB
+            )
+
+    def update_biometrics_percentiles_incremental(self) -> int:
+        """
+        Folds biometrics newer than the watermark into the quantile sketches
+        of their patients, up to the settled id like
+        update_biometrics_analytics_incremental. Returns the number of
+        biometrics processed.
+        """
+        watermark = self._biometrics_repo.get_biometrics_watermark(
+            job_name=BIOMETRICS_PERCENTILES_JOB
+        )
+        df, settled_id = self._get_unfolded_biometrics(watermark)
+        if not len(df):
+            return 0
+
+        new_sketches = sketch_biometrics(df)
+        sketches = merge_sketches(
+            deserialize_sketches(
+                self._biometrics_repo.get_biometrics_sketches(
+                    patient_ids=new_sketches.index.tolist()
+                )
+            ),
+            new_sketches
+        )
+        self._biometrics_repo.save_biometrics_sketches(
+            sketches=serialize_sketches(sketches),
+            job_name=BIOMETRICS_PERCENTILES_JOB,
+            watermark=settled_id
+        )
+        return len(df)
+
+    def recompute_biometrics_percentiles(self, patient_ids: list[int]):
+        """
+        Rebuilds the sketches of the patients from scratch, same rules as
+        recompute_biometrics_analytics. Patients without biometrics keep
+        empty sketches.
+        """
+        watermark = self._biometrics_repo.get_biometrics_watermark(
+            job_name=BIOMETRICS_PERCENTILES_JOB
+        )
+        if watermark is None or not patient_ids:
+            return
+
+        df: DataFrame = self._biometrics_repo.get_dataframe_biometrics(
+            patient_ids=patient_ids, max_biometrics_id=watermark
+        )
+        sketches = sketch_biometrics(df, patient_ids=patient_ids)
+        self._biometrics_repo.save_biometrics_sketches(
+            sketches=serialize_sketches(sketches),
+            job_name=BIOMETRICS_PERCENTILES_JOB
+        )
+
+    def get_patient_biometrics_percentiles(
+            self, patient_id: int
+    ) -> BiometricsPercentilesDTO:
+        serialized = self._biometrics_repo.get_biometrics_sketches(
+            patient_ids=[patient_id]
+        )
+        if not len(serialized):
+            return None
+
+        sketches = deserialize_sketches(serialized).iloc[0].to_dict()
+        return BiometricsPercentilesDTO(
+            patient_id=patient_id, **sketch_percentiles(sketches)
+        )
+
+    def _get_unfolded_biometrics(
+            self, watermark: int | None
+    ) -> tuple[DataFrame, int | None]:
+        """
+        Biometrics after the watermark and up to the settled id (the next
+        watermark), empty if there is nothing new.
+        """
+        settled_id = self._biometrics_repo.get_settled_biometrics_id()
+        if settled_id is None or (watermark is not None
+                                  and settled_id <= watermark):
+            return DataFrame(), settled_id
+
+        df: DataFrame = self._biometrics_repo.get_dataframe_biometrics(
+            min_biometrics_id=watermark, max_biometrics_id=settled_id
+        )
+        return df, int(settled_id)
+
     def _map_biometrics_dto_to_biometrics(
             self, weight_unit: str, biometrics_dto_list: list[BiometricsDTO]
     ):
@@ -184,3 +460,122 @@ class BiometricsService:
                 biometrics_error.append(biometrics_dto)
 
         return biometrics_list, biometrics_error
+
+
+@inject
+class AsyncBiometricsService:
+    """
+    Read operations used by the API, the repository is async so requests
+    waiting for the database do not block the event loop.
+    """
+
+    def __init__(self, biometrics_repo: IAsyncBiometricsRepository):
+        self._biometrics_repo = biometrics_repo
+
+    async def get_biometrics(self, patient_id, weight_unit: str,
+                             biometrics_id: int = 0,
+                             test_date: datetime = datetime(1970, 1, 1),
+                             limit: int = 10, use_primary: bool = False
+                             ) -> list[BiometricsDTO]:
+        biometrics_list: list[Biometrics] = (
+            await self._biometrics_repo.get_biometrics(
+                patient_id=patient_id, biometrics_id=biometrics_id,
+                test_date=test_date, limit=limit, use_primary=use_primary
+            )
+        )
+        return _map_biometrics_to_biometrics_dto(
+            weight_unit=weight_unit, biometrics_list=biometrics_list
+        )
+
+    async def get_patient_biometrics_analytics(
+            self, patient_id: int
+    ) -> BiometricsAnalyticsDTO:
+        return _map_biometrics_analytics_to_dto(
+            await self._biometrics_repo.get_biometrics_analytics(
+                patient_id=patient_id
+            )
+        )
+
+    async def get_patient_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindowDTO]:
+        return _map_windows_to_windows_dto(
+            await self._biometrics_repo.get_biometrics_analytics_windows(
+                patient_id=patient_id
+            )
+        )
+
+    async def get_patient_biometrics_percentiles(
+            self, patient_id: int
+    ) -> BiometricsPercentilesDTO:
+        serialized = await self._biometrics_repo.get_biometrics_sketch(
+            patient_id=patient_id
+        )
+        if serialized is None:
+            return None
+
+        return BiometricsPercentilesDTO(
+            patient_id=patient_id,
+            **sketch_percentiles(deserialize_sketch(serialized))
+        )
+
+
+def _map_biometrics_to_biometrics_dto(
+        weight_unit: str, biometrics_list: list[Biometrics]
+) -> list[BiometricsDTO]:
+    biometrics_dto_list: list[BiometricsDTO] = []
+    for biometrics in biometrics_list:
+        if weight_unit != 'metric':
+            weight = grams_to_pounds(biometrics.weight)
+        else:
+            weight = grams_to_kilograms(biometrics.weight)
+
+        biometrics_dto: BiometricsDTO = BiometricsDTO(
+            patient_id=biometrics.patient_id,
+            biometrics_id=biometrics.biometrics_id,
+            test_date=biometrics.test_date,
+            glucose=biometrics.glucose,
+            systolic=biometrics.systolic,
+            diastolic=biometrics.diastolic,
+            weight=weight
+        )
+
+        biometrics_dto_list.append(biometrics_dto)
+
+    return biometrics_dto_list
+
+
+def _map_biometrics_analytics_to_dto(
+        biometrics_analytics: BiometricsAnalytics | None
+) -> BiometricsAnalyticsDTO | None:
+    if biometrics_analytics is None:
+        return None
+
+    biometrics_analytics.weight_mean = grams_to_kilograms(
+        biometrics_analytics.weight_mean
+    )
+    biometrics_analytics.weight_min = grams_to_kilograms(
+        biometrics_analytics.weight_min
+    )
+    biometrics_analytics.weight_max = grams_to_kilograms(
+        biometrics_analytics.weight_max
+    )
+
+    biometrics_analytics_dto: BiometricsAnalyticsDTO = (
+        BiometricsAnalyticsDTO(**biometrics_analytics.dict())
+    )
+    return biometrics_analytics_dto
+
+
+def _map_windows_to_windows_dto(
+        windows: list[BiometricsAnalyticsWindow]
+) -> list[BiometricsAnalyticsWindowDTO]:
+    windows_dto: list[BiometricsAnalyticsWindowDTO] = []
+    for window in windows:
+        window_dto = BiometricsAnalyticsWindowDTO(**window.model_dump())
+        for column in ["weight_mean", "weight_min", "weight_max"]:
+            value = getattr(window_dto, column)
+            if value is not None:
+                setattr(window_dto, column, grams_to_kilograms(value))
+        windows_dto.append(window_dto)
+    return windows_dto
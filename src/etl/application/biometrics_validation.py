@@ -0,0 +1,171 @@
+"""
+Columnar version of the validations done by BiometricsDTO and Biometrics.
+A whole DataFrame chunk is validated with vectorized operations instead of
+building two pydantic models per row, accept/reject decisions must be the
+same as the ones taken by the models.
+On top of that, mixed-unit files are supported (weight_unit column or
+values with a unit suffix such as "160 lb"), see normalize_weight_to_grams.
+"""
+import numpy as np
+from pandas import DataFrame, Series, to_datetime, to_numeric
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype, \
+    is_bool_dtype
+
+from src.building_blokcs.unit_conversor import normalize_weight_to_grams
+
+# Same outliers limits used by Biometrics entity (exclusive bounds)
+GLUCOSE_RANGE = (54, 300)
+SYSTOLIC_RANGE = (50, 230)
+DIASTOLIC_RANGE = (35, 210)
+WEIGHT_RANGE = (1000, 400000)  # grams
+
+BIOMETRICS_COLUMNS = ["patient_id", "biometrics_id", "test_date", "glucose",
+                      "systolic", "diastolic", "weight"]
+
+_INTEGER_PATTERN = r"^\s*[+-]?[0-9](?:_?[0-9])*(?:\.0*)?\s*$"
+_DATETIME_PATTERN = (r"^[0-9]{4}-[0-9]{2}-[0-9]{2}"
+                     r"(?:[T ][0-9]{2}:[0-9]{2}(?::[0-9]{2}(?:\.[0-9]+)?)?"
+                     r"(?:Z|[+-][0-9]{2}:?[0-9]{2})?)?$")
+_TIMEZONE_PATTERN = r"(?:Z|[+-][0-9]{2}:?[0-9]{2})$"
+_NUMERIC_PATTERN = r"^[+-]?[0-9]+(?:\.[0-9]+)?$"
+# pydantic treats numeric datetimes greater than this value as milliseconds
+_UNIX_MILLISECONDS_THRESHOLD = 2e10
+
+
+def validate_biometrics_dataframe(
+        df: DataFrame, weight_unit: str
+) -> tuple[DataFrame, DataFrame]:
+    """
+    Returns a tuple with valid rows (weight converted to grams) and rejected
+    rows, rejected rows keep the original values plus a reason column.
+    Index is preserved in both DataFrames.
+    """
+    reason = Series(None, index=df.index, dtype=object)
+
+    def reject(mask: Series, code: str):
+        reason.loc[mask & reason.isna()] = code
+
+    patient_id = _to_integer(df["patient_id"]) if "patient_id" in df \
+        else Series(np.nan, index=df.index)
+    reject(patient_id.isna(), "patient_id_invalid")
+
+    if "biometrics_id" in df:
+        # None is allowed (auto generated) but not NaN
+        biometrics_id = _to_integer(df["biometrics_id"])
+        reject(biometrics_id.isna() & df["biometrics_id"].map(
+            lambda v: v is not None), "biometrics_id_invalid")
+    else:
+        biometrics_id = None
+
+    test_date = _to_datetime(df["test_date"]) if "test_date" in df \
+        else Series(np.nan, index=df.index)
+    reject(test_date.isna(), "test_date_invalid")
+
+    # Blood pressure consistency (check_consistency validator)
+    if ("systolic" in df) != ("diastolic" in df):
+        reject(Series(True, index=df.index), "blood_pressure_incomplete")
+
+    values = {
+        column: _to_integer(df[column]) if column in df else None
+        for column in ("glucose", "systolic", "diastolic")
+    }
+
+    if values["systolic"] is not None and values["diastolic"] is not None:
+        reject(values["diastolic"] > values["systolic"],
+               "blood_pressure_inconsistent")
+
+    for column, (low, high) in (("glucose", GLUCOSE_RANGE),
+                                ("systolic", SYSTOLIC_RANGE),
+                                ("diastolic", DIASTOLIC_RANGE)):
+        if values[column] is None:
+            continue
+        reject(values[column].isna(), f"{column}_invalid")
+        reject((values[column] <= low) | (values[column] >= high),
+               f"{column}_out_of_range")
+
+    if "weight" in df:
+        # Per row units (weight_unit column or suffixes) take precedence
+        weight = normalize_weight_to_grams(
+            values=df["weight"], units=df.get("weight_unit"),
+            default_unit=weight_unit
+        )
+    else:
+        weight = Series(np.nan, index=df.index)
+    reject(weight.isna(), "weight_invalid")
+    reject((weight <= WEIGHT_RANGE[0]) | (weight >= WEIGHT_RANGE[1]),
+           "weight_out_of_range")
+
+    rejected_mask = reason.notna()
+    valid_mask = ~rejected_mask
+
+    valid = DataFrame(index=df.index[valid_mask])
+    valid["patient_id"] = patient_id[valid_mask].astype("int64")
+    if biometrics_id is not None:
+        valid["biometrics_id"] = biometrics_id[valid_mask].astype("Int64")
+    valid["test_date"] = test_date[valid_mask]
+    for column in ("glucose", "systolic", "diastolic"):
+        if values[column] is None:
+            valid[column] = Series(None, index=valid.index, dtype="Int16")
+        else:
+            valid[column] = values[column][valid_mask].astype("Int16")
+    valid["weight"] = weight[valid_mask].astype("int64")
+
+    rejected = df[rejected_mask].copy()
+    rejected["reason"] = reason[rejected_mask]
+
+    return valid, rejected
+
+
+def _to_integer(column: Series) -> Series:
+    """
+    Casts values to float following pydantic lax mode rules for int fields,
+    values that can not be converted are returned as NaN.
+    """
+    if is_bool_dtype(column):
+        return column.astype(float)
+
+    if is_numeric_dtype(column):
+        values = column.astype(float)
+    else:
+        as_text = column.map(lambda v: v if isinstance(v, str) else None)
+        text_mask = as_text.notna()
+        text_mask &= as_text.str.match(_INTEGER_PATTERN, na=False)
+        values = to_numeric(
+            as_text.where(text_mask).str.replace("_", "", regex=False),
+            errors="coerce"
+        ).astype(float)
+        not_text = as_text.isna() & column.notna()
+        values[not_text] = to_numeric(column[not_text],
+                                      errors="coerce").astype(float)
+
+    integral = np.isfinite(values) & (values == np.trunc(values))
+    # int64 boundaries
+    integral &= values.abs() < 2 ** 63
+    return values.where(integral)
+
+
+def _to_datetime(column: Series) -> Series:
+    if is_datetime64_any_dtype(column):
+        return column
+
+    if is_numeric_dtype(column) and not is_bool_dtype(column):
+        seconds = column.astype(float)
+        seconds = seconds.where(
+            seconds.abs() <= _UNIX_MILLISECONDS_THRESHOLD, seconds / 1000
+        )
+        return to_datetime(seconds, unit="s", errors="coerce")
+
+    as_text = column.map(lambda v: v if isinstance(v, str) else None)
+
+    # Numeric strings are unix timestamps for pydantic
+    numeric_text = as_text.str.match(_NUMERIC_PATTERN, na=False)
+    timestamps = _to_datetime(
+        to_numeric(as_text.where(numeric_text), errors="coerce")
+    )
+
+    # Timezone designator is removed, local time is kept as pydantic does
+    iso_text = as_text.where(as_text.str.match(_DATETIME_PATTERN, na=False))
+    iso_text = iso_text.str.replace(_TIMEZONE_PATTERN, "", regex=True)
+    dates = to_datetime(iso_text, format="ISO8601", errors="coerce")
+
+    return dates.where(~numeric_text, timestamps)
@@ -91,6 +91,29 @@ class BiometricsAnalyticsDTO(BaseModel):
     weight_max: float
 
 
-
-
-
+class BiometricsAnalyticsWindowDTO(BaseModel):
+    patient_id: int
+    window_days: int
+    as_of: date
+    glucose_mean: Optional[float] = None
+    glucose_min: Optional[float] = None
+    glucose_max: Optional[float] = None
+    systolic_mean: Optional[float] = None
+    systolic_min: Optional[float] = None
+    systolic_max: Optional[float] = None
+    diastolic_mean: Optional[float] = None
+    diastolic_min: Optional[float] = None
+    diastolic_max: Optional[float] = None
+    weight_mean: Optional[float] = None
+    weight_min: Optional[float] = None
+    weight_max: Optional[float] = None
+
+
+class BiometricsPercentilesDTO(BaseModel):
+    patient_id: int
+    glucose_median: Optional[int] = None
+    glucose_p95: Optional[int] = None
+    systolic_median: Optional[int] = None
+    systolic_p95: Optional[int] = None
+    diastolic_median: Optional[int] = None
+    diastolic_p95: Optional[int] = None
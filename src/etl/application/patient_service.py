@@ -1,4 +1,6 @@
+from src.building_blokcs.bloom_filter import BloomFilter
 from src.etl.application.dto import PatientDTO
+from src.etl.domain.async_patient_repository import IAsyncPatientRepository
 from src.etl.domain.patient import Patient
 from src.etl.domain.patient_repository import IPatientRepository
 from kink import inject
@@ -11,10 +13,10 @@ class PatientService:
         self._patient_repo = patient_repo
 
     def get_patients(
-            self, patient_id: int, limit: int = 10
+            self, patient_id: int, limit: int = 10, use_primary: bool = False
     ) -> list[PatientDTO]:
         patients: list[Patient] = self._patient_repo.get_patients(
-            patient_id=patient_id, limit=limit)
+            patient_id=patient_id, limit=limit, use_primary=use_primary)
         patients_dto: list[PatientDTO] = []
 
         for patient in patients:
@@ -23,24 +25,114 @@ class PatientService:
         return patients_dto
 
     def insert_patient(
-            self, patient_dto_list: list[PatientDTO]
-    ) -> list[PatientDTO]:
-
+            self, patient_dto_list: list[PatientDTO], bulk: bool = False
+    ) -> list[tuple[PatientDTO, ValueError]]:
+        """
+        Returns the patients rejected by validation, each one with the
+        validation error.
+        """
         patient_batch: list[Patient] = []
-        patient_error: list[PatientDTO] = []
+        patient_error: list[tuple[PatientDTO, ValueError]] = []
 
         for p_dto in patient_dto_list:
             try:
                 patient_batch.append(Patient(**p_dto.dict()))
-            except ValueError:
-                patient_error.append(p_dto)
+            except ValueError as e:
+                patient_error.append((p_dto, e))
 
-        self._patient_repo.insert_patient(patients=patient_batch)
+        if bulk:
+            self._patient_repo.copy_patients(patients=patient_batch)
+        else:
+            self._patient_repo.insert_patient(patients=patient_batch)
 
         return patient_error
 
+    def get_email_filter(self, expected_new_patients: int = 0) -> BloomFilter:
+        """
+        Bloom filter loaded with the emails already stored, used by
+        insert_new_patients to skip the database lookup for new emails.
+        """
+        email_filter = BloomFilter(
+            capacity=self._patient_repo.count_patients() + expected_new_patients
+        )
+        for email in self._patient_repo.iter_emails():
+            email_filter.add(email)
+
+        return email_filter
+
+    def insert_new_patients(
+            self, patient_dto_list: list[PatientDTO], email_filter: BloomFilter,
+            bulk: bool = False
+    ) -> tuple[list[tuple[PatientDTO, ValueError]], list[PatientDTO]]:
+        """
+        Same as insert_patient but patients whose email is already stored (or
+        repeated in the list) are skipped, so loading a file twice does not
+        duplicate patients. Emails found in the filter are only candidates,
+        they are resolved with one query for the whole list.
+        Returns patients rejected by validation (with the validation error)
+        and duplicated patients.
+        """
+        patient_batch: list[tuple[Patient, PatientDTO]] = []
+        patient_error: list[tuple[PatientDTO, ValueError]] = []
+        duplicates: list[PatientDTO] = []
+        candidates: list[str] = []
+        emails: set[str] = set()
+
+        for p_dto in patient_dto_list:
+            try:
+                patient = Patient(**p_dto.dict())
+            except ValueError as e:
+                patient_error.append((p_dto, e))
+                continue
+
+            if patient.email in emails:
+                duplicates.append(p_dto)
+                continue
+
+            emails.add(patient.email)
+            if patient.email in email_filter:
+                candidates.append(patient.email)
+            patient_batch.append((patient, p_dto))
+
+        existing = self._patient_repo.get_existing_emails(emails=candidates)
+        new_patients: list[Patient] = []
+        for patient, p_dto in patient_batch:
+            if patient.email in existing:
+                duplicates.append(p_dto)
+            else:
+                new_patients.append(patient)
+
+        if bulk:
+            self._patient_repo.copy_patients(patients=new_patients)
+        else:
+            self._patient_repo.insert_patient(patients=new_patients)
+
+        for patient in new_patients:
+            email_filter.add(patient.email)
+
+        return patient_error, duplicates
+
     def is_patient(self, patient_id: int) -> bool:
         return self.get_patient(patient_id=patient_id) is not None
 
     def delete_patient(self, patient_id: int) -> Patient:
         return self._patient_repo.delete_patient(patient_id=patient_id)
+
+
+@inject
+class AsyncPatientService:
+    """
+    Read operations used by the API, the repository is async so requests
+    waiting for the database do not block the event loop.
+    """
+
+    def __init__(self, patient_repo: IAsyncPatientRepository) -> None:
+        self._patient_repo = patient_repo
+
+    async def get_patients(
+            self, patient_id: int, limit: int = 10, use_primary: bool = False
+    ) -> list[PatientDTO]:
+        patients: list[Patient] = await self._patient_repo.get_patients(
+            patient_id=patient_id, limit=limit, use_primary=use_primary)
+
+        return [PatientDTO(**patient.dict()) for patient in patients]
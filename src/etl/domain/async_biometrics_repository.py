@@ -0,0 +1,34 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from src.etl.domain.biometrics import Biometrics
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
+
+
+class IAsyncBiometricsRepository(ABC):
+
+    @abstractmethod
+    async def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
+                             test_date: datetime = datetime(1970, 1, 1),
+                             limit: int = 10, use_primary: bool = False
+                             ) -> list[Biometrics]:
+        pass
+
+    @abstractmethod
+    async def get_biometrics_analytics(
+            self, patient_id: int
+    ) -> BiometricsAnalytics | None:
+        pass
+
+    @abstractmethod
+    async def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        pass
+
+    @abstractmethod
+    async def get_biometrics_sketch(
+            self, patient_id: int
+    ) -> dict[str, bytes] | None:
+        pass
@@ -0,0 +1,11 @@
+from abc import ABC, abstractmethod
+
+from src.etl.domain.patient import Patient
+
+
+class IAsyncPatientRepository(ABC):
+
+    @abstractmethod
+    async def get_patients(self, patient_id: int, limit: int = 10,
+                           use_primary: bool = False) -> list[Patient]:
+        pass
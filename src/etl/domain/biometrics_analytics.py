@@ -1,3 +1,7 @@
+from datetime import date
+
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -15,3 +19,21 @@ class BiometricsAnalytics(BaseModel):
     weight_mean: int
     weight_min: int
     weight_max: int
+
+
+class BiometricsAnalyticsWindow(BaseModel):
+    patient_id: int
+    window_days: int
+    as_of: date
+    glucose_mean: Optional[int] = None
+    glucose_min: Optional[int] = None
+    glucose_max: Optional[int] = None
+    systolic_mean: Optional[int] = None
+    systolic_min: Optional[int] = None
+    systolic_max: Optional[int] = None
+    diastolic_mean: Optional[int] = None
+    diastolic_min: Optional[int] = None
+    diastolic_max: Optional[int] = None
+    weight_mean: Optional[int] = None
+    weight_min: Optional[int] = None
+    weight_max: Optional[int] = None
@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import date, datetime
+from typing import Iterator
 
 from pandas import DataFrame
 
 from src.etl.domain.biometrics import Biometrics
-from src.etl.domain.biometrics_analytics import BiometricsAnalytics
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
 
 
 class IBiometricsRepository(ABC):
@@ -12,7 +14,7 @@ class IBiometricsRepository(ABC):
     @abstractmethod
     def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
                        test_date: datetime = datetime(1970, 1, 1),
-                       limit: int = 10
+                       limit: int = 10, use_primary: bool = False
                        ) -> list[Biometrics]:
         pass
 
@@ -22,7 +24,48 @@ class IBiometricsRepository(ABC):
         pass
 
     @abstractmethod
-    def get_dataframe_biometrics(self) -> DataFrame:
+    def copy_biometrics(self, biometrics_list: list[Biometrics]) -> int:
+        pass
+
+    @abstractmethod
+    def copy_biometrics_dataframe(self, df: DataFrame) -> int:
+        pass
+
+    @abstractmethod
+    def get_dataframe_biometrics(
+            self, patient_ids: list[int] | None = None,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            min_patient_id: int | None = None,
+            max_patient_id: int | None = None
+    ) -> DataFrame:
+        pass
+
+    @abstractmethod
+    def iter_dataframe_biometrics(
+            self, chunk_size: int = 100000,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            order_by_patient: bool = False
+    ) -> Iterator[DataFrame]:
+        pass
+
+    @abstractmethod
+    def get_patient_id_range(self) -> tuple[int, int] | None:
+        pass
+
+    @abstractmethod
+    def get_settled_biometrics_id(self) -> int | None:
+        """
+        Highest biometrics_id such that no transaction in progress holds a
+        smaller one, every row up to it is visible to later reads bounded by
+        max_biometrics_id. None when there are no biometrics.
+        """
+        pass
+
+    @abstractmethod
+    def export_biometrics_parquet(self, root_path: str,
+                                  chunk_size: int = 1000000) -> int:
         pass
 
     @abstractmethod
@@ -49,3 +92,56 @@ class IBiometricsRepository(ABC):
                                         BiometricsAnalytics]
                                     ):
         pass
+
+    @abstractmethod
+    def copy_biometrics_analytics_dataframe(self, df: DataFrame) -> int:
+        pass
+
+    @abstractmethod
+    def get_dataframe_recent_biometrics(self, min_test_date: date) -> DataFrame:
+        pass
+
+    @abstractmethod
+    def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        pass
+
+    @abstractmethod
+    def replace_biometrics_analytics_windows(self, df: DataFrame,
+                                             as_of: date) -> int:
+        pass
+
+    @abstractmethod
+    def get_biometrics_sketches(self, patient_ids: list[int]) -> DataFrame:
+        pass
+
+    @abstractmethod
+    def save_biometrics_sketches(self, sketches: DataFrame, job_name: str,
+                                 watermark: int | None = None):
+        pass
+
+    @abstractmethod
+    def aggregate_biometrics_analytics(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_biometrics_watermark(self, job_name: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def get_biometrics_analytics_state(
+            self, patient_ids: list[int]
+    ) -> DataFrame:
+        pass
+
+    @abstractmethod
+    def save_biometrics_analytics_state(
+            self, state: DataFrame, job_name: str,
+            watermark: int | None = None
+    ):
+        pass
+
+    @abstractmethod
+    def delete_biometrics_analytics(self, patient_ids: list[int]):
+        pass
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Iterator
 
 from src.etl.domain.patient import Patient
 
@@ -6,9 +7,26 @@ from src.etl.domain.patient import Patient
 class IPatientRepository(ABC):
 
     @abstractmethod
-    def get_patients(self, patient_id: int, limit: int = 10) -> list[Patient]:
+    def get_patients(self, patient_id: int, limit: int = 10,
+                     use_primary: bool = False) -> list[Patient]:
         pass
 
     @abstractmethod
     def insert_patient(self, patients: list[Patient]):
         pass
+
+    @abstractmethod
+    def copy_patients(self, patients: list[Patient]) -> int:
+        pass
+
+    @abstractmethod
+    def count_patients(self) -> int:
+        pass
+
+    @abstractmethod
+    def iter_emails(self, batch_size: int = 10000) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def get_existing_emails(self, emails: list[str]) -> set[str]:
+        pass
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from kink import di
+
+from src.etl.domain.async_biometrics_repository import \
+    IAsyncBiometricsRepository
+from src.etl.domain.biometrics import Biometrics
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
+from src.etl.infrastructure.asyncpg_connection_pool import \
+    AsyncPGConnectionPool
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
+
+
+class AsyncPGBiometricsRepository(IAsyncBiometricsRepository):
+
+    def __init__(self, connection_pool: AsyncPGConnectionPool | None = None,
+                 read_router: AsyncPGReadRouter | None = None):
+        # An injected pool serves every read unless a router is provided
+        self._read_router = read_router or (
+            AsyncPGReadRouter(connection_pool)
+            if connection_pool is not None else di[AsyncPGReadRouter]
+        )
+
+    async def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
+                             test_date: datetime = datetime(1970, 1, 1),
+                             limit: int = 10, use_primary: bool = False
+                             ) -> list[Biometrics]:
+        pool = await self._read_router.read_pool(use_primary)
+        async with pool.connection() as connection:
+            rows = await connection.fetch(
+                """
+                SELECT patient_id, biometrics_id, test_date, glucose, 
+                systolic, diastolic, weight
+                FROM kannact.biometrics 
+                WHERE patient_id=$1 AND (biometrics_id, test_date) > ($2, $3) 
+                ORDER BY biometrics_id, test_date LIMIT $4
+                """, patient_id, biometrics_id, test_date, limit
+            )
+        return [Biometrics(**row) for row in rows]
+
+    async def get_biometrics_analytics(
+            self, patient_id: int
+    ) -> BiometricsAnalytics | None:
+        pool = await self._read_router.read_pool()
+        async with pool.connection() as connection:
+            row = await connection.fetchrow(
+                """
+                SELECT *
+                FROM kannact.biometrics_analytics
+                WHERE patient_id=$1
+                """, patient_id
+            )
+        return None if row is None else BiometricsAnalytics(**row)
+
+    async def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        pool = await self._read_router.read_pool()
+        async with pool.connection() as connection:
+            rows = await connection.fetch(
+                """
+                SELECT *
+                FROM kannact.biometrics_analytics_window
+                WHERE patient_id=$1
+                ORDER BY window_days
+                """, patient_id
+            )
+        return [BiometricsAnalyticsWindow(**row) for row in rows]
+
+    async def get_biometrics_sketch(
+            self, patient_id: int
+    ) -> dict[str, bytes] | None:
+        pool = await self._read_router.read_pool()
+        async with pool.connection() as connection:
+            row = await connection.fetchrow(
+                """
+                SELECT glucose, systolic, diastolic
+                FROM kannact.biometrics_sketch
+                WHERE patient_id=$1
+                """, patient_id
+            )
+        return None if row is None else dict(row)
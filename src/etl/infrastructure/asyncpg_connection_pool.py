@@ -0,0 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import asyncpg
+from kink import di
+
+
+class AsyncPGConnectionPool:
+    """
+    asyncpg pool used by the async repositories. It is created on the
+    first checkout, inside the event loop that will use it.
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 20,
+                 **connect_kwargs):
+        self._min_size = min_size
+        self._max_size = max_size
+        self._connect_kwargs = connect_kwargs or dict(
+            database="kannact", user="postgres", password="kannact",
+            host="192.168.1.92", port=15432
+        )
+        self._pool: asyncpg.Pool | None = None
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[asyncpg.Connection]:
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            yield connection
+
+    def stats(self) -> dict:
+        if self._pool is None:
+            return dict(min_size=self._min_size, max_size=self._max_size,
+                        size=0, idle=0)
+        return dict(min_size=self._min_size, max_size=self._max_size,
+                    size=self._pool.get_size(),
+                    idle=self._pool.get_idle_size())
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        min_size=self._min_size, max_size=self._max_size,
+                        **self._connect_kwargs
+                    )
+        return self._pool
+
+
+di[AsyncPGConnectionPool] = lambda di: AsyncPGConnectionPool()
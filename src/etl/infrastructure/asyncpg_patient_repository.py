@@ -0,0 +1,28 @@
+from kink import di
+
+from src.etl.domain.async_patient_repository import IAsyncPatientRepository
+from src.etl.domain.patient import Patient
+from src.etl.infrastructure.asyncpg_connection_pool import \
+    AsyncPGConnectionPool
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
+
+
+class AsyncPGPatientRepository(IAsyncPatientRepository):
+
+    def __init__(self, connection_pool: AsyncPGConnectionPool | None = None,
+                 read_router: AsyncPGReadRouter | None = None):
+        # An injected pool serves every read unless a router is provided
+        self._read_router = read_router or (
+            AsyncPGReadRouter(connection_pool)
+            if connection_pool is not None else di[AsyncPGReadRouter]
+        )
+
+    async def get_patients(self, patient_id: int, limit: int = 10,
+                           use_primary: bool = False) -> list[Patient]:
+        pool = await self._read_router.read_pool(use_primary)
+        async with pool.connection() as connection:
+            rows = await connection.fetch(
+                "SELECT * FROM kannact.patients WHERE patient_id>$1 LIMIT $2",
+                patient_id, limit
+            )
+        return [Patient(**row) for row in rows]
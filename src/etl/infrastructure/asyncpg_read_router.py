@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+import asyncpg
+from kink import di
+
+from src.etl.infrastructure.asyncpg_connection_pool import \
+    AsyncPGConnectionPool
+from src.etl.infrastructure.postgresql_read_router import REPLICA_LAG_QUERY
+
+logger = logging.getLogger(__name__)
+
+# Pool chosen by the last read_pool call of the current task, each request
+# runs in its own task so requests do not see each other's value
+_read_from_primary: ContextVar[bool] = ContextVar("read_from_primary",
+                                                  default=False)
+
+
+class AsyncPGReadRouter:
+    """
+    Same as PostgreSQLReadRouter for the async repositories: reads go to
+    the replica unless the primary is requested, no replica is configured
+    or the replica is more than max_lag seconds behind (or unreachable).
+    read_from_primary tells which pool the last read of the current request
+    used, so callers can act on the actual route instead of checking the
+    replica again.
+    """
+
+    def __init__(self, primary: AsyncPGConnectionPool,
+                 replica: AsyncPGConnectionPool | None = None,
+                 max_lag: float = 5, lag_check_interval: float = 1):
+        self._primary = primary
+        self._replica = replica
+        self._max_lag = max_lag
+        self._lag_check_interval = lag_check_interval
+        self._replica_fresh = False
+        self._lag_checked_at: float | None = None
+        self._metrics = dict(replica_reads=0, primary_reads=0,
+                             stale_fallbacks=0)
+
+    @property
+    def has_replica(self) -> bool:
+        return self._replica is not None
+
+    async def read_pool(self,
+                        use_primary: bool = False) -> AsyncPGConnectionPool:
+        if not use_primary and await self.is_replica_fresh():
+            self._metrics["replica_reads"] += 1
+            _read_from_primary.set(False)
+            return self._replica
+
+        self._metrics["primary_reads"] += 1
+        if not use_primary and self._replica is not None:
+            self._metrics["stale_fallbacks"] += 1
+        _read_from_primary.set(self._replica is not None)
+        return self._primary
+
+    def read_from_primary(self) -> bool:
+        """
+        True if the last read of the current task used the primary instead
+        of the replica (always False without replica).
+        """
+        return _read_from_primary.get()
+
+    async def is_replica_fresh(self) -> bool:
+        if self._replica is None:
+            return False
+        if (self._lag_checked_at is not None and time.monotonic()
+                - self._lag_checked_at < self._lag_check_interval):
+            return self._replica_fresh
+
+        try:
+            async with self._replica.connection() as connection:
+                lag = float(await connection.fetchval(REPLICA_LAG_QUERY))
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+            logger.warning("Replica unreachable, reading from the primary")
+            lag = None
+
+        self._replica_fresh = lag is not None and lag <= self._max_lag
+        self._lag_checked_at = time.monotonic()
+        if lag is not None and not self._replica_fresh:
+            logger.warning("Replica %.1fs behind, reading from the primary",
+                           lag)
+        return self._replica_fresh
+
+    def stats(self) -> dict:
+        return dict(replica=self.has_replica,
+                    replica_fresh=self._replica_fresh, **self._metrics)
+
+    async def close(self):
+        if self._replica is not None:
+            await self._replica.close()
+
+
+di[AsyncPGReadRouter] = lambda di: AsyncPGReadRouter(di[AsyncPGConnectionPool])
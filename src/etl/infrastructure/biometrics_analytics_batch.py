@@ -1,10 +1,10 @@
 from kink import di
 from pandas import DataFrame
-from psycopg2 import connect
 
 from src.etl.application.biometrics_service import BiometricsService
-from src.etl.application.dto import BiometricsAnalyticsDTO
 from src.etl.domain.biometrics_repository import IBiometricsRepository
+from src.etl.infrastructure.biometrics_analytics_partitioned import \
+    calculate_metrics_partitioned
 from src.etl.infrastructure.postgresql_biometrics_repository import \
     PostgreSQLBiometricsRepository
 
@@ -21,24 +21,61 @@ class BiometricsAnalyticsBatch:
     def __init__(self):
         self._biometrics_repo: IBiometricsRepository = di[IBiometricsRepository]
         self._biometrics_service: BiometricsService = di[BiometricsService]
-        self._connection = connect(database="kannact", user="postgres",
-                                   password="kannact", host="192.168.1.92",
-                                   port=15432)
 
-    def calculate_metrics(self):
+    def calculate_metrics(self, engine: str = 'pandas',
+                          partitions: int | None = None,
+                          workers: int | None = None):
+        """
+        Engines:
+        - pandas: whole table is read and aggregated with pandas.
+        - incremental: only biometrics inserted since the previous run are
+        read and folded into running aggregates of their patients.
+        - sql: aggregation runs inside PostgreSQL, no rows are transferred.
+        - partitioned: biometrics are read and aggregated by patient_id
+        ranges in parallel (dask), memory is bounded by the partition size.
+        - streaming: biometrics are streamed from a server side cursor in
+        chunks, memory is bounded by the chunk size.
+        """
+        if engine == 'incremental':
+            self._biometrics_service.update_biometrics_analytics_incremental()
+            return
+        if engine == 'sql':
+            self._biometrics_service.aggregate_biometrics_analytics_in_database()
+            return
+        if engine == 'streaming':
+            self._biometrics_service.calculate_biometrics_analytics_streaming()
+            return
+        if engine == 'partitioned':
+            patient_id_range = self._biometrics_repo.get_patient_id_range()
+            if patient_id_range is not None:
+                calculate_metrics_partitioned(
+                    min_patient_id=patient_id_range[0],
+                    max_patient_id=patient_id_range[1],
+                    partitions=partitions, workers=workers
+                )
+            return
+        if engine != 'pandas':
+            raise ValueError(f"Unknown analytics engine {engine}")
+
         df: DataFrame = self._biometrics_repo.get_dataframe_biometrics()
+        df = df.drop(columns=['biometrics_id'])
 
         df = df.groupby(['patient_id'], as_index=False).agg(['mean', 'min', 'max'])
         df = flatten_cols(df=df)
 
-        result: list[BiometricsAnalyticsDTO] = []
-        for row in df.to_dict(orient='records'):
-            b: BiometricsAnalyticsDTO = BiometricsAnalyticsDTO(**row)
-            result.append(b)
+        self._biometrics_service.upsert_biometrics_analytics_dataframe(df)
+
+    def calculate_window_metrics(self):
+        """
+        Rolling 7, 30 and 90 days analytics ending today.
+        """
+        self._biometrics_service.update_biometrics_analytics_windows()
 
-        self._biometrics_service.upsert_biometrics_analytics(
-            result
-        )
+    def calculate_percentiles(self):
+        """
+        Folds new biometrics into the per patient quantile sketches.
+        """
+        self._biometrics_service.update_biometrics_percentiles_incremental()
 
 
 def flatten_cols(df):
@@ -0,0 +1,66 @@
+"""
+Out-of-core analytics, biometrics are read by patient_id ranges and each
+range is aggregated and written by a dask task, so only a few partitions
+are in memory at the same time. Tasks run in other processes, this module
+must not open connections at import time.
+"""
+import os
+
+import dask
+
+from src.etl.application.biometrics_service import BiometricsService
+from src.etl.infrastructure.postgresql_biometrics_repository import \
+    PostgreSQLBiometricsRepository
+
+# One service (and connection) per worker process
+_biometrics_service: BiometricsService | None = None
+
+
+def calculate_metrics_partitioned(
+        min_patient_id: int, max_patient_id: int,
+        partitions: int | None = None, workers: int | None = None,
+        scheduler: str = "processes"
+) -> int:
+    """
+    Splits [min_patient_id, max_patient_id] in ranges and aggregates them
+    in parallel using the local dask scheduler. Each partition writes its
+    results as soon as it finishes. Returns the number of patients updated.
+    """
+    workers = workers or os.cpu_count()
+    partitions = partitions or workers * 4
+    tasks = [
+        dask.delayed(calculate_partition_metrics)(low, high)
+        for low, high in patient_id_ranges(min_patient_id, max_patient_id,
+                                           partitions)
+    ]
+    results = dask.compute(*tasks, scheduler=scheduler,
+                           num_workers=workers)
+    return sum(results)
+
+
+def patient_id_ranges(min_patient_id: int, max_patient_id: int,
+                      partitions: int) -> list[tuple[int, int]]:
+    """
+    Contiguous ranges (both limits included) covering all patient ids.
+    """
+    size = max((max_patient_id - min_patient_id + 1) // partitions, 1)
+    ranges = []
+    low = min_patient_id
+    while low <= max_patient_id:
+        high = min(low + size - 1, max_patient_id)
+        ranges.append((low, high))
+        low = high + 1
+    return ranges
+
+
+def calculate_partition_metrics(min_patient_id: int,
+                                max_patient_id: int) -> int:
+    global _biometrics_service
+    if _biometrics_service is None:
+        _biometrics_service = BiometricsService(
+            biometrics_repo=PostgreSQLBiometricsRepository()
+        )
+
+    return _biometrics_service.calculate_biometrics_analytics_range(
+        min_patient_id=min_patient_id, max_patient_id=max_patient_id
+    )
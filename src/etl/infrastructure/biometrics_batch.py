@@ -1,13 +1,27 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 from kink import di
 
 from src.etl.application.biometrics_service import BiometricsService
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe, BIOMETRICS_COLUMNS
 from src.etl.application.dto import BiometricsDTO
 from src.etl.domain.biometrics_repository import IBiometricsRepository
 
 from pandas import DataFrame, read_csv
 
+from src.etl.infrastructure.checkpoint import CheckpointManifest
+from src.etl.infrastructure.columnar_files import is_columnar_file, \
+    iter_columnar_chunks, read_columnar_file
+from src.etl.infrastructure.csv_shards import split_csv_shards, \
+    validate_csv_shard, iter_csv_chunks
+from src.etl.infrastructure.pipeline import run_pipeline
 from src.etl.infrastructure.postgresql_biometrics_repository import \
     PostgreSQLBiometricsRepository
+from src.etl.infrastructure.rejected_row_sink import NDJSONRejectedRowSink, \
+    validation_reason
 
 biometrics_repo = PostgreSQLBiometricsRepository()
 di[IBiometricsRepository] = biometrics_repo
@@ -15,39 +29,198 @@ di[BiometricsService] = BiometricsService(
     biometrics_repo=di[IBiometricsRepository]
 )
 
+# Columns read from columnar files, weight_unit is optional
+_INPUT_COLUMNS = [*BIOMETRICS_COLUMNS, "weight_unit"]
+_COLUMNAR_CHUNK_SIZE = 100000
+
 
-def get_biometrics_batch(dp: DataFrame) -> list[BiometricsDTO]:
+def get_biometrics_batch(
+        dp: DataFrame, rejected_sink: NDJSONRejectedRowSink | None = None,
+        source: str = ''
+) -> list[BiometricsDTO]:
 
     biometrics_batch: list[BiometricsDTO] = []
-    for row in dp.to_dict(orient='records'):
+    # Index is the row number in the file, line 1 is the header
+    for line_number, row in zip(dp.index + 2, dp.to_dict(orient='records')):
         try:
             biometrics: BiometricsDTO = BiometricsDTO(**row)
             biometrics_batch.append(biometrics)
-        except ValueError:
-            """
-            rows not parsed must be stored into 
-            a table or file to be checked later
-            """
-            pass
+        except ValueError as e:
+            if rejected_sink is not None:
+                rejected_sink.put(source=source, line_number=int(line_number),
+                                  reason=validation_reason(e), row=row)
 
     return biometrics_batch
 
 
 class BiometricsBatch:
-    def __init__(self):
+    def __init__(self,
+                 rejected_file_path: str = './biometrics_rejected.ndjson',
+                 checkpoint_dir: str = './biometrics_checkpoints'):
         self._biometrics_service = di[BiometricsService]
+        self._rejected_file_path = rejected_file_path
+        self._checkpoint_manifest = CheckpointManifest(checkpoint_dir)
 
-    def process_patient_file(self):
-        dp: DataFrame = read_csv('./biometrics_data_sample.csv')
-        biometrics_batch: list[BiometricsDTO] = get_biometrics_batch(dp)
-        biometrics_error: list[BiometricsDTO] = self._biometrics_service.insert_biometrics(
-            weight_unit='metric', biometrics_dto_list=biometrics_batch
-        )
-        if len(biometrics_error):
-            """
-            biometrics validation fails must be stored into 
-            a table or file to be checked later
-            """
-            pass
+    def process_patient_file(self,
+                             file_path: str = './biometrics_data_sample.csv',
+                             chunk_size: int | None = None,
+                             pipeline_depth: int = 2):
+        """
+        When chunk_size is provided the file is streamed, reader, validator
+        and writer run as a pipeline connected by queues of pipeline_depth
+        chunks, so memory usage does not depend on the file size.
+        In streaming mode a checkpoint is saved after each chunk, a rerun
+        for the same file continues from the first uncommitted chunk.
+        Parquet and Arrow IPC files (by extension) are read memory mapped
+        and only the biometrics columns are loaded.
+        """
+        columnar = is_columnar_file(file_path)
+        # Rows in columnar files are numbered from 1, there is no header
+        line_offset = 1 if columnar else 2
+
+        with NDJSONRejectedRowSink(self._rejected_file_path) as sink:
+            if chunk_size is None:
+                dp = (read_columnar_file(file_path, columns=_INPUT_COLUMNS)
+                      if columnar else read_csv(file_path))
+                self._process_dataframe(dp=dp, source=file_path,
+                                        rejected_sink=sink,
+                                        line_offset=line_offset)
+                return
+
+            start_offset, row_count = self._resume_point(file_path)
+            if row_count is None:
+                return
+
+            def validate(chunk: tuple[int, DataFrame]):
+                offset, dp = chunk
+                valid, rejected = validate_biometrics_dataframe(
+                    df=dp, weight_unit='metric'
+                )
+                return offset, len(dp), valid, rejected
+
+            def write(chunk: tuple[int, int, DataFrame, DataFrame]):
+                nonlocal row_count
+                offset, rows, valid, rejected = chunk
+                self._biometrics_service.insert_valid_biometrics_dataframe(
+                    df=valid
+                )
+                sink.put_dataframe(source=file_path, df=rejected,
+                                   line_offset=line_offset)
+                row_count += rows
+                # Columnar files are resumed by row count
+                self._checkpoint_manifest.save(
+                    file_path=file_path,
+                    byte_offset=None if columnar else offset,
+                    row_count=row_count
+                )
+
+            if columnar:
+                chunks = iter_columnar_chunks(file_path=file_path,
+                                              chunk_size=chunk_size,
+                                              columns=_INPUT_COLUMNS,
+                                              start_row=row_count)
+            else:
+                chunks = iter_csv_chunks(file_path=file_path,
+                                         chunk_size=chunk_size,
+                                         start_offset=start_offset,
+                                         start_row=row_count)
+
+            # Reading and validating next chunks overlaps with writing
+            run_pipeline(
+                source=chunks,
+                stages=[validate, write],
+                maxsize=pipeline_depth
+            )
+
+            self._checkpoint_manifest.save(file_path=file_path,
+                                           byte_offset=None,
+                                           row_count=row_count,
+                                           completed=True)
 
+    def process_patient_file_parallel(
+            self, file_path: str = './biometrics_data_sample.csv',
+            workers: int | None = None,
+            shard_size: int = 64 * 1024 * 1024):
+        """
+        The file is split in byte ranges of shard_size, parsing and
+        validation run in a process pool while this process writes the
+        results to the database in file order, so output is the same as
+        the serial mode. Only a few shards per worker are kept in flight
+        to bound memory. Columnar files need no parsing, they are streamed
+        by process_patient_file.
+        """
+        if is_columnar_file(file_path):
+            self.process_patient_file(file_path=file_path,
+                                      chunk_size=_COLUMNAR_CHUNK_SIZE)
+            return
 
+        start_offset, rows_read = self._resume_point(file_path)
+        if rows_read is None:
+            return
+
+        workers = workers or os.cpu_count()
+        columns, shards = split_csv_shards(file_path=file_path,
+                                           shard_size=shard_size,
+                                           start_offset=start_offset)
+        pending_shards = iter(shards)
+        in_flight = deque()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor, \
+                NDJSONRejectedRowSink(self._rejected_file_path) as sink:
+            def submit_next() -> bool:
+                shard = next(pending_shards, None)
+                if shard is None:
+                    return False
+                in_flight.append((shard[1], executor.submit(
+                    validate_csv_shard, file_path, columns, shard[0],
+                    shard[1], 'metric'
+                )))
+                return True
+
+            while len(in_flight) < workers * 2 and submit_next():
+                pass
+
+            while in_flight:
+                shard_end, future = in_flight.popleft()
+                valid, rejected, rows = future.result()
+                submit_next()
+
+                # Index relative to the file as the serial mode does
+                valid.index += rows_read
+                rejected.index += rows_read
+                rows_read += rows
+
+                self._biometrics_service.insert_valid_biometrics_dataframe(
+                    df=valid
+                )
+                sink.put_dataframe(source=file_path, df=rejected)
+                self._checkpoint_manifest.save(
+                    file_path=file_path, byte_offset=shard_end,
+                    row_count=rows_read
+                )
+
+        self._checkpoint_manifest.save(file_path=file_path, byte_offset=None,
+                                       row_count=rows_read, completed=True)
+
+    def _resume_point(self, file_path: str) -> tuple[int | None, int | None]:
+        """
+        Returns the byte offset and rows already loaded for the file,
+        row count is None when the file was completely loaded.
+        """
+        checkpoint = self._checkpoint_manifest.load(file_path=file_path)
+        if checkpoint is None:
+            return None, 0
+        if checkpoint.completed:
+            return None, None
+        return checkpoint.byte_offset, checkpoint.row_count
+
+    def _process_dataframe(self, dp: DataFrame, source: str,
+                           rejected_sink: NDJSONRejectedRowSink,
+                           line_offset: int = 2):
+        biometrics_error: DataFrame = (
+            self._biometrics_service.insert_biometrics_dataframe(
+                weight_unit='metric', df=dp
+            )
+        )
+        rejected_sink.put_dataframe(source=source, df=biometrics_error,
+                                    line_offset=line_offset)
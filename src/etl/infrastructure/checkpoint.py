@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from pydantic import BaseModel
+
+# Bytes used to identify the content of a file
+_IDENTITY_HEAD_SIZE = 1024 * 1024
+
+
+class Checkpoint(BaseModel):
+    file_path: str
+    file_size: int
+    file_head_sha256: str
+    byte_offset: Optional[int] = None
+    row_count: int = 0
+    completed: bool = False
+
+
+class CheckpointManifest:
+    """
+    JSON manifests storing how far an ingestion run went for each file. A
+    manifest is written after each committed chunk so a rerun can continue
+    from the first uncommitted chunk instead of loading the whole file
+    again.
+
+    Every file has its own manifest in checkpoint_dir, named after the hash
+    of its absolute path, so runs on different files do not overwrite each
+    other's checkpoint.
+
+    The manifest is written after the database commit, if the process dies
+    between both only the last chunk is loaded twice.
+    """
+
+    def __init__(self, checkpoint_dir: str):
+        self._checkpoint_dir = checkpoint_dir
+
+    def load(self, file_path: str) -> Checkpoint | None:
+        """
+        Returns the checkpoint if it belongs to the same file (path, size
+        and content), otherwise None and ingestion must start from scratch.
+        """
+        manifest_path = self._manifest_path(file_path)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, encoding="utf-8") as f:
+            checkpoint = Checkpoint(**json.load(f))
+
+        identity = checkpoint.model_dump(
+            include={"file_path", "file_size", "file_head_sha256"}
+        )
+        if identity != _file_identity(file_path):
+            return None
+
+        return checkpoint
+
+    def save(self, file_path: str, byte_offset: int | None, row_count: int,
+             completed: bool = False):
+        checkpoint = Checkpoint(**_file_identity(file_path),
+                                byte_offset=byte_offset, row_count=row_count,
+                                completed=completed)
+
+        # Atomic replace, a crash never leaves a half written manifest
+        manifest_path = self._manifest_path(file_path)
+        os.makedirs(self._checkpoint_dir, exist_ok=True)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint.model_dump(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+
+    def _manifest_path(self, file_path: str) -> str:
+        path_sha256 = hashlib.sha256(
+            os.path.abspath(file_path).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self._checkpoint_dir, f"{path_sha256}.json")
+
+
+def _file_identity(file_path: str) -> dict:
+    with open(file_path, "rb") as f:
+        head = f.read(_IDENTITY_HEAD_SIZE)
+
+    return {
+        "file_path": os.path.abspath(file_path),
+        "file_size": os.path.getsize(file_path),
+        "file_head_sha256": hashlib.sha256(head).hexdigest(),
+    }
@@ -0,0 +1,199 @@
+"""
+Readers for Parquet and Arrow IPC (Feather v2) files. Files are memory
+mapped and only the requested columns are read (column projection), values
+keep the types stored in the file so no text parsing is needed.
+pyarrow is imported lazily, it is only required to read these formats
+(or to export biometrics as a Parquet dataset).
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from pandas import DataFrame, to_datetime
+
+from src.etl.application.biometrics_columns import BIOMETRICS_DATAFRAME_DTYPES
+
+PARQUET_EXTENSIONS = {".parquet", ".pq"}
+ARROW_EXTENSIONS = {".arrow", ".feather", ".ipc"}
+# Batch size used to read a whole file at once
+_READ_ALL = 2 ** 62
+
+
+def is_columnar_file(file_path: str) -> bool:
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension in PARQUET_EXTENSIONS | ARROW_EXTENSIONS
+
+
+def iter_columnar_batches(
+        file_path: str, batch_size: int, columns: list[str] | None = None,
+        start_row: int = 0
+) -> Iterator:
+    """
+    Yields pyarrow tables of up to batch_size rows with the row number
+    where the batch ends, that number can be used as start_row to continue
+    reading later. Requested columns missing in the file are ignored.
+    """
+    if os.path.splitext(file_path)[1].lower() in PARQUET_EXTENSIONS:
+        yield from _iter_parquet_batches(file_path, batch_size, columns,
+                                         start_row)
+    else:
+        yield from _iter_arrow_batches(file_path, batch_size, columns,
+                                       start_row)
+
+
+def iter_columnar_chunks(
+        file_path: str, chunk_size: int, columns: list[str] | None = None,
+        start_row: int = 0
+) -> Iterator[tuple[int, DataFrame]]:
+    """
+    Same as iter_columnar_batches but yields DataFrames, index is the row
+    number in the file like iter_csv_chunks does.
+    """
+    row = start_row
+    for end_row, table in iter_columnar_batches(file_path, chunk_size,
+                                                columns, start_row):
+        df = table.to_pandas(date_as_object=False,
+                             coerce_temporal_nanoseconds=True)
+        df.index += row
+        row = end_row
+        yield end_row, df
+
+
+def iter_columnar_records(
+        file_path: str, batch_size: int, columns: list[str] | None = None,
+        start_row: int = 0
+) -> Iterator[tuple[int, list[dict]]]:
+    """
+    Same as iter_columnar_batches but yields lists of records (dicts),
+    NULL values are None.
+    """
+    for end_row, table in iter_columnar_batches(file_path, batch_size,
+                                                columns, start_row):
+        yield end_row, table.to_pylist()
+
+
+def read_columnar_file(file_path: str,
+                       columns: list[str] | None = None) -> DataFrame:
+    chunks = [df for _, df in iter_columnar_chunks(
+        file_path, chunk_size=_READ_ALL, columns=columns
+    )]
+    if not chunks:
+        return DataFrame(columns=columns)
+    return chunks[0]
+
+
+@contextmanager
+def replace_dataset(root_path: str) -> Iterator[str]:
+    """
+    Yields a new directory next to root_path, it replaces root_path when
+    the block ends without errors. An export run twice does not append its
+    rows to the previous one, and a failed export leaves it in place.
+    """
+    root_path = os.path.abspath(root_path)
+    parent = os.path.dirname(root_path)
+    os.makedirs(parent, exist_ok=True)
+    export_path = tempfile.mkdtemp(prefix=".export-", dir=parent)
+    try:
+        yield export_path
+    except BaseException:
+        shutil.rmtree(export_path, ignore_errors=True)
+        raise
+
+    previous_path = None
+    if os.path.exists(root_path):
+        previous_path = tempfile.mkdtemp(prefix=".previous-", dir=parent)
+        os.rename(root_path, os.path.join(previous_path, "dataset"))
+    os.rename(export_path, root_path)
+    if previous_path is not None:
+        shutil.rmtree(previous_path)
+
+
+def write_biometrics_parquet(df: DataFrame, root_path: str):
+    """
+    Appends biometrics to a Parquet dataset partitioned by test year and
+    month (root_path/test_year=2024/test_month=1/...), used by every
+    repository backend so exports have the same layout and types. Exports
+    write into replace_dataset so reruns replace the dataset.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    test_date = to_datetime(df["test_date"])
+    df = df.astype(BIOMETRICS_DATAFRAME_DTYPES).assign(
+        test_date=test_date.dt.date.where(test_date.notna(), None),
+        test_year=test_date.dt.year.astype("Int16"),
+        test_month=test_date.dt.month.astype("Int8")
+    )
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False),
+                        root_path=root_path,
+                        partition_cols=["test_year", "test_month"])
+
+
+def _iter_parquet_batches(file_path: str, batch_size: int,
+                          columns: list[str] | None, start_row: int):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    columns = _project(parquet_file.schema_arrow.names, columns)
+
+    # Row groups before start_row are not read at all
+    row_groups = []
+    skip = start_row
+    for i in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(i).num_rows
+        if not row_groups and skip >= group_rows:
+            skip -= group_rows
+            continue
+        row_groups.append(i)
+
+    row = start_row - skip
+    pending = []
+    pending_rows = 0
+    for batch in parquet_file.iter_batches(
+            batch_size=min(batch_size, 1024 * 1024), row_groups=row_groups,
+            columns=columns):
+        if skip:
+            dropped = min(skip, batch.num_rows)
+            batch = batch.slice(dropped)
+            skip -= dropped
+            row += dropped
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            row += batch_size
+            yield row, table.slice(0, batch_size)
+            pending = table.slice(batch_size).to_batches()
+            pending_rows -= batch_size
+    if pending_rows:
+        row += pending_rows
+        yield row, pa.Table.from_batches(pending)
+
+
+def _iter_arrow_batches(file_path: str, batch_size: int,
+                        columns: list[str] | None, start_row: int):
+    import pyarrow as pa
+
+    # Memory mapped, slices are zero copy views of the file
+    with pa.memory_map(file_path) as source:
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            source.seek(0)
+            table = pa.ipc.open_stream(source).read_all()
+        table = table.select(_project(table.column_names, columns))
+
+        for start in range(start_row, table.num_rows, batch_size):
+            batch = table.slice(start, batch_size)
+            yield start + batch.num_rows, batch
+
+
+def _project(names: list[str], columns: list[str] | None) -> list[str]:
+    if columns is None:
+        return names
+    return [column for column in columns if column in names]
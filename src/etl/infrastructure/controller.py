@@ -1,5 +1,6 @@
 import base64
 import json
+from datetime import datetime
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, status, Query, HTTPException
@@ -8,10 +9,18 @@ from fastapi.responses import JSONResponse
 from kink import di
 
 from src.building_blokcs.errors import APIErrorMessage
-from src.etl.application.biometrics_service import BiometricsService
+from src.etl.application.biometrics_service import BiometricsService, \
+    AsyncBiometricsService
 from src.etl.application.dto import PatientDTO, PatientPaginationDTO, \
-    BiometricsPaginationDTO, BiometricsDTO, BiometricsAnalyticsDTO
-from src.etl.application.patient_service import PatientService
+    BiometricsPaginationDTO, BiometricsDTO, BiometricsAnalyticsDTO, \
+    BiometricsAnalyticsWindowDTO, BiometricsPercentilesDTO
+from src.etl.application.patient_service import PatientService, \
+    AsyncPatientService
+from src.etl.infrastructure.asyncpg_biometrics_repository import \
+    AsyncPGBiometricsRepository
+from src.etl.infrastructure.asyncpg_patient_repository import \
+    AsyncPGPatientRepository
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
 from src.etl.infrastructure.postgresql_biometrics_repository import \
     PostgreSQLBiometricsRepository
 from src.etl.infrastructure.postgresql_patient_repository import \
@@ -23,8 +32,57 @@ di[PatientService] = PatientService(patient_repo=patient_repo)
 biometrics_repo = PostgreSQLBiometricsRepository()
 di[BiometricsService] = BiometricsService(biometrics_repo=biometrics_repo)
 
+# Read endpoints use async repositories, writes run in the thread pool
+di[AsyncPatientService] = AsyncPatientService(
+    patient_repo=AsyncPGPatientRepository()
+)
+di[AsyncBiometricsService] = AsyncBiometricsService(
+    biometrics_repo=AsyncPGBiometricsRepository()
+)
+
 router = APIRouter()
 
+# Marks page tokens of sequences read from the primary
+PRIMARY_ROUTE = "primary"
+
+
+def _next_route(token_route: str | None) -> str | None:
+    """
+    Route of the next page token. Once a page of the sequence is read from
+    the primary (the replica was behind) the next ones are read from the
+    primary too, a sequence never goes back to the replica, it could be
+    missing rows the client has already seen. The route is the pool
+    actually used by the read, not a second freshness check.
+    """
+    if (token_route == PRIMARY_ROUTE
+            or di[AsyncPGReadRouter].read_from_primary()):
+        return PRIMARY_ROUTE
+    return None
+
+
+def _decode_patients_token(token: str) -> tuple[int, str | None]:
+    patient_id, _, route = token.partition(":")
+    return int(patient_id), route or None
+
+
+def _encode_patients_token(patient_id: int, route: str | None) -> str:
+    return f"{patient_id}:{route}" if route else str(patient_id)
+
+
+def _decode_history_token(token: str) -> tuple[int, datetime, str | None]:
+    token_tuple = json.loads(base64.urlsafe_b64decode(token).decode("utf-8"))
+    route = token_tuple[2] if len(token_tuple) > 2 else None
+    return token_tuple[0], datetime.fromisoformat(token_tuple[1]), route
+
+
+def _encode_history_token(biometrics_id: int, test_date: datetime,
+                          route: str | None) -> bytes:
+    token_tuple = (biometrics_id, test_date)
+    if route:
+        token_tuple += (route,)
+    return base64.urlsafe_b64encode(
+        json.dumps(jsonable_encoder(token_tuple)).encode())
+
 
 @router.get(
     "/patients",
@@ -39,15 +97,17 @@ router = APIRouter()
 )
 async def patients(
         next_page_token: str = "0", limit: int = 10,
-        service: PatientService = Depends(lambda: di[PatientService]),
+        service: AsyncPatientService = Depends(
+            lambda: di[AsyncPatientService]),
 ) -> JSONResponse:
-    patient_id = int(next_page_token)
-    patients_dto: list[PatientDTO] = service.get_patients(patient_id=patient_id,
-                                                          limit=limit)
-    patient_pagination_dto = PatientPaginationDTO(patients=patients_dto,
-                                                  next_page_token=str(
-                                                      patients_dto[
-                                                          -1].patient_id))
+    patient_id, token_route = _decode_patients_token(next_page_token)
+    patients_dto: list[PatientDTO] = await service.get_patients(
+        patient_id=patient_id, limit=limit,
+        use_primary=token_route == PRIMARY_ROUTE)
+    new_next_page_token = _encode_patients_token(
+        patients_dto[-1].patient_id, _next_route(token_route))
+    patient_pagination_dto = PatientPaginationDTO(
+        patients=patients_dto, next_page_token=new_next_page_token)
     if len(patients_dto):
         status_code = status.HTTP_200_OK
     else:
@@ -71,22 +131,23 @@ async def patients_history(
         patient_id: int,
         filter_by: Annotated[list[str] | None, Query()] = None,
         next_page_token: str | None = None, limit: int = 10,
-        service: BiometricsService = Depends(lambda: di[BiometricsService]),
+        service: AsyncBiometricsService = Depends(
+            lambda: di[AsyncBiometricsService]),
 ) -> JSONResponse:
     if next_page_token:
-        token_decode = base64.urlsafe_b64decode(next_page_token)
-        token_tuple = tuple(json.loads(token_decode.decode("utf-8")))
-        biometrics_id = token_tuple[0]
-        test_date = token_tuple[1]
-        biometrics_dto: list[BiometricsDTO] = service.get_biometrics(
+        biometrics_id, test_date, token_route = _decode_history_token(
+            next_page_token)
+        biometrics_dto: list[BiometricsDTO] = await service.get_biometrics(
             patient_id=patient_id,
             weight_unit='metric',
             biometrics_id=biometrics_id,
             test_date=test_date,
-            limit=limit
+            limit=limit,
+            use_primary=token_route == PRIMARY_ROUTE
         )
     else:
-        biometrics_dto: list[BiometricsDTO] = service.get_biometrics(
+        token_route = None
+        biometrics_dto: list[BiometricsDTO] = await service.get_biometrics(
             patient_id=patient_id, weight_unit='metric', limit=limit
         )
 
@@ -95,11 +156,10 @@ async def patients_history(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     status_code = status.HTTP_200_OK
-    next_token_tuple = (
-        biometrics_dto[-1].biometrics_id, biometrics_dto[-1].test_date
+    new_next_token_page = _encode_history_token(
+        biometrics_dto[-1].biometrics_id, biometrics_dto[-1].test_date,
+        _next_route(token_route)
     )
-    new_next_token_page = base64.urlsafe_b64encode(
-        json.dumps(jsonable_encoder(next_token_tuple)).encode())
 
     biometrics_pagination_dto = BiometricsPaginationDTO(
         biometrics_history=biometrics_dto, next_page_token=new_next_token_page)
@@ -132,10 +192,11 @@ async def patients_history(
 )
 async def patient_metrics(
         patient_id: int,
-        service: BiometricsService = Depends(lambda: di[BiometricsService]),
+        service: AsyncBiometricsService = Depends(
+            lambda: di[AsyncBiometricsService]),
 ) -> JSONResponse:
     biometrics_analytics_dto: BiometricsAnalyticsDTO = (
-        service.get_patient_biometrics_analytics(patient_id=patient_id)
+        await service.get_patient_biometrics_analytics(patient_id=patient_id)
     )
 
     if biometrics_analytics_dto is None:
@@ -146,6 +207,66 @@ async def patient_metrics(
         status_code=status.HTTP_200_OK)
 
 
+@router.get(
+    "/patient/{patient_id}/metrics/windows",
+    response_model=list[BiometricsAnalyticsWindowDTO],
+    responses={
+        400: {"model": APIErrorMessage},
+        401: {"model": APIErrorMessage},
+        500: {"model": APIErrorMessage},
+    },
+    tags=["Get derived metrics for a patient"],
+    description="Get patient derived biometrics over the last 7, 30 and 90 days. Windows without biometrics are not returned.",
+)
+async def patient_metrics_windows(
+        patient_id: int,
+        service: AsyncBiometricsService = Depends(
+            lambda: di[AsyncBiometricsService]),
+) -> JSONResponse:
+    windows_dto: list[BiometricsAnalyticsWindowDTO] = (
+        await service.get_patient_biometrics_analytics_windows(
+            patient_id=patient_id
+        )
+    )
+
+    if not windows_dto:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return JSONResponse(
+        content=jsonable_encoder([w.model_dump() for w in windows_dto]),
+        status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/patient/{patient_id}/metrics/percentiles",
+    response_model=BiometricsPercentilesDTO,
+    responses={
+        400: {"model": APIErrorMessage},
+        401: {"model": APIErrorMessage},
+        500: {"model": APIErrorMessage},
+    },
+    tags=["Get derived metrics for a patient"],
+    description="Get patient median and 95th percentile of glucose and blood pressure.",
+)
+async def patient_metrics_percentiles(
+        patient_id: int,
+        service: AsyncBiometricsService = Depends(
+            lambda: di[AsyncBiometricsService]),
+) -> JSONResponse:
+    percentiles_dto: BiometricsPercentilesDTO = (
+        await service.get_patient_biometrics_percentiles(
+            patient_id=patient_id
+        )
+    )
+
+    if percentiles_dto is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return JSONResponse(
+        content=jsonable_encoder(percentiles_dto.model_dump()),
+        status_code=status.HTTP_200_OK)
+
+
 @router.post(
     "/biometrics",
     response_model=BiometricsDTO,
@@ -157,7 +278,7 @@ async def patient_metrics(
     tags=["Add biometrics"],
     description="Add biometrics for patient.",
 )
-async def add_biometrics(
+def add_biometrics(
         model: BiometricsDTO,
         service: BiometricsService = Depends(lambda: di[BiometricsService]),
 ) -> JSONResponse:
@@ -177,7 +298,7 @@ async def add_biometrics(
     description="Upsert patient biometrics.",
     status_code=204,
 )
-async def upsert_biometrics(
+def upsert_biometrics(
         model: BiometricsDTO,
         service: BiometricsService = Depends(lambda: di[BiometricsService]),
 ) -> None:
@@ -196,7 +317,7 @@ async def upsert_biometrics(
     description="Update one entry of patient biometrics.",
     status_code=204,
 )
-async def delete_biometrics(
+def delete_biometrics(
         model: BiometricsDTO,
         service: BiometricsService = Depends(lambda: di[BiometricsService]),
 ) -> None:
@@ -0,0 +1,103 @@
+"""
+Helpers to read a CSV file by byte ranges, used to split the file in shards
+parsed and validated in different processes and to resume a run from a
+byte offset. This module must not have side effects at import time
+(no connections) as it is imported by workers.
+"""
+import csv
+import io
+import os
+from itertools import islice
+from typing import Iterator
+
+from pandas import DataFrame, read_csv
+
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe
+
+
+def split_csv_shards(
+        file_path: str, shard_size: int, start_offset: int | None = None
+) -> tuple[list[str], list[tuple[int, int]]]:
+    """
+    Returns the header columns and the list of (start, end) byte offsets.
+    Offsets are aligned to the beginning of a line.
+    """
+    file_size = os.path.getsize(file_path)
+    shards: list[tuple[int, int]] = []
+
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        start = f.tell() if start_offset is None else start_offset
+        while start < file_size:
+            f.seek(min(start + shard_size, file_size))
+            if f.tell() < file_size:
+                # Move to the end of the current line
+                f.readline()
+            end = f.tell()
+            shards.append((start, end))
+            start = end
+
+    return _parse_header(header), shards
+
+
+def iter_csv_chunks(
+        file_path: str, chunk_size: int, start_offset: int | None = None,
+        start_row: int = 0
+) -> Iterator[tuple[int, DataFrame]]:
+    """
+    Yields chunks of chunk_size lines with the byte offset where the chunk
+    ends, that offset can be used later to continue reading the file.
+    Index is the row number in the file like read_csv does.
+    """
+    with open(file_path, "rb") as f:
+        columns = _parse_header(f.readline())
+        if start_offset is not None:
+            f.seek(start_offset)
+
+        row = start_row
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+
+            dp: DataFrame = _parse_csv_bytes(data=b"".join(lines),
+                                             columns=columns)
+            dp.index += row
+            row += len(dp)
+            yield f.tell(), dp
+
+
+def read_csv_shard(file_path: str, columns: list[str],
+                   start: int, end: int) -> DataFrame:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    return _parse_csv_bytes(data=data, columns=columns)
+
+
+def validate_csv_shard(
+        file_path: str, columns: list[str], start: int, end: int,
+        weight_unit: str
+) -> tuple[DataFrame, DataFrame, int]:
+    """
+    Worker entry point, returns valid rows, rejected rows and the number of
+    rows of the shard. Index is relative to the shard.
+    """
+    dp: DataFrame = read_csv_shard(file_path=file_path, columns=columns,
+                                   start=start, end=end)
+    valid, rejected = validate_biometrics_dataframe(df=dp,
+                                                    weight_unit=weight_unit)
+    return valid, rejected, len(dp)
+
+
+def _parse_header(header: bytes) -> list[str]:
+    return next(csv.reader([header.decode("utf-8-sig")]))
+
+
+def _parse_csv_bytes(data: bytes, columns: list[str]) -> DataFrame:
+    if not data.strip():
+        return DataFrame(columns=columns)
+
+    return read_csv(io.BytesIO(data), names=columns, header=None)
@@ -0,0 +1,401 @@
+import threading
+from datetime import date, datetime
+from typing import Iterator
+
+import numpy as np
+from pandas import DataFrame, Index, isna, to_datetime
+
+from src.etl.application.biometrics_aggregation import ANALYTICS_COLUMNS, \
+    METRICS, STATE_COLUMNS, aggregate_biometrics, finalize_aggregates, \
+    to_analytics_columns
+from src.etl.application.biometrics_columns import BIOMETRICS_DATAFRAME_DTYPES
+from src.etl.application.biometrics_percentiles import PERCENTILE_METRICS
+from src.etl.domain.biometrics import Biometrics
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
+from src.etl.domain.biometrics_repository import IBiometricsRepository
+from src.etl.infrastructure.columnar_files import replace_dataset, \
+    write_biometrics_parquet
+from src.etl.infrastructure.in_memory_patient_repository import \
+    InMemoryPatientRepository
+
+# NULL metrics are NaN and NULL dates NaT
+_COLUMN_DTYPES = {
+    "patient_id": "int64",
+    "biometrics_id": "int64",
+    "test_date": "datetime64[D]",
+    **{metric: "float64" for metric in METRICS},
+}
+
+
+class InMemoryBiometricsRepository(IBiometricsRepository):
+    """
+    IBiometricsRepository kept in process memory, same results than the
+    PostgreSQL repository without any database. Biometrics are NumPy
+    arrays (one per column) ordered by biometrics_id, grown by doubling
+    their capacity. Pages of a patient use a (patient_id, biometrics_id)
+    ordering built on demand, like an index. Analytics tables are dicts
+    keyed by their primary key. Operations are serialized by a lock.
+    Biometrics must reference a patient of patient_repo, like the foreign
+    key of kannact.biometrics (ValueError otherwise, nothing is written).
+    """
+
+    def __init__(self, patient_repo: InMemoryPatientRepository | None = None):
+        self._patient_repo = patient_repo or InMemoryPatientRepository()
+        self._lock = threading.RLock()
+        self._columns = {name: np.empty(0, dtype=dtype)
+                         for name, dtype in _COLUMN_DTYPES.items()}
+        self._size = 0
+        self._next_biometrics_id = 1
+        self._patient_order: np.ndarray | None = None
+        self._sorted_patient_ids: np.ndarray | None = None
+        self._analytics: dict[int, dict] = {}
+        self._windows: dict[tuple[int, int], dict] = {}
+        self._state: dict[int, dict] = {}
+        self._sketches: dict[int, dict] = {}
+        self._watermarks: dict[str, int] = {}
+
+    def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
+                       test_date: datetime = datetime(1970, 1, 1),
+                       limit: int = 10, use_primary: bool = False
+                       ) -> list[Biometrics]:
+        with self._lock:
+            positions = self._patient_positions(patient_id)
+            ids = self._column("biometrics_id")[positions]
+            # Dates compared as timestamps, like date > timestamp in SQL
+            dates = self._column("test_date")[positions].astype(
+                "datetime64[us]")
+            after = (ids > biometrics_id) | (
+                    (ids == biometrics_id)
+                    & (dates > np.datetime64(test_date, "us")))
+            return self._biometrics_list(positions[after][:limit])
+
+    def insert_biometrics(self, biometrics_list: list[Biometrics]):
+        self.copy_biometrics(biometrics_list)
+
+    def copy_biometrics(self, biometrics_list: list[Biometrics]) -> int:
+        return self.copy_biometrics_dataframe(
+            _biometrics_dataframe(biometrics_list)
+        )
+
+    def copy_biometrics_dataframe(self, df: DataFrame) -> int:
+        with self._lock:
+            self._check_patients(df)
+            self._append(df)
+            return len(df)
+
+    def get_dataframe_biometrics(
+            self, patient_ids: list[int] | None = None,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            min_patient_id: int | None = None,
+            max_patient_id: int | None = None
+    ) -> DataFrame:
+        with self._lock:
+            patient_id = self._column("patient_id")
+            biometrics_id = self._column("biometrics_id")
+            mask = np.ones(self._size, dtype=bool)
+            if patient_ids is not None:
+                mask &= np.isin(patient_id, list(patient_ids))
+            if min_biometrics_id is not None:
+                mask &= biometrics_id > min_biometrics_id
+            if max_biometrics_id is not None:
+                mask &= biometrics_id <= max_biometrics_id
+            if min_patient_id is not None:
+                mask &= patient_id >= min_patient_id
+            if max_patient_id is not None:
+                mask &= patient_id <= max_patient_id
+            return self._frame(np.flatnonzero(mask),
+                               list(BIOMETRICS_DATAFRAME_DTYPES)).astype(
+                BIOMETRICS_DATAFRAME_DTYPES)
+
+    def iter_dataframe_biometrics(
+            self, chunk_size: int = 100000,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            order_by_patient: bool = False
+    ) -> Iterator[DataFrame]:
+        # Snapshot, later writes do not change the rows being streamed
+        df = self.get_dataframe_biometrics(
+            min_biometrics_id=min_biometrics_id,
+            max_biometrics_id=max_biometrics_id
+        )
+        if order_by_patient:
+            df = df.sort_values("patient_id", kind="stable",
+                                ignore_index=True)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def get_patient_id_range(self) -> tuple[int, int] | None:
+        with self._lock:
+            if not self._size:
+                return None
+            patient_id = self._column("patient_id")
+            return int(patient_id.min()), int(patient_id.max())
+
+    def get_settled_biometrics_id(self) -> int | None:
+        # Writes hold the lock, there is never one in progress
+        with self._lock:
+            if not self._size:
+                return None
+            return int(self._column("biometrics_id").max())
+
+    def export_biometrics_parquet(self, root_path: str,
+                                  chunk_size: int = 1000000) -> int:
+        with self._lock:
+            df = self._frame(np.arange(self._size), list(_COLUMN_DTYPES))
+        with replace_dataset(root_path) as export_path:
+            for start in range(0, len(df), chunk_size):
+                write_biometrics_parquet(df.iloc[start:start + chunk_size],
+                                         export_path)
+        return len(df)
+
+    def update_biometrics(self, biometrics_list: list[Biometrics]):
+        with self._lock:
+            df = _last_entries(_biometrics_dataframe(biometrics_list))
+            positions = self._positions(df)
+            matched = positions >= 0
+            self._assign(positions[matched], df[matched])
+
+    def upsert_biometrics(self, biometrics_list: list[Biometrics]):
+        """
+        Entries without a matching (patient_id, biometrics_id) are inserted
+        with a new biometrics_id, like the MERGE of PostgreSQL.
+        """
+        with self._lock:
+            df = _last_entries(_biometrics_dataframe(biometrics_list))
+            positions = self._positions(df)
+            matched = positions >= 0
+            self._check_patients(df[~matched])
+            self._assign(positions[matched], df[matched])
+            self._append(df[~matched])
+
+    def delete_biometrics(self, biometrics_list: list[Biometrics]):
+        with self._lock:
+            positions = self._positions(
+                _biometrics_dataframe(biometrics_list)
+            )
+            keep = np.ones(self._size, dtype=bool)
+            keep[positions[positions >= 0]] = False
+            for name, values in self._columns.items():
+                self._columns[name] = values[:self._size][keep]
+            self._size = int(keep.sum())
+            self._patient_order = None
+
+    def get_biometrics_analytics(self, patient_id: int) -> BiometricsAnalytics:
+        with self._lock:
+            row = self._analytics.get(patient_id)
+            return None if row is None else BiometricsAnalytics(**row)
+
+    def upsert_biometrics_analytics(
+            self,
+            biometrics_analytics_list: list[BiometricsAnalytics]
+    ):
+        self.copy_biometrics_analytics_dataframe(DataFrame(
+            [analytics.model_dump()
+             for analytics in biometrics_analytics_list],
+            columns=ANALYTICS_COLUMNS
+        ))
+
+    def copy_biometrics_analytics_dataframe(self, df: DataFrame) -> int:
+        with self._lock:
+            for row in _rows(df):
+                self._analytics.setdefault(row["patient_id"], {}).update(row)
+            return len(df)
+
+    def get_dataframe_recent_biometrics(self,
+                                        min_test_date: date) -> DataFrame:
+        with self._lock:
+            recent = self._column("test_date") >= np.datetime64(
+                min_test_date, "D")
+            return self._frame(np.flatnonzero(recent),
+                               ["patient_id", "test_date", *METRICS])
+
+    def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        with self._lock:
+            return [BiometricsAnalyticsWindow(**row)
+                    for (row_patient_id, _), row in sorted(
+                        self._windows.items())
+                    if row_patient_id == patient_id]
+
+    def replace_biometrics_analytics_windows(self, df: DataFrame,
+                                             as_of: date) -> int:
+        with self._lock:
+            self._windows = {
+                (row["patient_id"], row["window_days"]): row
+                for row in _rows(df.assign(as_of=as_of))
+            }
+            return len(self._windows)
+
+    def get_biometrics_sketches(self, patient_ids: list[int]) -> DataFrame:
+        with self._lock:
+            found = [patient_id for patient_id in patient_ids
+                     if patient_id in self._sketches]
+            return DataFrame([self._sketches[p] for p in found],
+                             index=Index(found, name="patient_id"),
+                             columns=list(PERCENTILE_METRICS))
+
+    def save_biometrics_sketches(self, sketches: DataFrame, job_name: str,
+                                 watermark: int | None = None):
+        with self._lock:
+            for patient_id, row in sketches.iterrows():
+                self._sketches[int(patient_id)] = {
+                    metric: bytes(data) for metric, data in row.items()
+                }
+            self._save_watermark(job_name, watermark)
+
+    def aggregate_biometrics_analytics(self) -> int:
+        with self._lock:
+            return self.copy_biometrics_analytics_dataframe(
+                to_analytics_columns(finalize_aggregates(aggregate_biometrics(
+                    self.get_dataframe_biometrics()
+                )))
+            )
+
+    def get_biometrics_watermark(self, job_name: str) -> int | None:
+        with self._lock:
+            return self._watermarks.get(job_name)
+
+    def get_biometrics_analytics_state(
+            self, patient_ids: list[int]
+    ) -> DataFrame:
+        with self._lock:
+            found = [patient_id for patient_id in patient_ids
+                     if patient_id in self._state]
+            return DataFrame([self._state[p] for p in found],
+                             index=Index(found, name="patient_id"),
+                             columns=STATE_COLUMNS, dtype=float)
+
+    def save_biometrics_analytics_state(
+            self, state: DataFrame, job_name: str,
+            watermark: int | None = None
+    ):
+        with self._lock:
+            for row in _rows(state.reset_index()):
+                self._state[row.pop("patient_id")] = row
+            self._save_watermark(job_name, watermark)
+
+    def delete_biometrics_analytics(self, patient_ids: list[int]):
+        with self._lock:
+            for patient_id in patient_ids:
+                self._state.pop(patient_id, None)
+                self._analytics.pop(patient_id, None)
+
+    def _save_watermark(self, job_name: str, watermark: int | None):
+        if watermark is not None:
+            self._watermarks[job_name] = int(watermark)
+
+    def _check_patients(self, df: DataFrame):
+        missing = self._patient_repo.get_missing_patient_ids(df["patient_id"])
+        if missing:
+            raise ValueError(f"patient_id {missing} not present in patients")
+
+    def _column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def _append(self, df: DataFrame):
+        rows = len(df)
+        if not rows:
+            return
+        capacity = len(self._columns["patient_id"])
+        if self._size + rows > capacity:
+            capacity = max(2 * capacity, self._size + rows)
+            for name, values in self._columns.items():
+                grown = np.empty(capacity, dtype=values.dtype)
+                grown[:self._size] = values[:self._size]
+                self._columns[name] = grown
+
+        end = self._size + rows
+        self._columns["biometrics_id"][self._size:end] = np.arange(
+            self._next_biometrics_id, self._next_biometrics_id + rows)
+        self._columns["patient_id"][self._size:end] = df["patient_id"]
+        self._size = end
+        self._next_biometrics_id += rows
+        self._assign(np.arange(end - rows, end), df)
+        self._patient_order = None
+
+    def _assign(self, positions: np.ndarray, df: DataFrame):
+        self._columns["test_date"][positions] = _dates(df["test_date"])
+        for metric in METRICS:
+            self._columns[metric][positions] = df[metric].astype(
+                "Float64").to_numpy(dtype="float64", na_value=np.nan)
+
+    def _positions(self, df: DataFrame) -> np.ndarray:
+        """
+        Position of each entry (patient_id, biometrics_id), -1 if it does
+        not exist. biometrics_id is sorted, so it is a binary search.
+        """
+        if not self._size:
+            return np.full(len(df), -1)
+
+        biometrics_id = self._column("biometrics_id")
+        ids = df["biometrics_id"].fillna(0).to_numpy(dtype="int64")
+        positions = np.searchsorted(biometrics_id, ids).clip(
+            max=self._size - 1)
+        found = ((biometrics_id[positions] == ids)
+                 & (self._column("patient_id")[positions]
+                    == df["patient_id"].to_numpy(dtype="int64"))
+                 & df["biometrics_id"].notna().to_numpy())
+        return np.where(found, positions, -1)
+
+    def _patient_positions(self, patient_id: int) -> np.ndarray:
+        """
+        Positions of the patient rows ordered by biometrics_id.
+        """
+        if self._patient_order is None:
+            # Stable sort keeps biometrics_id order within a patient
+            self._patient_order = np.argsort(self._column("patient_id"),
+                                             kind="stable")
+            self._sorted_patient_ids = self._column("patient_id")[
+                self._patient_order]
+        start, end = np.searchsorted(self._sorted_patient_ids,
+                                     [patient_id, patient_id + 1])
+        return self._patient_order[start:end]
+
+    def _frame(self, positions: np.ndarray, columns: list[str]) -> DataFrame:
+        return DataFrame({name: self._column(name)[positions]
+                          for name in columns})
+
+    def _biometrics_list(self, positions: np.ndarray) -> list[Biometrics]:
+        # tolist converts whole columns to Python values (NaT as None)
+        columns = {name: self._column(name)[positions].tolist()
+                   for name in ["patient_id", "biometrics_id"]}
+        columns["test_date"] = self._column("test_date")[positions].astype(
+            "datetime64[us]").tolist()
+        for metric in METRICS:
+            columns[metric] = [None if np.isnan(value) else int(value)
+                               for value in self._column(metric)[positions]]
+        return [Biometrics(**dict(zip(columns, row)))
+                for row in zip(*columns.values())]
+
+
+def _biometrics_dataframe(biometrics_list: list[Biometrics]) -> DataFrame:
+    return DataFrame(
+        [biometrics.model_dump() for biometrics in biometrics_list],
+        columns=list(_COLUMN_DTYPES)
+    )
+
+
+def _last_entries(df: DataFrame) -> DataFrame:
+    """
+    Last entry of each (patient_id, biometrics_id), entries without
+    biometrics_id are all kept.
+    """
+    repeated = df.duplicated(["patient_id", "biometrics_id"], keep="last")
+    return df[~repeated | df["biometrics_id"].isna()]
+
+
+def _dates(values) -> np.ndarray:
+    return to_datetime(values).to_numpy(dtype="datetime64[D]")
+
+
+def _rows(df: DataFrame) -> list[dict]:
+    """
+    Rows as dicts of Python values, NULL (NaN, NA) values as None.
+    """
+    return [{name: None if isna(value) else
+             value.item() if hasattr(value, "item") else value
+             for name, value in row.items()}
+            for row in df.astype(object).to_dict("records")]
@@ -0,0 +1,65 @@
+import bisect
+import threading
+from typing import Iterator
+
+import numpy as np
+
+from src.etl.domain.patient import Patient
+from src.etl.domain.patient_repository import IPatientRepository
+
+
+class InMemoryPatientRepository(IPatientRepository):
+    """
+    IPatientRepository kept in process memory. Patients are stored ordered
+    by patient_id (ids are assigned in insertion order), pages are found
+    with a binary search. use_primary is ignored.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._patient_ids: list[int] = []
+        self._patients: list[Patient] = []
+        self._emails: set[str] = set()
+
+    def get_patients(self, patient_id: int, limit: int = 10,
+                     use_primary: bool = False) -> list[Patient]:
+        with self._lock:
+            start = bisect.bisect_right(self._patient_ids, patient_id)
+            return [patient.model_copy()
+                    for patient in self._patients[start:start + limit]]
+
+    def insert_patient(self, patients: list[Patient]):
+        self.copy_patients(patients)
+
+    def copy_patients(self, patients: list[Patient]) -> int:
+        with self._lock:
+            next_id = self._patient_ids[-1] + 1 if self._patient_ids else 1
+            for patient_id, patient in enumerate(patients, start=next_id):
+                self._patient_ids.append(patient_id)
+                self._patients.append(
+                    patient.model_copy(update={"patient_id": patient_id})
+                )
+                self._emails.add(patient.email)
+            return len(patients)
+
+    def count_patients(self) -> int:
+        with self._lock:
+            return len(self._patients)
+
+    def iter_emails(self, batch_size: int = 10000) -> Iterator[str]:
+        with self._lock:
+            emails = [patient.email for patient in self._patients]
+        yield from emails
+
+    def get_existing_emails(self, emails: list[str]) -> set[str]:
+        with self._lock:
+            return self._emails.intersection(emails)
+
+    def get_missing_patient_ids(self, patient_ids) -> list[int]:
+        """
+        Ids without a stored patient, used by InMemoryBiometricsRepository
+        to enforce the foreign key of biometrics.
+        """
+        with self._lock:
+            ids = np.unique(np.asarray(patient_ids, dtype="int64"))
+            return ids[~np.isin(ids, self._patient_ids)].tolist()
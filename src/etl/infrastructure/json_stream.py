@@ -0,0 +1,144 @@
+"""
+Incremental JSON readers, records are yielded one by one so memory usage
+does not depend on the file size. Two formats are supported, a JSON array
+of records and NDJSON (one record per line).
+"""
+import codecs
+import json
+from itertools import islice
+from typing import Any, Iterator
+
+from pydantic import BaseModel
+
+_READ_SIZE = 1024 * 1024
+# A record bigger than this is considered a malformed file
+_MAX_RECORD_SIZE = 64 * 1024 * 1024
+_WHITESPACE = " \t\n\r\ufeff"
+
+
+class MalformedRecord(BaseModel):
+    """
+    Yielded instead of the record for an NDJSON line that is not valid
+    JSON, so one bad line can be rejected without aborting the file.
+    """
+    line: str
+    reason: str
+
+
+def iter_json_records(
+        file_path: str, start_offset: int | None = None
+) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Yields tuples with the byte offset where the record ends and the record.
+    That offset can be provided as start_offset to continue reading later.
+    NDJSON lines that can not be decoded are yielded as MalformedRecord,
+    records are not checked to be JSON objects.
+    """
+    if _is_json_array(file_path):
+        yield from _iter_json_array(file_path, start_offset)
+    else:
+        yield from _iter_ndjson(file_path, start_offset)
+
+
+def iter_json_batches(
+        file_path: str, batch_size: int, start_offset: int | None = None
+) -> Iterator[tuple[int, list[dict[str, Any]]]]:
+    """
+    Same as iter_json_records but records are grouped in lists of
+    batch_size, the offset is the end of the last record of the batch.
+    """
+    records = iter_json_records(file_path, start_offset)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch[-1][0], [record for _, record in batch]
+
+
+def _is_json_array(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(4096)
+            if not data:
+                return False
+            stripped = data.lstrip(b" \t\n\r\xef\xbb\xbf")
+            if stripped:
+                return stripped.startswith(b"[")
+
+
+def _iter_ndjson(
+        file_path: str, start_offset: int | None
+) -> Iterator[tuple[int, dict[str, Any]]]:
+    with open(file_path, "rb") as f:
+        if start_offset is not None:
+            f.seek(start_offset)
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                # JSONDecodeError or UnicodeDecodeError
+                record = MalformedRecord(
+                    line=line.decode("utf-8", errors="replace").rstrip(),
+                    reason=f"invalid JSON: {e}"
+                )
+            yield f.tell(), record
+
+
+def _iter_json_array(
+        file_path: str, start_offset: int | None
+) -> Iterator[tuple[int, dict[str, Any]]]:
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    with open(file_path, "rb") as f:
+        if start_offset is None:
+            # Next token is the opening bracket
+            offset = 0
+            expect_open = True
+        else:
+            # Resuming right after a record, next token is "," or "]"
+            f.seek(start_offset)
+            offset = start_offset
+            expect_open = False
+
+        buffer = ""
+        position = 0
+        eof = False
+
+        while True:
+            # Skip whitespace and separators
+            skip_from = position
+            while position < len(buffer) and (
+                    buffer[position] in _WHITESPACE
+                    or (buffer[position] == "[" and expect_open)
+                    or (buffer[position] == "," and not expect_open)):
+                if buffer[position] == "[":
+                    expect_open = False
+                position += 1
+            offset += len(buffer[skip_from:position].encode("utf-8"))
+
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Buffer empty", buffer,
+                                               position)
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - position > _MAX_RECORD_SIZE:
+                    if buffer[position:].strip():
+                        raise
+                    return
+                data = f.read(_READ_SIZE)
+                eof = not data
+                buffer = buffer[position:] + text_decoder.decode(data,
+                                                                 final=eof)
+                position = 0
+                continue
+
+            offset += len(buffer[position:end].encode("utf-8"))
+            position = end
+            yield offset, record
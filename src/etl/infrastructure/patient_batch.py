@@ -1,51 +1,182 @@
+import logging
+import os
+from typing import Any, Iterable
+
 from kink import di
 
+from src.building_blokcs.bloom_filter import BloomFilter
 from src.etl.application.dto import PatientDTO
 from src.etl.application.patient_service import PatientService
-from src.etl.domain.patient import Patient
 from src.etl.domain.patient_repository import IPatientRepository
 
-from pandas import DataFrame, read_json
+from pandas import DataFrame
 
+from src.etl.infrastructure.checkpoint import CheckpointManifest
+from src.etl.infrastructure.columnar_files import is_columnar_file, \
+    iter_columnar_records
+from src.etl.infrastructure.json_stream import MalformedRecord, \
+    iter_json_batches
+from src.etl.infrastructure.pipeline import run_pipeline
 from src.etl.infrastructure.postgresql_patient_repository import \
     PostgreSQLPatientRepository
+from src.etl.infrastructure.rejected_row_sink import NDJSONRejectedRowSink, \
+    validation_reason
 
 patient_repo = PostgreSQLPatientRepository()
 di[IPatientRepository] = patient_repo
 di[PatientService] = PatientService(patient_repo=di[IPatientRepository])
 
+logger = logging.getLogger(__name__)
+
+# Patient records are bigger than this, used to size the email filter
+_MIN_PATIENT_RECORD_SIZE = 128
+
+
+def get_patient_batch(
+        dp: DataFrame, rejected_sink: NDJSONRejectedRowSink | None = None,
+        source: str = ''
+) -> list[PatientDTO]:
+    # For JSON files line number is the position of the record (1 based)
+    rows = zip(dp.index + 1, dp.to_dict(orient='records'))
+    return [
+        patient for _, patient in _get_numbered_patient_batch(
+            rows=rows, rejected_sink=rejected_sink, source=source
+        )
+    ]
 
-def get_patient_batch(dp: DataFrame) -> list[Patient]:
 
-    patient_batch: list[PatientDTO] = []
-    for row in dp.to_dict(orient='records'):
-        try:
-            patient: PatientDTO = PatientDTO(**row)
-            patient_batch.append(patient)
-        except ValueError:
-            """
-            rows not parsed must be stored into 
-            a table or file to be checked later
-            """
-            pass
+def _get_numbered_patient_batch(
+        rows: Iterable[tuple[int, Any]],
+        rejected_sink: NDJSONRejectedRowSink | None, source: str
+) -> list[tuple[int, PatientDTO]]:
+
+    patient_batch: list[tuple[int, PatientDTO]] = []
+    for line_number, row in rows:
+        if isinstance(row, MalformedRecord):
+            reason, row = row.reason, {"line": row.line}
+        elif not isinstance(row, dict):
+            reason, row = "record is not a JSON object", {"record": row}
+        else:
+            try:
+                patient: PatientDTO = PatientDTO(**row)
+                patient_batch.append((int(line_number), patient))
+                continue
+            except ValueError as e:
+                reason = validation_reason(e)
+
+        if rejected_sink is not None:
+            rejected_sink.put(source=source, line_number=int(line_number),
+                              reason=reason, row=row)
 
     return patient_batch
 
 
 class PatientBatch:
-    def __init__(self):
+    def __init__(self,
+                 rejected_file_path: str = './patients_rejected.ndjson',
+                 checkpoint_dir: str = './patients_checkpoints'):
         self._patient_service = di[PatientService]
+        self._rejected_file_path = rejected_file_path
+        self._checkpoint_manifest = CheckpointManifest(checkpoint_dir)
+
+    def process_patient_file(
+            self, file_path: str = './patient_data_sample_20.json',
+            chunk_size: int = 10000, deduplicate: bool = False,
+            pipeline_depth: int = 2):
+        """
+        Patients file (JSON array or NDJSON) is read incrementally, records
+        are validated and inserted in batches of chunk_size. Reader,
+        validator and writer run as a pipeline connected by queues of
+        pipeline_depth batches so memory usage stays bounded.
+        A checkpoint is saved after each batch, a rerun for the same file
+        continues from the first uncommitted batch.
+        With deduplicate, patients whose email already exists are skipped.
+        Parquet and Arrow IPC files (by extension) are also accepted, they
+        are read memory mapped and only the patient columns are loaded.
+        """
+        columnar = is_columnar_file(file_path)
+        checkpoint = self._checkpoint_manifest.load(file_path=file_path)
+        if checkpoint is not None and checkpoint.completed:
+            return
+        start_offset = checkpoint.byte_offset if checkpoint else None
+        row_count = checkpoint.row_count if checkpoint else 0
+
+        email_filter: BloomFilter | None = None
+        if deduplicate:
+            email_filter = self._patient_service.get_email_filter(
+                expected_new_patients=(os.path.getsize(file_path)
+                                       // _MIN_PATIENT_RECORD_SIZE)
+            )
+
+        with NDJSONRejectedRowSink(self._rejected_file_path) as sink:
+            first_line = row_count + 1
+
+            def validate(batch: tuple[int, list[dict[str, Any]]]):
+                nonlocal first_line
+                offset, records = batch
+                numbered_batch = _get_numbered_patient_batch(
+                    rows=enumerate(records, start=first_line),
+                    rejected_sink=sink, source=file_path
+                )
+                first_line += len(records)
+                return offset, len(records), numbered_batch
+
+            def write(batch: tuple[int, int, list[tuple[int, PatientDTO]]]):
+                nonlocal row_count
+                offset, records, numbered_batch = batch
+                self._insert_patients(numbered_batch=numbered_batch,
+                                      source=file_path, rejected_sink=sink,
+                                      email_filter=email_filter)
+                row_count += records
+                # Columnar files are resumed by row count
+                self._checkpoint_manifest.save(
+                    file_path=file_path,
+                    byte_offset=None if columnar else offset,
+                    row_count=row_count
+                )
+
+            if columnar:
+                batches = iter_columnar_records(
+                    file_path=file_path, batch_size=chunk_size,
+                    columns=list(PatientDTO.model_fields),
+                    start_row=row_count
+                )
+            else:
+                batches = iter_json_batches(file_path=file_path,
+                                            batch_size=chunk_size,
+                                            start_offset=start_offset)
+
+            # Parsing and validating next batches overlaps with writing
+            run_pipeline(
+                source=batches,
+                stages=[validate, write],
+                maxsize=pipeline_depth
+            )
+
+        self._checkpoint_manifest.save(file_path=file_path, byte_offset=None,
+                                       row_count=row_count, completed=True)
 
-    def process_patient_file(self):
-        dp: DataFrame = read_json('./patient_data_sample_20.json',
-                                  orient="records")
+    def _insert_patients(self, numbered_batch: list[tuple[int, PatientDTO]],
+                         source: str, rejected_sink: NDJSONRejectedRowSink,
+                         email_filter: BloomFilter | None = None):
+        line_numbers = {
+            id(p_dto): line_number for line_number, p_dto in numbered_batch
+        }
+        patient_dto_list = [p_dto for _, p_dto in numbered_batch]
 
-        patient_batch: list[PatientDTO] = get_patient_batch(dp)
-        errors: list[PatientDTO] = self._patient_service.insert_patient(patient_dto_list=patient_batch)
+        if email_filter is None:
+            errors = self._patient_service.insert_patient(
+                patient_dto_list=patient_dto_list, bulk=True
+            )
+        else:
+            errors, duplicates = self._patient_service.insert_new_patients(
+                patient_dto_list=patient_dto_list, email_filter=email_filter,
+                bulk=True
+            )
+            logger.info("%s duplicated patients skipped", len(duplicates))
 
-        if len(errors):
-            """
-            patients validation fails must be stored into 
-            a table or file to be checked later
-            """
-            pass
+        for p_dto, error in errors:
+            rejected_sink.put(source=source,
+                              line_number=line_numbers[id(p_dto)],
+                              reason=validation_reason(error),
+                              row=p_dto.model_dump())
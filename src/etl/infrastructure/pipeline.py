@@ -0,0 +1,94 @@
+import threading
+from queue import Queue, Empty, Full
+from typing import Any, Callable, Iterable, Sequence
+
+_END = object()
+# Seconds between checks of the stop event while waiting on a queue
+_POLL_INTERVAL = 0.1
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def run_pipeline(source: Iterable[Any],
+                 stages: Sequence[Callable[[Any], Any]],
+                 maxsize: int = 2):
+    """
+    Runs source and stages as a pipeline, each one in its own thread and
+    connected by bounded queues, so reading chunk N+1 overlaps with
+    validating and writing chunk N. The last stage runs in the caller
+    thread, its results are discarded.
+
+    Queues of maxsize items provide backpressure, a slow stage blocks the
+    previous ones and memory stays bounded. Items keep their order.
+    If any stage fails the pipeline is stopped and the error raised.
+    """
+    stop = threading.Event()
+    queues = [Queue(maxsize=maxsize) for _ in stages]
+
+    def put(queue: Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def get(queue: Queue) -> Any:
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                pass
+        return _END
+
+    def produce(output: Queue):
+        try:
+            for item in source:
+                if not put(output, item):
+                    return
+            put(output, _END)
+        except BaseException as e:
+            put(output, _StageError(e))
+
+    def transform(stage: Callable[[Any], Any], input_queue: Queue,
+                  output: Queue):
+        while True:
+            item = get(input_queue)
+            if item is _END or isinstance(item, _StageError):
+                put(output, item)
+                return
+            try:
+                result = stage(item)
+            except BaseException as e:
+                put(output, _StageError(e))
+                return
+            if not put(output, result):
+                return
+
+    threads = [threading.Thread(target=produce, args=(queues[0],),
+                                daemon=True, name="pipeline-source")]
+    for i, stage in enumerate(stages[:-1]):
+        threads.append(threading.Thread(
+            target=transform, args=(stage, queues[i], queues[i + 1]),
+            daemon=True, name=f"pipeline-stage-{i}"
+        ))
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            stages[-1](item)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
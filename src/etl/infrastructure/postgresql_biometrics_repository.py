@@ -1,248 +1,901 @@
-from datetime import datetime
+import csv
+import io
+import logging
+import time
+from datetime import date, datetime
+from typing import Iterator
 
+from kink import di
 from pandas import DataFrame
 from pandas.io import sql as panda_sql
 
-from src.etl.domain.biometrics_analytics import BiometricsAnalytics
+from src.etl.application.biometrics_columns import BIOMETRICS_COPY_COLUMNS, \
+    BIOMETRICS_DATAFRAME_DTYPES
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
 from src.etl.domain.biometrics_repository import IBiometricsRepository
 from src.etl.domain.biometrics import Biometrics
 
-from psycopg2 import sql, connect
+from src.etl.infrastructure.columnar_files import replace_dataset, \
+    write_biometrics_parquet
+from src.etl.infrastructure.postgresql_connection_pool import \
+    PostgreSQLConnectionPool
+from src.etl.infrastructure.postgresql_read_router import \
+    PostgreSQLReadRouter
+
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor, execute_batch
 
+logger = logging.getLogger(__name__)
+
+# Columns of a biometrics entry as received by update and upsert
+BIOMETRICS_STAGING_COLUMNS = ("patient_id", "biometrics_id", "test_date",
+                              "glucose", "systolic", "diastolic", "weight")
+
 
 class PostgreSQLBiometricsRepository(IBiometricsRepository):
 
-    def __init__(self):
-        self._connection = connect(database="kannact", user="postgres",
-                                   password="kannact", host="192.168.1.92",
-                                   port=15432)
+    def __init__(self,
+                 connection_pool: PostgreSQLConnectionPool | None = None,
+                 read_router: PostgreSQLReadRouter | None = None):
+        self._pool = connection_pool or di[PostgreSQLConnectionPool]
+        # An injected pool serves every read unless a router is provided
+        self._read_router = read_router or (
+            PostgreSQLReadRouter(connection_pool)
+            if connection_pool is not None else di[PostgreSQLReadRouter]
+        )
 
     def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
                        test_date: datetime = datetime(1970, 1, 1),
-                       limit: int = 10
+                       limit: int = 10, use_primary: bool = False
                        ) -> list[Biometrics]:
 
-        biometrics_list: list[Biometrics] = []
+        pool = self._read_router.read_pool(use_primary)
+        with pool.connection() as connection:
+            biometrics_list: list[Biometrics] = []
 
-        cursor = self._connection.cursor(cursor_factory=RealDictCursor)
-        query = sql.SQL(
-            """
-            SELECT *
-            FROM kannact.biometrics 
-            WHERE patient_id=%s AND (biometrics_id, test_date) > (%s, %s) 
-            ORDER BY biometrics_id, test_date LIMIT %s
-            """
-        )
-        cursor.execute(query, (patient_id, biometrics_id, test_date, limit))
-        rows = cursor.fetchall()
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            query = """
+                SELECT patient_id, biometrics_id, test_date, glucose, 
+                systolic, diastolic, weight
+                FROM kannact.biometrics 
+                WHERE patient_id=%s AND (biometrics_id, test_date) > (%s, %s) 
+                ORDER BY biometrics_id, test_date LIMIT %s
+                """
+            pool.execute_prepared(
+                cursor, "get_biometrics", query,
+                (patient_id, biometrics_id, test_date, limit)
+            )
+            rows = cursor.fetchall()
 
-        for row in rows:
-            biometrics: Biometrics = Biometrics(**row)
-            biometrics_list.append(biometrics)
+            for row in rows:
+                biometrics: Biometrics = Biometrics(**row)
+                biometrics_list.append(biometrics)
 
-        return biometrics_list
+            return biometrics_list
 
-    def get_dataframe_biometrics(self) -> DataFrame:
-        return panda_sql.read_sql_query(
-            """
-            SELECT patient_id, glucose, systolic, diastolic, weight 
-            FROM kannact.biometrics""", con=self._connection
+    def get_dataframe_biometrics(
+            self, patient_ids: list[int] | None = None,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            min_patient_id: int | None = None,
+            max_patient_id: int | None = None
+    ) -> DataFrame:
+        """
+        Optional filters: patients, biometrics_id range
+        (min_biometrics_id excluded, max_biometrics_id included) and
+        patient_id range (both included). Scans are read from the replica,
+        reads of given patients (recalculations after their biometrics
+        change) and reads bounded by max_biometrics_id (a settled id, the
+        replica may not have replayed all rows up to it) from the primary.
+        """
+        query, params = _biometrics_dataframe_query(
+            patient_ids=patient_ids, min_biometrics_id=min_biometrics_id,
+            max_biometrics_id=max_biometrics_id,
+            min_patient_id=min_patient_id, max_patient_id=max_patient_id
+        )
+        pool = self._read_router.read_pool(
+            use_primary=patient_ids is not None
+            or max_biometrics_id is not None
         )
+        with pool.connection() as connection:
+            return panda_sql.read_sql_query(
+                query.as_string(connection), con=connection,
+                params=params
+            )
 
-    def insert_biometrics(self, biometrics_list: list[Biometrics]):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            INSERT INTO kannact.biometrics 
-            (patient_id, test_date, glucose, systolic, diastolic, weight)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
+    def iter_dataframe_biometrics(
+            self, chunk_size: int = 100000,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            order_by_patient: bool = False
+    ) -> Iterator[DataFrame]:
+        """
+        Same columns as get_dataframe_biometrics but rows are streamed from
+        a server side cursor in DataFrames of chunk_size rows with compact
+        dtypes, only one chunk is in memory at a time. With
+        order_by_patient all rows of a patient come together.
+        The connection is checked out until the generator is exhausted or
+        closed, operations run between chunks use another one. Streaming
+        from the primary pool with max_size=1 would wait forever for the
+        streaming connection, ValueError is raised before reading.
+        """
+        pool = self._read_router.read_pool()
+        if pool is self._pool and pool.stats()["max_size"] < 2:
+            raise ValueError(
+                "Streaming biometrics needs a connection pool with "
+                "max_size >= 2, one connection streams and another writes"
+            )
+        query, params = _biometrics_dataframe_query(
+            min_biometrics_id=min_biometrics_id,
+            max_biometrics_id=max_biometrics_id
         )
-        biometrics_batch = []
+        if order_by_patient:
+            query = query + sql.SQL(" ORDER BY patient_id")
+
+        with pool.connection() as connection:
+            with connection.cursor(name="biometrics_dataframe") as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query, params)
+                while True:
+                    records = cursor.fetchmany(chunk_size)
+                    if not records:
+                        break
+                    yield DataFrame.from_records(
+                        records, columns=list(BIOMETRICS_DATAFRAME_DTYPES)
+                    ).astype(BIOMETRICS_DATAFRAME_DTYPES)
+            connection.commit()
+
+    def get_patient_id_range(self) -> tuple[int, int] | None:
+        with self._read_router.read_pool().connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                SELECT min(patient_id), max(patient_id) 
+                FROM kannact.biometrics
+                """
+            )
+            row = cursor.fetchone()
+            connection.commit()
+            return None if row[0] is None else (row[0], row[1])
 
+    def get_settled_biometrics_id(self) -> int | None:
+        """
+        Ids are taken from the sequence while inserting, an id smaller than
+        the maximum committed one may belong to a transaction still in
+        progress. SHARE mode conflicts with the lock of writers, it is
+        granted once every transaction writing biometrics has ended, so no
+        id below the maximum read is still reserved (the sequence has CACHE
+        1, later transactions get bigger ids). Writers wait while the lock
+        is requested, it is released right after the query.
+        """
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("LOCK TABLE kannact.biometrics IN SHARE MODE")
+            cursor.execute("SELECT max(biometrics_id) FROM kannact.biometrics")
+            row = cursor.fetchone()
+            connection.commit()
+            return row[0]
+
+    def export_biometrics_parquet(self, root_path: str,
+                                  chunk_size: int = 1000000) -> int:
+        """
+        Writes all biometrics as a Parquet dataset partitioned by test year
+        and month (root_path/test_year=2024/test_month=1/...), replacing a
+        previous export. Rows are streamed with a server side cursor,
+        chunk_size rows in memory. Returns the number of rows exported.
+        """
+        columns = ["patient_id", "biometrics_id", "test_date", "glucose",
+                   "systolic", "diastolic", "weight"]
+        rows = 0
+        with self._read_router.read_pool().connection() as connection, \
+                replace_dataset(root_path) as export_path:
+            cursor = connection.cursor(name="biometrics_export")
+            cursor.itersize = chunk_size
+            cursor.execute(
+                """
+                SELECT patient_id, biometrics_id, test_date, glucose, 
+                systolic, diastolic, weight
+                FROM kannact.biometrics
+                """
+            )
+            while True:
+                records = cursor.fetchmany(chunk_size)
+                if not records:
+                    break
+                write_biometrics_parquet(
+                    DataFrame.from_records(records, columns=columns),
+                    export_path
+                )
+                rows += len(records)
+            cursor.close()
+            connection.commit()
+
+            logger.info("Exported %d biometrics to %s", rows, root_path)
+            return rows
+
+    def insert_biometrics(self, biometrics_list: list[Biometrics]):
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            query = sql.SQL(
+                """
+                INSERT INTO kannact.biometrics 
+                (patient_id, test_date, glucose, systolic, diastolic, weight)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """
+            )
+            biometrics_batch = []
+
+            for biometrics in biometrics_list:
+                biometrics_batch.append(
+                    (biometrics.patient_id, biometrics.test_date,
+                     biometrics.glucose, biometrics.systolic,
+                     biometrics.diastolic, biometrics.weight))
+
+            execute_batch(cur=cursor, sql=query, argslist=(*biometrics_batch,),
+                          page_size=100)
+            connection.commit()
+
+    def copy_biometrics(self, biometrics_list: list[Biometrics]) -> int:
+        """
+        Bulk load using COPY FROM STDIN, rows are serialized as CSV into an
+        in-memory buffer and streamed to PostgreSQL in a single round trip.
+        """
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         for biometrics in biometrics_list:
-            biometrics_batch.append(
+            writer.writerow(
                 (biometrics.patient_id, biometrics.test_date,
                  biometrics.glucose, biometrics.systolic, biometrics.diastolic,
                  biometrics.weight))
 
-        execute_batch(cur=cursor, sql=query, argslist=(*biometrics_batch,),
-                      page_size=100)
-        self._connection.commit()
+        self._copy_biometrics_buffer(buffer=buffer, rows=len(biometrics_list),
+                                     start=start)
+        return len(biometrics_list)
 
-    def update_biometrics(self, biometrics_list: list[Biometrics]):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            UPDATE kannact.biometrics 
-            SET test_date=%s, glucose=%s, systolic=%s, diastolic=%s, weight=%s
-            WHERE patient_id=%s AND biometrics_id=%s
-            """
-        )
-        biometrics_batch = []
+    def copy_biometrics_dataframe(self, df: DataFrame) -> int:
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        df[list(BIOMETRICS_COPY_COLUMNS)].to_csv(buffer, index=False,
+                                                 header=False)
 
-        for biometrics in biometrics_list:
-            biometrics_batch.append((biometrics.test_date, biometrics.glucose,
-                                     biometrics.systolic, biometrics.diastolic,
-                                     biometrics.weight, biometrics.patient_id,
-                                     biometrics.biometrics_id))
+        self._copy_biometrics_buffer(buffer=buffer, rows=len(df), start=start)
+        return len(df)
 
-        execute_batch(cur=cursor, sql=query, argslist=(*biometrics_batch,),
-                      page_size=100)
-        self._connection.commit()
+    def _copy_biometrics_buffer(self, buffer: io.StringIO, rows: int,
+                                start: float):
+        buffer.seek(0)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.copy_expert(
+                sql.SQL(
+                    """
+                    COPY kannact.biometrics ({columns})
+                    FROM STDIN WITH (FORMAT csv)
+                    """
+                ).format(columns=sql.SQL(", ").join(
+                    map(sql.Identifier, BIOMETRICS_COPY_COLUMNS))
+                ), buffer
+            )
+            connection.commit()
 
-    def upsert_biometrics(self, biometrics_list: list[Biometrics]):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            MERGE INTO kannact.biometrics AS target
-            USING
-            (
-                VALUES(%s, %s, %s, %s, %s, %s, %s)
-            )
-            AS source 
-            (
-            patient_id, biometrics_id, test_date, 
-            glucose, systolic, diastolic, weight
-            )
-            ON target.patient_id = source.patient_id 
-            AND target.biometrics_id = source.biometrics_id
-            WHEN matched THEN
-            UPDATE SET
-            test_date=source.test_date, 
-            glucose=source.glucose, 
-            systolic=source.systolic, 
-            diastolic=source.diastolic, 
-            weight=source.weight
-            WHEN NOT matched THEN
-            INSERT
-            (
-            patient_id, test_date, glucose, systolic, diastolic, weight
-            )
-            VALUES
-            (
-            source.patient_id, source.test_date, source.glucose, 
-            source.systolic, source.diastolic, source.weight
-            )
-            """
-        )
-        biometrics_batch = []
+            elapsed = time.perf_counter() - start
+            logger.info("%s biometrics copied in %.3fs (%.0f rows/s)",
+                        rows, elapsed, rows / elapsed if elapsed else 0)
 
-        for biometrics in biometrics_list:
-            biometrics_batch.append(
-                (biometrics.patient_id, biometrics.biometrics_id,
-                 biometrics.test_date, biometrics.glucose,
-                 biometrics.systolic, biometrics.diastolic, biometrics.weight))
+    def update_biometrics(self, biometrics_list: list[Biometrics]):
+        """
+        Set based, the batch is copied into a staging table and applied
+        with a single UPDATE joined on (patient_id, biometrics_id).
+        """
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            self._stage_biometrics(cursor, biometrics_list,
+                                   BIOMETRICS_STAGING_COLUMNS)
+            cursor.execute(
+                """
+                UPDATE kannact.biometrics AS target
+                SET test_date=source.test_date, 
+                glucose=source.glucose, 
+                systolic=source.systolic, 
+                diastolic=source.diastolic, 
+                weight=source.weight
+                FROM biometrics_staging AS source
+                WHERE target.patient_id = source.patient_id 
+                AND target.biometrics_id = source.biometrics_id
+                AND target.patient_id = ANY(%s)
+                """, (_patient_ids(biometrics_list),)
+            )
+            connection.commit()
 
-        execute_batch(cur=cursor, sql=query, argslist=(*biometrics_batch,),
-                      page_size=100)
-        self._connection.commit()
+    def upsert_biometrics(self, biometrics_list: list[Biometrics]):
+        """
+        Set based, the batch is copied into a staging table and applied
+        with a single MERGE. Entries without biometrics_id are inserted.
+        """
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            self._stage_biometrics(cursor, biometrics_list,
+                                   BIOMETRICS_STAGING_COLUMNS)
+            cursor.execute(
+                """
+                MERGE INTO kannact.biometrics AS target
+                USING biometrics_staging AS source 
+                ON target.patient_id = source.patient_id 
+                AND target.biometrics_id = source.biometrics_id
+                WHEN matched THEN
+                UPDATE SET
+                test_date=source.test_date, 
+                glucose=source.glucose, 
+                systolic=source.systolic, 
+                diastolic=source.diastolic, 
+                weight=source.weight
+                WHEN NOT matched THEN
+                INSERT
+                (
+                patient_id, test_date, glucose, systolic, diastolic, weight
+                )
+                VALUES
+                (
+                source.patient_id, source.test_date, source.glucose, 
+                source.systolic, source.diastolic, source.weight
+                )
+                """
+            )
+            connection.commit()
 
     def delete_biometrics(self, biometrics_list: list[Biometrics]):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            DELETE FROM kannact.biometrics
-            WHERE patient_id=%s AND biometrics_id=%s
-            """
-        )
-        biometrics_batch = []
-
-        for biometrics in biometrics_list:
-            biometrics_batch.append((
-                biometrics.patient_id, biometrics.biometrics_id)
+        """
+        Set based, keys are copied into a staging table and deleted with a
+        single DELETE joined on (patient_id, biometrics_id).
+        """
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            self._stage_biometrics(cursor, biometrics_list,
+                                   ("patient_id", "biometrics_id"))
+            cursor.execute(
+                """
+                DELETE FROM kannact.biometrics AS target
+                USING biometrics_staging AS source
+                WHERE target.patient_id = source.patient_id 
+                AND target.biometrics_id = source.biometrics_id
+                AND target.patient_id = ANY(%s)
+                """, (_patient_ids(biometrics_list),)
             )
+            connection.commit()
 
-        execute_batch(cur=cursor, sql=query, argslist=(*biometrics_batch,),
-                      page_size=100)
-        self._connection.commit()
+    def _stage_biometrics(self, cursor, biometrics_list: list[Biometrics],
+                          columns: tuple[str, ...]):
+        """
+        Copies the batch into biometrics_staging (dropped on commit). If an
+        entry is repeated the last one wins, like applying them in order.
+        """
+        entries = {}
+        for position, biometrics in enumerate(biometrics_list):
+            key = ((biometrics.patient_id, biometrics.biometrics_id)
+                   if biometrics.biometrics_id is not None else position)
+            entries.pop(key, None)
+            entries[key] = biometrics
 
-    def get_biometrics_analytics(self, patient_id: int) -> BiometricsAnalytics:
-        cursor = self._connection.cursor(cursor_factory=RealDictCursor)
-        query = sql.SQL(
-            """
-            SELECT *
-            FROM kannact.biometrics_analytics
-            WHERE patient_id=%s
-            """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for biometrics in entries.values():
+            writer.writerow([getattr(biometrics, c) for c in columns])
+        buffer.seek(0)
+
+        identifiers = sql.SQL(", ").join(map(sql.Identifier, columns))
+        # Without constraints, biometrics_id is NULL for new entries
+        cursor.execute(
+            sql.SQL(
+                """
+                CREATE TEMP TABLE biometrics_staging ON COMMIT DROP AS
+                SELECT {columns} FROM kannact.biometrics WITH NO DATA
+                """
+            ).format(columns=identifiers)
+        )
+        cursor.copy_expert(
+            sql.SQL(
+                """
+                COPY biometrics_staging ({columns})
+                FROM STDIN WITH (FORMAT csv)
+                """
+            ).format(columns=identifiers), buffer
         )
-        cursor.execute(query, (patient_id,))
-        row = cursor.fetchone()
-        if row is None:
-            return None
 
-        biometrics_analytics: BiometricsAnalytics = BiometricsAnalytics(**row)
-        return biometrics_analytics
+    def get_biometrics_analytics(self, patient_id: int) -> BiometricsAnalytics:
+        with self._pool.connection() as connection:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            query = """
+                SELECT patient_id, glucose_mean, glucose_min, glucose_max, 
+                systolic_mean, systolic_min, systolic_max, diastolic_mean, 
+                diastolic_min, diastolic_max, weight_mean, weight_min, 
+                weight_max
+                FROM kannact.biometrics_analytics
+                WHERE patient_id=%s
+                """
+            self._pool.execute_prepared(cursor, "get_biometrics_analytics",
+                                        query, (patient_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            biometrics_analytics: BiometricsAnalytics = BiometricsAnalytics(
+                **row
+            )
+            return biometrics_analytics
 
     def upsert_biometrics_analytics(
             self,
             biometrics_analytics_list: list[BiometricsAnalytics]
     ):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            MERGE INTO kannact.biometrics_analytics AS target
-            USING
-            (
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            query = sql.SQL(
+                """
+                MERGE INTO kannact.biometrics_analytics AS target
+                USING
+                (
+                    VALUES
+                        (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                ) 
+                AS source
+                (
+                patient_id, 
+                glucose_mean, glucose_min, glucose_max,
+                systolic_mean, systolic_min, systolic_max, 
+                diastolic_mean, diastolic_min, diastolic_max,
+                weight_mean, weight_min, weight_max
+                )
+                ON target.patient_id=source.patient_id
+                WHEN matched THEN
+                UPDATE SET 
+                glucose_mean=source.glucose_mean,
+                glucose_min=source.glucose_min,
+                glucose_max=source.glucose_max,
+                systolic_mean=source.systolic_mean,
+                systolic_min=source.systolic_min,
+                systolic_max=source.systolic_max,
+                diastolic_mean=source.diastolic_mean,
+                diastolic_min=source.diastolic_min,
+                diastolic_max=source.diastolic_max,
+                weight_mean=source.weight_mean,
+                weight_min=source.weight_min,
+                weight_max=source.weight_max
+                WHEN NOT matched THEN
+                INSERT
+                (
+                patient_id, 
+                glucose_mean, glucose_min, glucose_max,
+                systolic_mean, systolic_min, systolic_max, 
+                diastolic_mean, diastolic_min, diastolic_max,
+                weight_mean, weight_min, weight_max
+                )
                 VALUES
-                    (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ) 
-            AS source
-            (
-            patient_id, 
-            glucose_mean, glucose_min, glucose_max,
-            systolic_mean, systolic_min, systolic_max, 
-            diastolic_mean, diastolic_min, diastolic_max,
-            weight_mean, weight_min, weight_max
-            )
-            ON target.patient_id=source.patient_id
-            WHEN matched THEN
-            UPDATE SET 
-            glucose_mean=source.glucose_mean,
-            glucose_min=source.glucose_min,
-            glucose_max=source.glucose_max,
-            systolic_mean=source.systolic_mean,
-            systolic_min=source.systolic_min,
-            systolic_max=source.systolic_max,
-            diastolic_mean=source.diastolic_mean,
-            diastolic_min=source.diastolic_min,
-            diastolic_max=source.diastolic_max,
-            weight_mean=source.weight_mean,
-            weight_min=source.weight_min,
-            weight_max=source.weight_max
-            WHEN NOT matched THEN
-            INSERT
-            (
-            patient_id, 
-            glucose_mean, glucose_min, glucose_max,
-            systolic_mean, systolic_min, systolic_max, 
-            diastolic_mean, diastolic_min, diastolic_max,
-            weight_mean, weight_min, weight_max
-            )
-            VALUES
-            (
-            source.patient_id, 
-            source.glucose_mean, source.glucose_min, source.glucose_max,
-            source.systolic_mean, source.systolic_min, source.systolic_max,
-            source.diastolic_mean, source.diastolic_min, source.diastolic_max,
-            source.weight_mean, source.weight_min, source.weight_max
-            )            
-            """
+                (
+                source.patient_id, 
+                source.glucose_mean, source.glucose_min, source.glucose_max,
+                source.systolic_mean, source.systolic_min, source.systolic_max,
+                source.diastolic_mean, source.diastolic_min, 
+                source.diastolic_max,
+                source.weight_mean, source.weight_min, source.weight_max
+                )            
+                """
+            )
+
+            ba_batch = []
+            for ba in biometrics_analytics_list:
+                ba_batch.append(
+                    (
+                        ba.patient_id,
+                        ba.glucose_mean, ba.glucose_min, ba.glucose_max,
+                        ba.systolic_mean, ba.systolic_min, ba.systolic_max,
+                        ba.diastolic_mean, ba.diastolic_min, ba.diastolic_max,
+                        ba.weight_mean, ba.weight_min, ba.weight_max
+                    )
+                )
+            execute_batch(cur=cursor, sql=query,
+                          argslist=(*ba_batch,),
+                          page_size=100)
+            connection.commit()
+
+    def copy_biometrics_analytics_dataframe(self, df: DataFrame) -> int:
+        """
+        Bulk upsert, the DataFrame (biometrics_analytics columns) is copied
+        into a staging table and applied with a single MERGE.
+        """
+        columns = [sql.Identifier(c) for c in df.columns]
+        buffer = io.StringIO()
+        df.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                CREATE TEMP TABLE biometrics_analytics_staging
+                (LIKE kannact.biometrics_analytics) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                sql.SQL(
+                    """
+                    COPY biometrics_analytics_staging ({columns}) 
+                    FROM STDIN WITH (FORMAT csv)
+                    """
+                ).format(columns=sql.SQL(", ").join(columns)), buffer
+            )
+            cursor.execute(
+                sql.SQL(
+                    """
+                    MERGE INTO kannact.biometrics_analytics AS target
+                    USING biometrics_analytics_staging AS source
+                    ON target.patient_id=source.patient_id
+                    WHEN matched THEN
+                    UPDATE SET ({columns}) = ({source_columns})
+                    WHEN NOT matched THEN
+                    INSERT ({columns}) VALUES ({source_columns})
+                    """
+                ).format(
+                    columns=sql.SQL(", ").join(columns),
+                    source_columns=sql.SQL(", ").join(
+                        sql.SQL("source.") + c for c in columns
+                    )
+                )
+            )
+            rows = cursor.rowcount
+            connection.commit()
+            return rows
+
+    def get_dataframe_recent_biometrics(self,
+                                        min_test_date: date) -> DataFrame:
+        """
+        Biometrics with test_date from min_test_date (included), uses the
+        test_date index so the cost does not grow with the history.
+        """
+        with self._read_router.read_pool().connection() as connection:
+            return panda_sql.read_sql_query(
+                """
+                SELECT patient_id, test_date, glucose, systolic, diastolic, 
+                weight 
+                FROM kannact.biometrics 
+                WHERE test_date >= %s
+                """, con=connection, params=(min_test_date,)
+            )
+
+    def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        with self._pool.connection() as connection:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """
+                SELECT *
+                FROM kannact.biometrics_analytics_window
+                WHERE patient_id=%s
+                ORDER BY window_days
+                """, (patient_id,)
+            )
+            rows = cursor.fetchall()
+            connection.commit()
+            return [BiometricsAnalyticsWindow(**row) for row in rows]
+
+    def replace_biometrics_analytics_windows(self, df: DataFrame,
+                                             as_of: date) -> int:
+        """
+        Upserts the windows calculated at as_of and removes the ones not
+        calculated (patients without biometrics in the window anymore),
+        all in one transaction.
+        """
+        columns = [sql.Identifier(c) for c in [*df.columns, "as_of"]]
+        buffer = io.StringIO()
+        df.assign(as_of=as_of).to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                CREATE TEMP TABLE biometrics_analytics_window_staging
+                (LIKE kannact.biometrics_analytics_window) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                sql.SQL(
+                    """
+                    COPY biometrics_analytics_window_staging ({columns}) 
+                    FROM STDIN WITH (FORMAT csv)
+                    """
+                ).format(columns=sql.SQL(", ").join(columns)), buffer
+            )
+            cursor.execute(
+                """
+                DELETE FROM kannact.biometrics_analytics_window AS target
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM biometrics_analytics_window_staging AS source
+                    WHERE source.patient_id=target.patient_id 
+                    AND source.window_days=target.window_days
+                )
+                """
+            )
+            cursor.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO kannact.biometrics_analytics_window ({columns})
+                    SELECT {columns} FROM biometrics_analytics_window_staging
+                    ON CONFLICT (patient_id, window_days) DO UPDATE SET 
+                    ({columns}) = ROW({excluded})
+                    """
+                ).format(
+                    columns=sql.SQL(", ").join(columns),
+                    excluded=sql.SQL(", ").join(
+                        sql.SQL("EXCLUDED.") + c for c in columns
+                    )
+                )
+            )
+            rows = cursor.rowcount
+            connection.commit()
+            return rows
+
+    def get_biometrics_sketches(self, patient_ids: list[int]) -> DataFrame:
+        """
+        Serialized sketches (bytes) with patient_id as index.
+        """
+        with self._pool.connection() as connection:
+            return panda_sql.read_sql_query(
+                """
+                SELECT * 
+                FROM kannact.biometrics_sketch 
+                WHERE patient_id = ANY(%s)
+                """, con=connection, params=(list(patient_ids),),
+                index_col="patient_id"
+            )
+
+    def save_biometrics_sketches(self, sketches: DataFrame, job_name: str,
+                                 watermark: int | None = None):
+        """
+        Upserts serialized sketches (patient_id as index) and moves the
+        watermark in the same transaction.
+        """
+        columns = [sql.Identifier(c)
+                   for c in ["patient_id", *sketches.columns]]
+        buffer = io.StringIO()
+        # bytea hex format
+        sketches.map(lambda data: "\\x" + bytes(data).hex()).to_csv(
+            buffer, header=False
         )
+        buffer.seek(0)
 
-        ba_batch = []
-        for ba in biometrics_analytics_list:
-            ba_batch.append(
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                CREATE TEMP TABLE biometrics_sketch_staging
+                (LIKE kannact.biometrics_sketch) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                sql.SQL(
+                    """
+                    COPY biometrics_sketch_staging ({columns}) 
+                    FROM STDIN WITH (FORMAT csv)
+                    """
+                ).format(columns=sql.SQL(", ").join(columns)), buffer
+            )
+            cursor.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO kannact.biometrics_sketch ({columns})
+                    SELECT {columns} FROM biometrics_sketch_staging
+                    ON CONFLICT (patient_id) DO UPDATE SET ({columns}) = 
+                    ROW({excluded})
+                    """
+                ).format(
+                    columns=sql.SQL(", ").join(columns),
+                    excluded=sql.SQL(", ").join(
+                        sql.SQL("EXCLUDED.") + c for c in columns
+                    )
+                )
+            )
+            if watermark is not None:
+                cursor.execute(
+                    """
+                    INSERT INTO kannact.biometrics_watermark 
+                    (job_name, biometrics_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT (job_name) DO UPDATE 
+                    SET biometrics_id=EXCLUDED.biometrics_id
+                    """, (job_name, watermark)
+                )
+            connection.commit()
+
+    def aggregate_biometrics_analytics(self) -> int:
+        """
+        Same metrics than the pandas engine (mean truncated to integer)
+        calculated with GROUP BY and written by the same statement.
+        """
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            query = sql.SQL(
+                """
+                INSERT INTO kannact.biometrics_analytics
                 (
-                    ba.patient_id,
-                    ba.glucose_mean, ba.glucose_min, ba.glucose_max,
-                    ba.systolic_mean, ba.systolic_min, ba.systolic_max,
-                    ba.diastolic_mean, ba.diastolic_min, ba.diastolic_max,
-                    ba.weight_mean, ba.weight_min, ba.weight_max
+                patient_id, 
+                glucose_mean, glucose_min, glucose_max,
+                systolic_mean, systolic_min, systolic_max, 
+                diastolic_mean, diastolic_min, diastolic_max,
+                weight_mean, weight_min, weight_max
+                )
+                SELECT 
+                patient_id,
+                trunc(avg(glucose)), min(glucose), max(glucose),
+                trunc(avg(systolic)), min(systolic), max(systolic),
+                trunc(avg(diastolic)), min(diastolic), max(diastolic),
+                trunc(avg(weight)), min(weight), max(weight)
+                FROM kannact.biometrics
+                GROUP BY patient_id
+                ON CONFLICT (patient_id) DO UPDATE SET
+                glucose_mean=EXCLUDED.glucose_mean,
+                glucose_min=EXCLUDED.glucose_min,
+                glucose_max=EXCLUDED.glucose_max,
+                systolic_mean=EXCLUDED.systolic_mean,
+                systolic_min=EXCLUDED.systolic_min,
+                systolic_max=EXCLUDED.systolic_max,
+                diastolic_mean=EXCLUDED.diastolic_mean,
+                diastolic_min=EXCLUDED.diastolic_min,
+                diastolic_max=EXCLUDED.diastolic_max,
+                weight_mean=EXCLUDED.weight_mean,
+                weight_min=EXCLUDED.weight_min,
+                weight_max=EXCLUDED.weight_max
+                """
+            )
+            cursor.execute(query)
+            connection.commit()
+            return cursor.rowcount
+
+    def get_biometrics_watermark(self, job_name: str) -> int | None:
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                SELECT biometrics_id 
+                FROM kannact.biometrics_watermark 
+                WHERE job_name=%s
+                """, (job_name,)
+            )
+            row = cursor.fetchone()
+            connection.commit()
+            return None if row is None else row[0]
+
+    def get_biometrics_analytics_state(
+            self, patient_ids: list[int]
+    ) -> DataFrame:
+        with self._pool.connection() as connection:
+            return panda_sql.read_sql_query(
+                """
+                SELECT * 
+                FROM kannact.biometrics_analytics_state 
+                WHERE patient_id = ANY(%s)
+                """, con=connection, params=(list(patient_ids),),
+                index_col="patient_id"
+            )
+
+    def save_biometrics_analytics_state(
+            self, state: DataFrame, job_name: str,
+            watermark: int | None = None
+    ):
+        """
+        Upserts running aggregates (patient_id as index) and moves the
+        watermark in the same transaction.
+        """
+        columns = [sql.Identifier(c)
+                   for c in ["patient_id", *state.columns]]
+        buffer = io.StringIO()
+        # Integer columns, NaN must be written as NULL instead of 1.0
+        state.astype("Int64").to_csv(buffer, header=False)
+        buffer.seek(0)
+
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                CREATE TEMP TABLE biometrics_analytics_state_staging
+                (LIKE kannact.biometrics_analytics_state) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                sql.SQL(
+                    """
+                    COPY biometrics_analytics_state_staging ({columns}) 
+                    FROM STDIN WITH (FORMAT csv)
+                    """
+                ).format(columns=sql.SQL(", ").join(columns)), buffer
+            )
+            cursor.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO kannact.biometrics_analytics_state ({columns})
+                    SELECT {columns} FROM biometrics_analytics_state_staging
+                    ON CONFLICT (patient_id) DO UPDATE SET ({columns}) = 
+                    ROW({excluded})
+                    """
+                ).format(
+                    columns=sql.SQL(", ").join(columns),
+                    excluded=sql.SQL(", ").join(
+                        sql.SQL("EXCLUDED.") + c for c in columns
+                    )
                 )
             )
-        execute_batch(cur=cursor, sql=query,
-                      argslist=(*ba_batch,),
-                      page_size=100)
-        self._connection.commit()
+            if watermark is not None:
+                cursor.execute(
+                    """
+                    INSERT INTO kannact.biometrics_watermark 
+                    (job_name, biometrics_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT (job_name) DO UPDATE 
+                    SET biometrics_id=EXCLUDED.biometrics_id
+                    """, (job_name, watermark)
+                )
+            connection.commit()
+
+    def delete_biometrics_analytics(self, patient_ids: list[int]):
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """
+                DELETE FROM kannact.biometrics_analytics_state 
+                WHERE patient_id = ANY(%s)
+                """, (list(patient_ids),)
+            )
+            cursor.execute(
+                """
+                DELETE FROM kannact.biometrics_analytics 
+                WHERE patient_id = ANY(%s)
+                """, (list(patient_ids),)
+            )
+            connection.commit()
+
+
+def _patient_ids(biometrics_list: list[Biometrics]) -> list[int]:
+    """
+    Patients of a batch, as a constant filter it lets PostgreSQL prune the
+    partitions of other patients (hash partitioned biometrics).
+    """
+    return sorted({biometrics.patient_id for biometrics in biometrics_list})
+
+
+def _biometrics_dataframe_query(
+        patient_ids: list[int] | None = None,
+        min_biometrics_id: int | None = None,
+        max_biometrics_id: int | None = None,
+        min_patient_id: int | None = None,
+        max_patient_id: int | None = None
+) -> tuple[sql.Composable, list]:
+    conditions = []
+    params = []
+    if patient_ids is not None:
+        conditions.append(sql.SQL("patient_id = ANY(%s)"))
+        params.append(list(patient_ids))
+    if min_biometrics_id is not None:
+        conditions.append(sql.SQL("biometrics_id > %s"))
+        params.append(min_biometrics_id)
+    if max_biometrics_id is not None:
+        conditions.append(sql.SQL("biometrics_id <= %s"))
+        params.append(max_biometrics_id)
+    if min_patient_id is not None:
+        conditions.append(sql.SQL("patient_id >= %s"))
+        params.append(min_patient_id)
+    if max_patient_id is not None:
+        conditions.append(sql.SQL("patient_id <= %s"))
+        params.append(max_patient_id)
+
+    query = sql.SQL(
+        """
+        SELECT patient_id, biometrics_id, glucose, systolic, diastolic, 
+        weight 
+        FROM kannact.biometrics {where}"""
+    ).format(
+        where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions)
+        if conditions else sql.SQL("")
+    )
+    return query, params
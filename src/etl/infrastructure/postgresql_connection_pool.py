@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
+from kink import di
+from psycopg2 import extensions, sql, OperationalError, InterfaceError
+from psycopg2.errors import FeatureNotSupported, InvalidSqlStatementName
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Pools inherited from the parent process. Their connections must never be
+# garbage collected in the child: psycopg2 would close them (PQfinish) and
+# the server would end the parent sessions sharing those sockets.
+_inherited_pools: list[ThreadedConnectionPool] = []
+
+
+class PostgreSQLConnectionPool:
+    """
+    Connection pool shared by the repositories, each operation checks out
+    a connection and returns it when finished. Connections are opened
+    lazily, no connection is created until the first checkout.
+
+    When max_size connections are in use checkouts wait for one to be
+    returned. Connections idle for more than health_check_interval seconds
+    are checked before being handed out, broken ones are replaced.
+    A pool inherited by a forked process is replaced by a new one, so
+    workers never share sockets with their parent. The inherited one is
+    kept referenced and never closed, its sessions belong to the parent.
+
+    Hot read queries are run with execute_prepared, they are prepared once
+    per connection and later executions reuse the prepared plan. With
+    prepare_statements=False they are sent as regular queries.
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 10,
+                 health_check_interval: float = 30,
+                 prepare_statements: bool = True, **connect_kwargs):
+        self._min_size = min_size
+        self._max_size = max_size
+        self._health_check_interval = health_check_interval
+        self._prepare_statements = prepare_statements
+        self._connect_kwargs = connect_kwargs or dict(
+            database="kannact", user="postgres", password="kannact",
+            host="192.168.1.92", port=15432
+        )
+        self._lock = threading.Lock()
+        self._pool: ThreadedConnectionPool | None = None
+        self._pid: int | None = None
+        self._slots: threading.BoundedSemaphore | None = None
+        self._last_used: dict[int, float] = {}
+        # Names of the statements prepared in each connection
+        self._prepared: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._metrics = dict(checkouts=0, in_use=0, wait_seconds=0.0,
+                             discarded=0, prepares=0, prepared_executes=0)
+
+    @contextmanager
+    def connection(self) -> Iterator[extensions.connection]:
+        """
+        Checks out a connection, uncommitted work is rolled back when the
+        connection is returned.
+        """
+        pool, slots = self._get_pool()
+        start = time.perf_counter()
+        slots.acquire()
+        connection = None
+        try:
+            connection = self._checkout(pool)
+            with self._lock:
+                self._metrics["checkouts"] += 1
+                self._metrics["in_use"] += 1
+                self._metrics["wait_seconds"] += time.perf_counter() - start
+
+            yield connection
+        finally:
+            if connection is not None:
+                self._return(pool, connection)
+            slots.release()
+
+    def execute_prepared(self, cursor: extensions.cursor, name: str,
+                         query: str, params: tuple):
+        """
+        Executes query (%s placeholders) as the prepared statement name,
+        preparing it first if the cursor connection has not done it yet.
+        Placeholders become $1, $2, ... so query can not contain any other
+        % (no literal %s or %%), ValueError is raised otherwise.
+        A statement invalidated in the server (deallocated, or its result
+        columns changed by a schema change) is prepared again after rolling
+        back the transaction, so it must be the first statement of it.
+        """
+        if (query.count("%") != query.count("%s")
+                or query.count("%s") != len(params)):
+            raise ValueError(f"Query of {name} must have one %s per "
+                             f"parameter and no other %")
+        if not self._prepare_statements:
+            cursor.execute(query, params)
+            return
+
+        with self._lock:
+            prepared = self._prepared.setdefault(cursor.connection, set())
+        was_prepared = name in prepared
+        try:
+            self._execute_prepared(cursor, prepared, name, query, params)
+        except (FeatureNotSupported, InvalidSqlStatementName) as e:
+            if not was_prepared:
+                raise
+            cursor.connection.rollback()
+            prepared.discard(name)
+            if isinstance(e, FeatureNotSupported):
+                # Cached plan must not change result type, still allocated
+                cursor.execute(sql.SQL("DEALLOCATE {}").format(
+                    sql.Identifier(name)))
+            self._execute_prepared(cursor, prepared, name, query, params)
+
+    def _execute_prepared(self, cursor: extensions.cursor, prepared: set,
+                          name: str, query: str, params: tuple):
+        if name not in prepared:
+            positional = query.split("%s")
+            statement = "".join(
+                part + (f"${i}" if i < len(positional) else "")
+                for i, part in enumerate(positional, start=1)
+            )
+            cursor.execute(sql.SQL("PREPARE {} AS {}").format(
+                sql.Identifier(name), sql.SQL(statement)))
+            prepared.add(name)
+            with self._lock:
+                self._metrics["prepares"] += 1
+
+        cursor.execute(
+            sql.SQL("EXECUTE {} ({})").format(
+                sql.Identifier(name),
+                sql.SQL(", ").join(sql.Placeholder() * len(params))
+            ) if params else sql.SQL("EXECUTE {}").format(
+                sql.Identifier(name)),
+            params
+        )
+        with self._lock:
+            self._metrics["prepared_executes"] += 1
+
+    def stats(self) -> dict:
+        """
+        Pool metrics: size limits, connections in use, total checkouts,
+        seconds spent waiting for a connection, connections discarded by
+        health checks or errors and statements prepared / executed through
+        execute_prepared.
+        """
+        with self._lock:
+            return dict(min_size=self._min_size, max_size=self._max_size,
+                        **self._metrics)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+
+    def _get_pool(self) -> tuple[ThreadedConnectionPool,
+                                 threading.BoundedSemaphore]:
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # Parent connections are not closed, they belong to it
+                if self._pool is not None:
+                    _inherited_pools.append(self._pool)
+                self._pool = ThreadedConnectionPool(
+                    self._min_size, self._max_size, **self._connect_kwargs
+                )
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self._max_size)
+                self._last_used = {}
+                self._prepared = weakref.WeakKeyDictionary()
+                self._metrics["in_use"] = 0
+            return self._pool, self._slots
+
+    def _checkout(self, pool: ThreadedConnectionPool) -> extensions.connection:
+        # One retry per slot in the pool, then the error is raised
+        for _ in range(self._max_size):
+            connection = pool.getconn()
+            if self._is_healthy(connection):
+                return connection
+            self._discard(pool, connection)
+        raise OperationalError(
+            f"No healthy database connection after {self._max_size} attempts"
+        )
+
+    def _is_healthy(self, connection: extensions.connection) -> bool:
+        if connection.closed:
+            return False
+        last_used = self._last_used.get(id(connection))
+        if (last_used is None or
+                time.monotonic() - last_used < self._health_check_interval):
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def _return(self, pool: ThreadedConnectionPool,
+                connection: extensions.connection):
+        with self._lock:
+            self._metrics["in_use"] -= 1
+        try:
+            if (connection.closed == 0 and connection.info.transaction_status
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except (OperationalError, InterfaceError):
+            pass
+
+        if connection.closed:
+            self._discard(pool, connection)
+            return
+        self._last_used[id(connection)] = time.monotonic()
+        pool.putconn(connection)
+
+    def _discard(self, pool: ThreadedConnectionPool,
+                 connection: extensions.connection):
+        logger.warning("Discarding broken database connection")
+        with self._lock:
+            self._metrics["discarded"] += 1
+        self._last_used.pop(id(connection), None)
+        with self._lock:
+            self._prepared.pop(connection, None)
+        pool.putconn(connection, close=True)
+
+
+di[PostgreSQLConnectionPool] = lambda di: PostgreSQLConnectionPool()
@@ -1,45 +1,136 @@
+import csv
+import io
+import logging
+import time
+from typing import Iterator
+
+from kink import di
+
 from src.etl.domain.patient import Patient
 from src.etl.domain.patient_repository import IPatientRepository
 
-from psycopg2 import sql, connect
+from src.etl.infrastructure.postgresql_connection_pool import \
+    PostgreSQLConnectionPool
+from src.etl.infrastructure.postgresql_read_router import \
+    PostgreSQLReadRouter
+
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor, execute_batch
 
+logger = logging.getLogger(__name__)
+
 
 class PostgreSQLPatientRepository(IPatientRepository):
 
-    def __init__(self):
-        self._connection = connect(database="kannact", user="postgres",
-                                   password="kannact", host="192.168.1.92",
-                                   port=15432)
+    def __init__(self,
+                 connection_pool: PostgreSQLConnectionPool | None = None,
+                 read_router: PostgreSQLReadRouter | None = None):
+        self._pool = connection_pool or di[PostgreSQLConnectionPool]
+        # An injected pool serves every read unless a router is provided
+        self._read_router = read_router or (
+            PostgreSQLReadRouter(connection_pool)
+            if connection_pool is not None else di[PostgreSQLReadRouter]
+        )
 
-    def get_patients(self, patient_id: int, limit: int = 10) -> list[Patient]:
-        cursor = self._connection.cursor(cursor_factory=RealDictCursor)
-        query = sql.SQL(
-            "SELECT * FROM kannact.patients WHERE patient_id>%s LIMIT %s")
-        cursor.execute(query, (patient_id, limit))
-        rows = cursor.fetchall()
+    def get_patients(self, patient_id: int, limit: int = 10,
+                     use_primary: bool = False) -> list[Patient]:
+        pool = self._read_router.read_pool(use_primary)
+        with pool.connection() as connection:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            query = ("SELECT patient_id, name, date_of_birth, gender, sex, "
+                     "address, email, phone FROM kannact.patients "
+                     "WHERE patient_id>%s LIMIT %s")
+            pool.execute_prepared(cursor, "get_patients", query,
+                                  (patient_id, limit))
+            rows = cursor.fetchall()
 
-        patient_list: list[Patient] = []
-        for row in rows:
-            patient_list.append(Patient(**row))
+            patient_list: list[Patient] = []
+            for row in rows:
+                patient_list.append(Patient(**row))
 
-        return patient_list
+            return patient_list
 
     def insert_patient(self, patients: list[Patient]):
-        cursor = self._connection.cursor()
-        query = sql.SQL(
-            """
-            INSERT INTO kannact.patients 
-            (name, date_of_birth, gender, email, address, phone, sex)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-        )
-        patients_batch = []
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            query = sql.SQL(
+                """
+                INSERT INTO kannact.patients 
+                (name, date_of_birth, gender, email, address, phone, sex)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """
+            )
+            patients_batch = []
+            for patient in patients:
+                patients_batch.append(
+                    (patient.name, patient.date_of_birth, patient.gender,
+                     patient.email, patient.address, patient.phone,
+                     patient.sex))
+
+            execute_batch(cur=cursor, sql=query, argslist=(*patients_batch,),
+                          page_size=100)
+            connection.commit()
+
+    def copy_patients(self, patients: list[Patient]) -> int:
+        """
+        Same as insert_patient but the whole batch is loaded with COPY.
+        """
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         for patient in patients:
-            patients_batch.append((patient.name, patient.date_of_birth,
-                                   patient.gender, patient.email,
-                                   patient.address, patient.phone, patient.sex))
+            writer.writerow((patient.name, patient.date_of_birth,
+                             patient.gender, patient.email,
+                             patient.address, patient.phone, patient.sex))
+        buffer.seek(0)
+
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.copy_expert(
+                """
+                COPY kannact.patients
+                (name, date_of_birth, gender, email, address, phone, sex)
+                FROM STDIN WITH (FORMAT csv)
+                """, buffer
+            )
+            connection.commit()
+
+            elapsed = time.perf_counter() - start
+            logger.info("%s patients copied in %.3fs (%.0f rows/s)",
+                        len(patients), elapsed,
+                        len(patients) / elapsed if elapsed else 0)
+
+            return len(patients)
+
+    def count_patients(self) -> int:
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT count(*) FROM kannact.patients")
+            return cursor.fetchone()[0]
+
+    def iter_emails(self, batch_size: int = 10000) -> Iterator[str]:
+        # Server side cursor, emails are fetched in batches of batch_size
+        with self._pool.connection() as connection:
+            with connection.cursor(name="patient_emails") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute("SELECT email FROM kannact.patients")
+                for (email,) in cursor:
+                    yield email
+            connection.commit()
+
+    def get_existing_emails(self, emails: list[str]) -> set[str]:
+        if not emails:
+            return set()
 
-        execute_batch(cur=cursor, sql=query, argslist=(*patients_batch,),
-                      page_size=100)
-        self._connection.commit()
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            # Same collation than patient_email_index to be able to use it
+            query = sql.SQL(
+                """
+                SELECT email 
+                FROM kannact.patients 
+                WHERE email COLLATE pg_catalog."C.utf8" = ANY(%s)
+                """
+            )
+            cursor.execute(query, (emails,))
+            return {email for (email,) in cursor.fetchall()}
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+from kink import di
+from psycopg2 import OperationalError, InterfaceError
+
+from src.etl.infrastructure.postgresql_connection_pool import \
+    PostgreSQLConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary, 0 when it has replayed all
+# the WAL received (or it is not a standby)
+REPLICA_LAG_QUERY = """
+    SELECT coalesce(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+        END, 0)
+    """
+
+
+class PostgreSQLReadRouter:
+    """
+    Chooses the pool of read only operations. Reads go to the replica
+    unless the primary is requested, no replica is configured or the
+    replica is more than max_lag seconds behind (or unreachable). The lag
+    is checked at most every lag_check_interval seconds. Writes always use
+    the primary pool directly.
+    """
+
+    def __init__(self, primary: PostgreSQLConnectionPool,
+                 replica: PostgreSQLConnectionPool | None = None,
+                 max_lag: float = 5, lag_check_interval: float = 1):
+        self._primary = primary
+        self._replica = replica
+        self._max_lag = max_lag
+        self._lag_check_interval = lag_check_interval
+        self._lock = threading.Lock()
+        self._replica_fresh = False
+        self._lag_checked_at: float | None = None
+        self._metrics = dict(replica_reads=0, primary_reads=0,
+                             stale_fallbacks=0)
+
+    @property
+    def has_replica(self) -> bool:
+        return self._replica is not None
+
+    def read_pool(self, use_primary: bool = False) -> PostgreSQLConnectionPool:
+        if not use_primary and self.is_replica_fresh():
+            self._count("replica_reads")
+            return self._replica
+
+        self._count("primary_reads")
+        if not use_primary and self._replica is not None:
+            self._count("stale_fallbacks")
+        return self._primary
+
+    def is_replica_fresh(self) -> bool:
+        if self._replica is None:
+            return False
+        with self._lock:
+            if (self._lag_checked_at is not None and time.monotonic()
+                    - self._lag_checked_at < self._lag_check_interval):
+                return self._replica_fresh
+
+        try:
+            with self._replica.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(REPLICA_LAG_QUERY)
+                    lag = float(cursor.fetchone()[0])
+                connection.rollback()
+        except (OperationalError, InterfaceError):
+            logger.warning("Replica unreachable, reading from the primary")
+            lag = None
+
+        fresh = lag is not None and lag <= self._max_lag
+        if lag is not None and not fresh:
+            logger.warning("Replica %.1fs behind, reading from the primary",
+                           lag)
+        with self._lock:
+            self._replica_fresh = fresh
+            self._lag_checked_at = time.monotonic()
+        return fresh
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(replica=self.has_replica,
+                        replica_fresh=self._replica_fresh, **self._metrics)
+
+    def _count(self, metric: str):
+        with self._lock:
+            self._metrics[metric] += 1
+
+
+# Without a replica every read goes to the primary. To use one register a
+# router with it: PostgreSQLReadRouter(di[PostgreSQLConnectionPool],
+# replica=PostgreSQLConnectionPool(database=..., host=..., port=..., ...))
+di[PostgreSQLReadRouter] = lambda di: PostgreSQLReadRouter(
+    di[PostgreSQLConnectionPool]
+)
@@ -0,0 +1,138 @@
+import json
+import math
+import threading
+from queue import Full, Queue
+from typing import Any
+
+from pandas import DataFrame
+from pydantic import ValidationError
+
+
+class NDJSONRejectedRowSink:
+    """
+    Append-only NDJSON file with rows rejected during ingestion. Every entry
+    has the source file, the line number, the validation reason and the
+    original values.
+
+    Rows are buffered and written in bulk by a background thread, so the
+    valid rows path is not slowed down by the file writes. The queue is
+    bounded to keep memory under control if the disk is slower than the
+    producers. The file is opened by the constructor, so a path that can
+    not be written fails there instead of in the background thread.
+    """
+
+    def __init__(self, file_path: str, flush_size: int = 10000,
+                 max_pending_flushes: int = 16):
+        self._file_path = file_path
+        self._flush_size = flush_size
+        self._buffer: list[str] = []
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._queue: Queue = Queue(maxsize=max_pending_flushes)
+        self._error: Exception | None = None
+        self._file = open(file_path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._write_loop, daemon=True,
+                                        name="rejected-row-sink")
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def put(self, source: str, line_number: int, reason: str,
+            row: dict[str, Any]):
+        row = {
+            key: None if isinstance(value, float) and math.isnan(value)
+            else value
+            for key, value in row.items()
+        }
+        entry = json.dumps(
+            {"source": source, "line_number": line_number, "reason": reason,
+             "row": row}, default=str
+        )
+        self._append(entry + "\n", rows=1)
+
+    def put_dataframe(self, source: str, df: DataFrame, line_offset: int = 2):
+        """
+        DataFrame must have a reason column, the index is the row number
+        in the source file (0 based, header excluded), line_offset is added
+        to obtain the line number.
+        """
+        if not len(df):
+            return
+
+        entries = DataFrame({
+            "source": source,
+            "line_number": df.index + line_offset,
+            "reason": df["reason"].values,
+        })
+        entries["row"] = df.drop(columns=["reason"]).to_dict(orient="records")
+        data = entries.to_json(orient="records", lines=True,
+                               date_format="iso", default_handler=str)
+        if not data.endswith("\n"):
+            data += "\n"
+        self._append(data, rows=len(entries))
+
+    def flush(self):
+        with self._lock:
+            data = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_rows = 0
+        if data:
+            self._put(data)
+        self._raise_writer_error()
+
+    def close(self):
+        self.flush()
+        self._put(None)
+        self._writer.join()
+        self._raise_writer_error()
+
+    def _put(self, data: str | None):
+        # A dead writer never empties the queue, put would wait forever
+        while True:
+            try:
+                self._queue.put(data, timeout=0.5)
+                return
+            except Full:
+                if not self._writer.is_alive():
+                    self._raise_writer_error()
+                    raise RuntimeError("Rejected rows writer is not running")
+
+    def _append(self, data: str, rows: int):
+        with self._lock:
+            self._buffer.append(data)
+            self._buffered_rows += rows
+            full = self._buffered_rows >= self._flush_size
+        if full:
+            self.flush()
+
+    def _write_loop(self):
+        with self._file as f:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    return
+                if self._error is not None:
+                    # Entries are dropped after a failure, close raises it
+                    continue
+                try:
+                    f.write(data)
+                    f.flush()
+                except Exception as e:
+                    self._error = e
+
+    def _raise_writer_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+def validation_reason(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(map(str, e['loc']))}: {e['msg']}".lstrip(": ")
+            for e in error.errors()
+        )
+    return str(error)
@@ -0,0 +1,447 @@
+import json
+import logging
+import sqlite3
+from datetime import date, datetime
+from typing import Iterator
+
+from kink import di
+from pandas import DataFrame, isna, read_sql_query, to_datetime
+
+from src.etl.application.biometrics_aggregation import ANALYTICS_COLUMNS
+from src.etl.application.biometrics_columns import BIOMETRICS_COPY_COLUMNS, \
+    BIOMETRICS_DATAFRAME_DTYPES
+from src.etl.domain.biometrics import Biometrics
+from src.etl.domain.biometrics_analytics import BiometricsAnalytics, \
+    BiometricsAnalyticsWindow
+from src.etl.domain.biometrics_repository import IBiometricsRepository
+from src.etl.infrastructure.columnar_files import replace_dataset, \
+    write_biometrics_parquet
+from src.etl.infrastructure.sqlite_database import SQLiteDatabase, IN_LIST
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteBiometricsRepository(IBiometricsRepository):
+    """
+    IBiometricsRepository on SQLite, same results than the PostgreSQL
+    repository. SQLite runs in process, so batches are written with
+    executemany in one transaction instead of COPY and staging tables.
+    Replicas do not apply, use_primary is ignored.
+    """
+
+    def __init__(self, database: SQLiteDatabase | None = None):
+        self._database = database or di[SQLiteDatabase]
+
+    def get_biometrics(self, patient_id: int, biometrics_id: int = 0,
+                       test_date: datetime = datetime(1970, 1, 1),
+                       limit: int = 10, use_primary: bool = False
+                       ) -> list[Biometrics]:
+        with self._database.connection() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                """
+                SELECT patient_id, biometrics_id, test_date, glucose,
+                systolic, diastolic, weight
+                FROM biometrics
+                WHERE patient_id=? AND (biometrics_id, test_date) > (?, ?)
+                ORDER BY biometrics_id, test_date LIMIT ?
+                """, (patient_id, biometrics_id, _iso_date(test_date), limit)
+            )
+            return [Biometrics(**row) for row in cursor.fetchall()]
+
+    def insert_biometrics(self, biometrics_list: list[Biometrics]):
+        self.copy_biometrics(biometrics_list)
+
+    def copy_biometrics(self, biometrics_list: list[Biometrics]) -> int:
+        return self._insert_rows(
+            (biometrics.patient_id, _iso_date(biometrics.test_date),
+             biometrics.glucose, biometrics.systolic, biometrics.diastolic,
+             biometrics.weight)
+            for biometrics in biometrics_list
+        )
+
+    def copy_biometrics_dataframe(self, df: DataFrame) -> int:
+        df = df[list(BIOMETRICS_COPY_COLUMNS)].assign(
+            test_date=to_datetime(df["test_date"]).dt.strftime("%Y-%m-%d")
+        )
+        return self._insert_rows(_records(df))
+
+    def _insert_rows(self, rows) -> int:
+        with self._database.connection() as connection:
+            cursor = connection.executemany(
+                """
+                INSERT INTO biometrics
+                (patient_id, test_date, glucose, systolic, diastolic, weight)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, rows
+            )
+            return cursor.rowcount
+
+    def get_dataframe_biometrics(
+            self, patient_ids: list[int] | None = None,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            min_patient_id: int | None = None,
+            max_patient_id: int | None = None
+    ) -> DataFrame:
+        query, params = _biometrics_dataframe_query(
+            patient_ids=patient_ids, min_biometrics_id=min_biometrics_id,
+            max_biometrics_id=max_biometrics_id,
+            min_patient_id=min_patient_id, max_patient_id=max_patient_id
+        )
+        with self._database.connection() as connection:
+            return read_sql_query(query, con=connection, params=params)
+
+    def iter_dataframe_biometrics(
+            self, chunk_size: int = 100000,
+            min_biometrics_id: int | None = None,
+            max_biometrics_id: int | None = None,
+            order_by_patient: bool = False
+    ) -> Iterator[DataFrame]:
+        query, params = _biometrics_dataframe_query(
+            min_biometrics_id=min_biometrics_id,
+            max_biometrics_id=max_biometrics_id
+        )
+        if order_by_patient:
+            query += " ORDER BY patient_id"
+
+        with self._database.connection() as connection:
+            cursor = connection.execute(query, params)
+            while True:
+                records = cursor.fetchmany(chunk_size)
+                if not records:
+                    break
+                yield DataFrame.from_records(
+                    records, columns=list(BIOMETRICS_DATAFRAME_DTYPES)
+                ).astype(BIOMETRICS_DATAFRAME_DTYPES)
+
+    def get_patient_id_range(self) -> tuple[int, int] | None:
+        with self._database.connection() as connection:
+            row = connection.execute(
+                "SELECT min(patient_id), max(patient_id) FROM biometrics"
+            ).fetchone()
+            return None if row[0] is None else (row[0], row[1])
+
+    def get_settled_biometrics_id(self) -> int | None:
+        # One writer at a time, ids of a transaction in progress are bigger
+        # than every committed one
+        with self._database.connection() as connection:
+            return connection.execute(
+                "SELECT max(biometrics_id) FROM biometrics"
+            ).fetchone()[0]
+
+    def export_biometrics_parquet(self, root_path: str,
+                                  chunk_size: int = 1000000) -> int:
+        rows = 0
+        with self._database.connection() as connection, \
+                replace_dataset(root_path) as export_path:
+            for df in read_sql_query(
+                    """
+                    SELECT patient_id, biometrics_id, test_date, glucose,
+                    systolic, diastolic, weight
+                    FROM biometrics
+                    """, con=connection, chunksize=chunk_size):
+                write_biometrics_parquet(df, export_path)
+                rows += len(df)
+
+        logger.info("Exported %d biometrics to %s", rows, root_path)
+        return rows
+
+    def update_biometrics(self, biometrics_list: list[Biometrics]):
+        with self._database.connection() as connection:
+            connection.executemany(
+                """
+                UPDATE biometrics
+                SET test_date=?, glucose=?, systolic=?, diastolic=?, weight=?
+                WHERE patient_id=? AND biometrics_id=?
+                """,
+                [(_iso_date(biometrics.test_date), biometrics.glucose,
+                  biometrics.systolic, biometrics.diastolic,
+                  biometrics.weight, biometrics.patient_id,
+                  biometrics.biometrics_id)
+                 for biometrics in biometrics_list]
+            )
+
+    def upsert_biometrics(self, biometrics_list: list[Biometrics]):
+        """
+        Entries without a matching (patient_id, biometrics_id) are inserted
+        with a new biometrics_id, like the MERGE of PostgreSQL.
+        """
+        with self._database.connection() as connection:
+            for biometrics in biometrics_list:
+                values = (_iso_date(biometrics.test_date), biometrics.glucose,
+                          biometrics.systolic, biometrics.diastolic,
+                          biometrics.weight)
+                updated = connection.execute(
+                    """
+                    UPDATE biometrics
+                    SET test_date=?, glucose=?, systolic=?, diastolic=?,
+                    weight=?
+                    WHERE patient_id=? AND biometrics_id=?
+                    """, (*values, biometrics.patient_id,
+                          biometrics.biometrics_id)
+                ).rowcount
+                if not updated:
+                    connection.execute(
+                        """
+                        INSERT INTO biometrics
+                        (test_date, glucose, systolic, diastolic, weight,
+                        patient_id)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """, (*values, biometrics.patient_id)
+                    )
+
+    def delete_biometrics(self, biometrics_list: list[Biometrics]):
+        with self._database.connection() as connection:
+            connection.executemany(
+                """
+                DELETE FROM biometrics WHERE patient_id=? AND biometrics_id=?
+                """,
+                [(biometrics.patient_id, biometrics.biometrics_id)
+                 for biometrics in biometrics_list]
+            )
+
+    def get_biometrics_analytics(self, patient_id: int) -> BiometricsAnalytics:
+        with self._database.connection() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute(
+                "SELECT * FROM biometrics_analytics WHERE patient_id=?",
+                (patient_id,)
+            ).fetchone()
+            return None if row is None else BiometricsAnalytics(**row)
+
+    def upsert_biometrics_analytics(
+            self,
+            biometrics_analytics_list: list[BiometricsAnalytics]
+    ):
+        self._upsert_rows(
+            "biometrics_analytics", ANALYTICS_COLUMNS, ["patient_id"],
+            [[getattr(analytics, c) for c in ANALYTICS_COLUMNS]
+             for analytics in biometrics_analytics_list]
+        )
+
+    def copy_biometrics_analytics_dataframe(self, df: DataFrame) -> int:
+        return self._upsert_rows("biometrics_analytics", list(df.columns),
+                                 ["patient_id"], _records(df))
+
+    def get_dataframe_recent_biometrics(self,
+                                        min_test_date: date) -> DataFrame:
+        with self._database.connection() as connection:
+            return read_sql_query(
+                """
+                SELECT patient_id, test_date, glucose, systolic, diastolic,
+                weight
+                FROM biometrics
+                WHERE test_date >= ?
+                """, con=connection, params=(_iso_date(min_test_date),)
+            )
+
+    def get_biometrics_analytics_windows(
+            self, patient_id: int
+    ) -> list[BiometricsAnalyticsWindow]:
+        with self._database.connection() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            rows = cursor.execute(
+                """
+                SELECT * FROM biometrics_analytics_window
+                WHERE patient_id=?
+                ORDER BY window_days
+                """, (patient_id,)
+            ).fetchall()
+            return [BiometricsAnalyticsWindow(**row) for row in rows]
+
+    def replace_biometrics_analytics_windows(self, df: DataFrame,
+                                             as_of: date) -> int:
+        with self._database.connection() as connection:
+            connection.execute("DELETE FROM biometrics_analytics_window")
+            return self._upsert_rows(
+                "biometrics_analytics_window", [*df.columns, "as_of"],
+                ["patient_id", "window_days"],
+                _records(df.assign(as_of=_iso_date(as_of)))
+            )
+
+    def get_biometrics_sketches(self, patient_ids: list[int]) -> DataFrame:
+        with self._database.connection() as connection:
+            return read_sql_query(
+                f"""
+                SELECT * FROM biometrics_sketch
+                WHERE patient_id IN {IN_LIST}
+                """, con=connection, params=(_json_list(patient_ids),),
+                index_col="patient_id"
+            )
+
+    def save_biometrics_sketches(self, sketches: DataFrame, job_name: str,
+                                 watermark: int | None = None):
+        with self._database.connection():
+            self._upsert_rows(
+                "biometrics_sketch", ["patient_id", *sketches.columns],
+                ["patient_id"],
+                _records(sketches.map(bytes).reset_index())
+            )
+            self._save_watermark(job_name, watermark)
+
+    def aggregate_biometrics_analytics(self) -> int:
+        with self._database.connection() as connection:
+            # Integer average truncated, same as trunc(avg()) in PostgreSQL.
+            # WHERE true is required by SQLite to parse ON CONFLICT
+            return connection.execute(
+                """
+                INSERT INTO biometrics_analytics
+                (
+                patient_id,
+                glucose_mean, glucose_min, glucose_max,
+                systolic_mean, systolic_min, systolic_max,
+                diastolic_mean, diastolic_min, diastolic_max,
+                weight_mean, weight_min, weight_max
+                )
+                SELECT
+                patient_id,
+                CAST(avg(glucose) AS INTEGER), min(glucose), max(glucose),
+                CAST(avg(systolic) AS INTEGER), min(systolic), max(systolic),
+                CAST(avg(diastolic) AS INTEGER), min(diastolic),
+                max(diastolic),
+                CAST(avg(weight) AS INTEGER), min(weight), max(weight)
+                FROM biometrics
+                WHERE true
+                GROUP BY patient_id
+                ON CONFLICT (patient_id) DO UPDATE SET
+                glucose_mean=excluded.glucose_mean,
+                glucose_min=excluded.glucose_min,
+                glucose_max=excluded.glucose_max,
+                systolic_mean=excluded.systolic_mean,
+                systolic_min=excluded.systolic_min,
+                systolic_max=excluded.systolic_max,
+                diastolic_mean=excluded.diastolic_mean,
+                diastolic_min=excluded.diastolic_min,
+                diastolic_max=excluded.diastolic_max,
+                weight_mean=excluded.weight_mean,
+                weight_min=excluded.weight_min,
+                weight_max=excluded.weight_max
+                """
+            ).rowcount
+
+    def get_biometrics_watermark(self, job_name: str) -> int | None:
+        with self._database.connection() as connection:
+            row = connection.execute(
+                "SELECT biometrics_id FROM biometrics_watermark "
+                "WHERE job_name=?", (job_name,)
+            ).fetchone()
+            return None if row is None else row[0]
+
+    def get_biometrics_analytics_state(
+            self, patient_ids: list[int]
+    ) -> DataFrame:
+        with self._database.connection() as connection:
+            return read_sql_query(
+                f"""
+                SELECT * FROM biometrics_analytics_state
+                WHERE patient_id IN {IN_LIST}
+                """, con=connection, params=(_json_list(patient_ids),),
+                index_col="patient_id"
+            )
+
+    def save_biometrics_analytics_state(
+            self, state: DataFrame, job_name: str,
+            watermark: int | None = None
+    ):
+        with self._database.connection():
+            self._upsert_rows(
+                "biometrics_analytics_state", ["patient_id", *state.columns],
+                ["patient_id"],
+                _records(state.astype("Int64").reset_index())
+            )
+            self._save_watermark(job_name, watermark)
+
+    def delete_biometrics_analytics(self, patient_ids: list[int]):
+        with self._database.connection() as connection:
+            for table in ["biometrics_analytics_state",
+                          "biometrics_analytics"]:
+                connection.execute(
+                    f"DELETE FROM {table} WHERE patient_id IN {IN_LIST}",
+                    (_json_list(patient_ids),)
+                )
+
+    def _upsert_rows(self, table: str, columns: list[str], key: list[str],
+                     rows) -> int:
+        with self._database.connection() as connection:
+            return connection.executemany(
+                f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                VALUES ({_placeholders(columns)})
+                ON CONFLICT ({", ".join(key)}) DO UPDATE SET
+                ({", ".join(columns)}) =
+                ({", ".join(f"excluded.{c}" for c in columns)})
+                """, rows
+            ).rowcount
+
+    def _save_watermark(self, job_name: str, watermark: int | None):
+        if watermark is None:
+            return
+        with self._database.connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO biometrics_watermark (job_name, biometrics_id)
+                VALUES (?, ?)
+                ON CONFLICT (job_name) DO UPDATE
+                SET biometrics_id=excluded.biometrics_id
+                """, (job_name, int(watermark))
+            )
+
+
+def _iso_date(value) -> str | None:
+    return None if value is None else to_datetime(value).strftime("%Y-%m-%d")
+
+
+def _json_list(values) -> str:
+    return json.dumps([int(value) for value in values])
+
+
+def _placeholders(values) -> str:
+    return ", ".join("?" * len(values))
+
+
+def _records(df: DataFrame) -> list[tuple]:
+    """
+    Rows as tuples of Python values, NULL (NaN, NA) values as None.
+    """
+    return [tuple(None if isna(value) else
+                  value.item() if hasattr(value, "item") else value
+                  for value in row)
+            for row in df.astype(object).itertuples(index=False)]
+
+
+def _biometrics_dataframe_query(
+        patient_ids: list[int] | None = None,
+        min_biometrics_id: int | None = None,
+        max_biometrics_id: int | None = None,
+        min_patient_id: int | None = None,
+        max_patient_id: int | None = None
+) -> tuple[str, list]:
+    conditions = []
+    params = []
+    if patient_ids is not None:
+        conditions.append(f"patient_id IN {IN_LIST}")
+        params.append(_json_list(patient_ids))
+    if min_biometrics_id is not None:
+        conditions.append("biometrics_id > ?")
+        params.append(min_biometrics_id)
+    if max_biometrics_id is not None:
+        conditions.append("biometrics_id <= ?")
+        params.append(max_biometrics_id)
+    if min_patient_id is not None:
+        conditions.append("patient_id >= ?")
+        params.append(min_patient_id)
+    if max_patient_id is not None:
+        conditions.append("patient_id <= ?")
+        params.append(max_patient_id)
+
+    query = """
+        SELECT patient_id, biometrics_id, glucose, systolic, diastolic,
+        weight
+        FROM biometrics"""
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, params
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from kink import di
+
+# Values of a list parameter (JSON array), the number of values is not
+# limited by the maximum number of parameters of a statement
+IN_LIST = "(SELECT value FROM json_each(?))"
+
+# Same tables than the kannact schema (ddl folder), dates stored as ISO text
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients
+(
+    patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    date_of_birth TEXT,
+    gender TEXT,
+    sex TEXT,
+    address TEXT,
+    email TEXT,
+    phone TEXT
+);
+CREATE INDEX IF NOT EXISTS patient_email_index ON patients (email);
+
+CREATE TABLE IF NOT EXISTS biometrics
+(
+    patient_id INTEGER NOT NULL,
+    biometrics_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_date TEXT,
+    glucose INTEGER,
+    systolic INTEGER,
+    diastolic INTEGER,
+    weight INTEGER,
+    FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
+);
+CREATE INDEX IF NOT EXISTS biometrics_patient_pagination_index
+    ON biometrics (patient_id, biometrics_id, test_date);
+CREATE INDEX IF NOT EXISTS biometrics_test_date_index
+    ON biometrics (test_date);
+
+CREATE TABLE IF NOT EXISTS biometrics_analytics
+(
+    patient_id INTEGER PRIMARY KEY,
+    glucose_mean INTEGER, glucose_min INTEGER, glucose_max INTEGER,
+    systolic_mean INTEGER, systolic_min INTEGER, systolic_max INTEGER,
+    diastolic_mean INTEGER, diastolic_min INTEGER, diastolic_max INTEGER,
+    weight_mean INTEGER, weight_min INTEGER, weight_max INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS biometrics_analytics_window
+(
+    patient_id INTEGER NOT NULL,
+    window_days INTEGER NOT NULL,
+    as_of TEXT NOT NULL,
+    glucose_mean INTEGER, glucose_min INTEGER, glucose_max INTEGER,
+    systolic_mean INTEGER, systolic_min INTEGER, systolic_max INTEGER,
+    diastolic_mean INTEGER, diastolic_min INTEGER, diastolic_max INTEGER,
+    weight_mean INTEGER, weight_min INTEGER, weight_max INTEGER,
+    PRIMARY KEY (patient_id, window_days)
+);
+
+CREATE TABLE IF NOT EXISTS biometrics_analytics_state
+(
+    patient_id INTEGER PRIMARY KEY,
+    glucose_count INTEGER, glucose_sum INTEGER,
+    glucose_min INTEGER, glucose_max INTEGER,
+    systolic_count INTEGER, systolic_sum INTEGER,
+    systolic_min INTEGER, systolic_max INTEGER,
+    diastolic_count INTEGER, diastolic_sum INTEGER,
+    diastolic_min INTEGER, diastolic_max INTEGER,
+    weight_count INTEGER, weight_sum INTEGER,
+    weight_min INTEGER, weight_max INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS biometrics_watermark
+(
+    job_name TEXT PRIMARY KEY,
+    biometrics_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS biometrics_sketch
+(
+    patient_id INTEGER PRIMARY KEY,
+    glucose BLOB,
+    systolic BLOB,
+    diastolic BLOB
+);
+"""
+
+
+class SQLiteDatabase:
+    """
+    SQLite database used by the SQLite repositories, the schema is created
+    when the database is opened (lazily, on the first operation). One
+    connection is shared by all threads, operations are serialized and
+    each one is a transaction: committed at the end or rolled back on
+    errors. Nested operations join the outer transaction. By default the
+    database is in memory.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self._path,
+                                                   check_same_thread=False)
+                # Off by default in SQLite, biometrics reference patients
+                self._connection.execute("PRAGMA foreign_keys=ON")
+                self._connection.executescript(SCHEMA)
+            self._depth += 1
+            try:
+                yield self._connection
+                if self._depth == 1:
+                    self._connection.commit()
+            except BaseException:
+                if self._depth == 1:
+                    self._connection.rollback()
+                raise
+            finally:
+                self._depth -= 1
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+di[SQLiteDatabase] = lambda di: SQLiteDatabase()
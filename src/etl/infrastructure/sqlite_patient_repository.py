@@ -0,0 +1,77 @@
+import json
+import sqlite3
+from typing import Iterator
+
+from kink import di
+
+from src.etl.domain.patient import Patient
+from src.etl.domain.patient_repository import IPatientRepository
+from src.etl.infrastructure.sqlite_database import SQLiteDatabase, IN_LIST
+
+
+class SQLitePatientRepository(IPatientRepository):
+    """
+    IPatientRepository on SQLite, use_primary is ignored.
+    """
+
+    def __init__(self, database: SQLiteDatabase | None = None):
+        self._database = database or di[SQLiteDatabase]
+
+    def get_patients(self, patient_id: int, limit: int = 10,
+                     use_primary: bool = False) -> list[Patient]:
+        with self._database.connection() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                """
+                SELECT * FROM patients WHERE patient_id>?
+                ORDER BY patient_id LIMIT ?
+                """, (patient_id, limit)
+            )
+            return [Patient(**row) for row in cursor.fetchall()]
+
+    def insert_patient(self, patients: list[Patient]):
+        self.copy_patients(patients)
+
+    def copy_patients(self, patients: list[Patient]) -> int:
+        with self._database.connection() as connection:
+            connection.executemany(
+                """
+                INSERT INTO patients
+                (name, date_of_birth, gender, email, address, phone, sex)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(patient.name, patient.date_of_birth.isoformat(),
+                  patient.gender, patient.email, patient.address,
+                  patient.phone, patient.sex)
+                 for patient in patients]
+            )
+            return len(patients)
+
+    def count_patients(self) -> int:
+        with self._database.connection() as connection:
+            return connection.execute(
+                "SELECT count(*) FROM patients"
+            ).fetchone()[0]
+
+    def iter_emails(self, batch_size: int = 10000) -> Iterator[str]:
+        with self._database.connection() as connection:
+            cursor = connection.execute("SELECT email FROM patients")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for (email,) in rows:
+                    yield email
+
+    def get_existing_emails(self, emails: list[str]) -> set[str]:
+        if not emails:
+            return set()
+
+        with self._database.connection() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT email FROM patients WHERE email IN {IN_LIST}
+                """, (json.dumps(list(emails)),)
+            ).fetchall()
+            return {email for (email,) in rows}
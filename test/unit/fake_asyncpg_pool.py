@@ -0,0 +1,26 @@
+"""
+asyncpg pool stand-in shared by the read router and page token tests, the
+replica lag query returns lag and lag=None fails as an unreachable server.
+"""
+from contextlib import asynccontextmanager
+
+
+class FakeConnection:
+    def __init__(self, lag):
+        self.lag = lag
+
+    async def fetchval(self, query):
+        return self.lag
+
+
+class FakePool:
+    def __init__(self, lag: float = 0):
+        self.lag = lag
+        self.checks = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        self.checks += 1
+        if self.lag is None:
+            raise OSError("could not connect to server")
+        yield FakeConnection(self.lag)
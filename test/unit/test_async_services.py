@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime
+
+from src.building_blokcs.quantile_sketch import HistogramSketch
+from src.etl.application.biometrics_service import AsyncBiometricsService
+from src.etl.domain.async_biometrics_repository import \
+    IAsyncBiometricsRepository
+from src.etl.domain.biometrics import Biometrics
+
+
+class FakeAsyncBiometricsRepository(IAsyncBiometricsRepository):
+
+    async def get_biometrics(self, patient_id, biometrics_id=0,
+                             test_date=datetime(1970, 1, 1), limit=10,
+                             use_primary=False):
+        return [Biometrics(patient_id=patient_id, biometrics_id=1,
+                           test_date=datetime(2024, 1, 1), glucose=100,
+                           systolic=120, diastolic=80, weight=72500)]
+
+    async def get_biometrics_analytics(self, patient_id):
+        return None
+
+    async def get_biometrics_analytics_windows(self, patient_id):
+        return []
+
+    async def get_biometrics_sketch(self, patient_id):
+        sketch = HistogramSketch(54, 300)
+        sketch.add([100, 110, 120])
+        empty = HistogramSketch(0, 0).to_bytes()
+        return {"glucose": sketch.to_bytes(), "systolic": empty,
+                "diastolic": empty}
+
+
+service = AsyncBiometricsService(
+    biometrics_repo=FakeAsyncBiometricsRepository()
+)
+
+
+def test_get_biometrics_converts_weight():
+    biometrics_dto = asyncio.run(
+        service.get_biometrics(patient_id=1, weight_unit="metric")
+    )
+
+    assert biometrics_dto[0].weight == 72.5
+
+
+def test_get_percentiles_from_sketch():
+    percentiles_dto = asyncio.run(
+        service.get_patient_biometrics_percentiles(patient_id=1)
+    )
+
+    assert percentiles_dto.glucose_median == 110
+    assert percentiles_dto.systolic_median is None
+    assert asyncio.run(
+        service.get_patient_biometrics_analytics(patient_id=1)
+    ) is None
@@ -0,0 +1,51 @@
+import asyncio
+
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
+from test.unit.fake_asyncpg_pool import FakePool
+
+
+def read(router, use_primary=False):
+    async def read_pool():
+        pool = await router.read_pool(use_primary)
+        return pool, router.read_from_primary()
+
+    # Each run is a new task, like each request
+    return asyncio.run(read_pool())
+
+
+def test_reads_use_fresh_replica():
+    primary, replica = FakePool(), FakePool(lag=1)
+    router = AsyncPGReadRouter(primary, replica, max_lag=5)
+
+    assert read(router) == (replica, False)
+    assert read(router, use_primary=True) == (primary, True)
+    assert router.stats()["replica_reads"] == 1
+
+
+def test_stale_or_unreachable_replica_falls_back_to_primary():
+    primary, replica = FakePool(), FakePool(lag=30)
+    router = AsyncPGReadRouter(primary, replica, max_lag=5,
+                               lag_check_interval=0)
+    assert read(router) == (primary, True)
+
+    replica.lag = None
+    assert read(router) == (primary, True)
+    replica.lag = 0
+    assert read(router) == (replica, False)
+    assert router.stats()["stale_fallbacks"] == 2
+
+
+def test_lag_checked_once_per_interval():
+    replica = FakePool()
+    router = AsyncPGReadRouter(FakePool(), replica, lag_check_interval=60)
+    for _ in range(3):
+        read(router)
+
+    assert replica.checks == 1
+
+
+def test_without_replica_primary_reads_are_not_marked():
+    primary = FakePool()
+    router = AsyncPGReadRouter(primary)
+
+    assert read(router) == (primary, False)
@@ -0,0 +1,81 @@
+from datetime import date
+
+import numpy as np
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from src.etl.application.biometrics_aggregation import aggregate_biometrics, \
+    merge_aggregates, finalize_aggregates, to_analytics_columns, \
+    window_aggregates, ANALYTICS_COLUMNS
+from src.etl.infrastructure.biometrics_analytics_partitioned import \
+    patient_id_ranges
+
+biometrics_df = DataFrame({
+    "patient_id": [1, 1, 2, 2, 2, 3],
+    "glucose": [100, 120, 90, np.nan, 150, 80],
+    "systolic": [120, 130, 110, 115, np.nan, 100],
+    "diastolic": [80, 85, 70, 75, np.nan, 60],
+    "weight": [70000, 70500, 80000, 80100, 80200, 60000],
+})
+
+
+def test_merged_partials_same_as_whole():
+    expected = aggregate_biometrics(biometrics_df)
+
+    merged = merge_aggregates(aggregate_biometrics(biometrics_df.iloc[:3]),
+                              aggregate_biometrics(biometrics_df.iloc[3:]))
+
+    assert_frame_equal(merged, expected, check_dtype=False)
+
+
+def test_finalize_same_as_groupby():
+    expected = biometrics_df.groupby("patient_id").agg(["mean", "min", "max"])
+    expected.columns = ["_".join(c) for c in expected.columns]
+
+    result = finalize_aggregates(aggregate_biometrics(biometrics_df))
+
+    assert_frame_equal(result.set_index("patient_id")[expected.columns],
+                       expected, check_dtype=False)
+
+
+def test_analytics_columns_truncated_with_nulls():
+    analytics = finalize_aggregates(aggregate_biometrics(biometrics_df))
+    analytics.loc[analytics["patient_id"] == 3, "glucose_mean"] = np.nan
+
+    result = to_analytics_columns(analytics)
+
+    assert list(result.columns) == ANALYTICS_COLUMNS
+    assert (result.dtypes == "Int64").all()
+    # (110 + 115) / 2 truncated like int()
+    assert result.loc[1, "systolic_mean"] == 112
+    assert result["glucose_mean"].isna().tolist() == [False, False, True]
+
+
+def test_patient_id_ranges_cover_all_ids():
+    ranges = patient_id_ranges(min_patient_id=3, max_patient_id=1000,
+                               partitions=7)
+
+    assert ranges[0][0] == 3
+    assert ranges[-1][1] == 1000
+    for (_, high), (low, _) in zip(ranges, ranges[1:]):
+        assert low == high + 1
+
+
+def test_window_aggregates_bounds():
+    df = DataFrame({
+        "patient_id": [1, 1, 1, 2],
+        "test_date": [date(2024, 1, 10), date(2024, 1, 3), date(2023, 12, 1),
+                      date(2024, 1, 11)],
+        "glucose": [100, 120, 200, 90],
+        "systolic": [120, 130, 140, 110],
+        "diastolic": [80, 85, 90, 70],
+        "weight": [70000, 70500, 71000, 80000],
+    })
+
+    result = window_aggregates(df, as_of=date(2024, 1, 10))
+
+    glucose_mean = result.set_index(["patient_id", "window_days"])[
+        "glucose_mean"]
+    # 2024-01-03 is outside the 7 days window, 2024-01-11 is in the future
+    assert glucose_mean.to_dict() == {(1, 7): 100, (1, 30): 110,
+                                      (1, 90): 140}
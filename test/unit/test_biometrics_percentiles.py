@@ -0,0 +1,35 @@
+import numpy as np
+from pandas import DataFrame
+
+from src.etl.application.biometrics_percentiles import sketch_biometrics, \
+    merge_sketches, serialize_sketches, deserialize_sketches, \
+    sketch_percentiles
+
+biometrics_df = DataFrame({
+    "patient_id": [1, 1, 2, 2, 2, 1],
+    "glucose": [100, 120, 90, np.nan, 150, 80],
+    "systolic": [120, 130, 110, 115, np.nan, 100],
+    "diastolic": [80, 85, 70, 75, np.nan, 60],
+})
+
+
+def test_merged_partials_same_as_whole():
+    expected = sketch_biometrics(biometrics_df)
+
+    merged = deserialize_sketches(serialize_sketches(merge_sketches(
+        sketch_biometrics(biometrics_df.iloc[:3]),
+        sketch_biometrics(biometrics_df.iloc[3:])
+    )))
+
+    for patient_id in [1, 2]:
+        assert sketch_percentiles(merged.loc[patient_id].to_dict()) == \
+               sketch_percentiles(expected.loc[patient_id].to_dict())
+    assert sketch_percentiles(expected.loc[1].to_dict())["glucose_median"] \
+           == 100
+
+
+def test_patients_without_biometrics_have_empty_sketches():
+    sketches = sketch_biometrics(biometrics_df.iloc[:0], patient_ids=[3])
+
+    assert set(sketch_percentiles(sketches.loc[3].to_dict()).values()) \
+           == {None}
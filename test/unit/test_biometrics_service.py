@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock
+
+from pandas import DataFrame, concat
+from pandas.testing import assert_frame_equal
+
+from src.etl.application.biometrics_aggregation import aggregate_biometrics, \
+    finalize_aggregates, to_analytics_columns
+from src.etl.application.biometrics_service import BiometricsService
+from src.etl.domain.biometrics_repository import IBiometricsRepository
+
+biometrics_df = DataFrame({
+    "patient_id": [1, 1, 1, 2, 3, 3],
+    "biometrics_id": [1, 2, 3, 4, 5, 6],
+    "glucose": [100, 120, 90, None, 150, 80],
+    "systolic": [120, 130, 110, 115, None, 100],
+    "diastolic": [80, 85, 70, 75, None, 60],
+    "weight": [70000, 70500, 80000, 80100, 80200, 60000],
+}).astype({"glucose": "Int16", "systolic": "Int16", "diastolic": "Int16",
+           "weight": "Int32"})
+
+
+def test_streaming_analytics_same_as_whole_table():
+    repo = MagicMock(spec=IBiometricsRepository)
+    # Patient 1 rows are split between the first two chunks
+    repo.iter_dataframe_biometrics.return_value = iter(
+        [biometrics_df.iloc[i:i + 2] for i in range(0, 6, 2)]
+    )
+    repo.copy_biometrics_analytics_dataframe.side_effect = len
+
+    patients = BiometricsService(
+        biometrics_repo=repo
+    ).calculate_biometrics_analytics_streaming(chunk_size=2)
+
+    written = concat([
+        call.args[0] if call.args else call.kwargs["df"]
+        for call in repo.copy_biometrics_analytics_dataframe.call_args_list
+    ], ignore_index=True)
+    expected = to_analytics_columns(
+        finalize_aggregates(aggregate_biometrics(biometrics_df))
+    )
+    assert patients == 3
+    assert_frame_equal(written, expected)
+
+
+def test_incremental_analytics_stop_at_the_settled_id():
+    repo = MagicMock(spec=IBiometricsRepository)
+    # Ids up to 6 are committed but 4 may still be reserved by a writer
+    repo.get_biometrics_watermark.return_value = 1
+    repo.get_settled_biometrics_id.return_value = 3
+    repo.get_dataframe_biometrics.return_value = biometrics_df.iloc[1:3]
+    repo.get_biometrics_analytics_state.return_value = aggregate_biometrics(
+        biometrics_df.iloc[:1]
+    )
+
+    processed = BiometricsService(
+        biometrics_repo=repo
+    ).update_biometrics_analytics_incremental()
+
+    assert processed == 2
+    repo.get_dataframe_biometrics.assert_called_once_with(
+        min_biometrics_id=1, max_biometrics_id=3
+    )
+    assert repo.save_biometrics_analytics_state.call_args.kwargs[
+        "watermark"] == 3
+
+
+def test_incremental_analytics_without_settled_rows():
+    repo = MagicMock(spec=IBiometricsRepository)
+    repo.get_biometrics_watermark.return_value = 3
+    repo.get_settled_biometrics_id.return_value = 3
+
+    processed = BiometricsService(
+        biometrics_repo=repo
+    ).update_biometrics_percentiles_incremental()
+
+    assert processed == 0
+    repo.get_dataframe_biometrics.assert_not_called()
@@ -0,0 +1,90 @@
+import numpy as np
+from pandas import DataFrame
+
+from src.building_blokcs.unit_conversor import pounds_to_grams, \
+    kilograms_to_grams
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe
+from src.etl.application.dto import BiometricsDTO
+from src.etl.domain.biometrics import Biometrics
+
+
+def pydantic_accepted(df: DataFrame, weight_unit: str) -> list[bool]:
+    # Same steps done by get_biometrics_batch and BiometricsService
+    accepted = []
+    for row in df.to_dict(orient='records'):
+        try:
+            dto = BiometricsDTO(**row)
+            if weight_unit != 'metric':
+                weight = pounds_to_grams(dto.weight)
+            else:
+                weight = kilograms_to_grams(dto.weight)
+            Biometrics(patient_id=dto.patient_id,
+                       biometrics_id=dto.biometrics_id,
+                       test_date=dto.test_date,
+                       glucose=dto.glucose,
+                       systolic=dto.systolic,
+                       diastolic=dto.diastolic,
+                       weight=weight)
+            accepted.append(True)
+        except (ValueError, TypeError):
+            accepted.append(False)
+    return accepted
+
+
+# Valid row followed by limit cases (one per row)
+biometrics_df = DataFrame({
+    "patient_id": [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, np.nan, 7, 7, 8],
+    "test_date": ["2025-02-15", "2025-02-16", "2025-02-17", "2025-02-18",
+                  "2025-02-15 10:00", "2025-02-15T10:00:00Z", "2025-2-15",
+                  "2025-02-30", "2025-02-15", "2025-02-15", "2025-02-15",
+                  "2025-02-15", "2025-02-15", None, "2025-02-15"],
+    "glucose": [138, 54, 55, 299, 100, 100, 100, 100, 100, 100.5, 100, 100,
+                100, 100, 100],
+    "diastolic": [91, 70, 36, 209, 80, 80, 80, 80, 121, 80, 80, 80, 80, 80,
+                  80],
+    "systolic": [131, 120, 51, 229, 120, 120, 120, 120, 120, 120, 120, 120,
+                 120, 120, 120],
+    "weight": [73.1, 70, 1.001, 399.999, 70, 70, 70, 70, 70, 70, np.nan, 70,
+               400.0, 70, 1.0],
+})
+
+
+def test_same_decisions_than_pydantic_models():
+    for weight_unit in ("metric", "imperial"):
+        valid, rejected = validate_biometrics_dataframe(biometrics_df,
+                                                        weight_unit)
+        expected = pydantic_accepted(biometrics_df, weight_unit)
+
+        assert len(valid) + len(rejected) == len(biometrics_df)
+        assert [i in valid.index for i in biometrics_df.index] == expected
+        assert rejected["reason"].notna().all()
+
+
+def test_weight_converted_to_grams():
+    valid, _ = validate_biometrics_dataframe(biometrics_df.head(1), "metric")
+
+    assert valid["weight"].tolist() == [kilograms_to_grams(73.1)]
+
+    valid, _ = validate_biometrics_dataframe(biometrics_df.head(1),
+                                             "imperial")
+
+    assert valid["weight"].tolist() == [pounds_to_grams(73.1)]
+
+
+def test_blood_pressure_reason_codes():
+    df = DataFrame({"patient_id": [1, 1],
+                    "test_date": ["2025-02-15", "2025-02-15"],
+                    "glucose": [100, 100],
+                    "diastolic": [121, 80],
+                    "weight": [70, 70]})
+
+    _, rejected = validate_biometrics_dataframe(df, "metric")
+
+    # systolic column missing
+    assert rejected["reason"].tolist() == ["blood_pressure_incomplete"] * 2
+
+    df["systolic"] = [120, 120]
+    _, rejected = validate_biometrics_dataframe(df, "metric")
+
+    assert rejected["reason"].tolist() == ["blood_pressure_inconsistent"]
@@ -0,0 +1,22 @@
+from src.building_blokcs.bloom_filter import BloomFilter
+
+
+def test_added_items_are_found():
+    bloom_filter = BloomFilter(capacity=1000)
+    emails = [f"patient{i}@example.com" for i in range(1000)]
+    for email in emails:
+        bloom_filter.add(email)
+
+    assert all(email in bloom_filter for email in emails)
+
+
+def test_false_positive_rate():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom_filter.add(f"patient{i}@example.com")
+
+    false_positives = sum(
+        f"other{i}@example.com" in bloom_filter for i in range(10000)
+    )
+
+    assert false_positives < 300
@@ -0,0 +1,36 @@
+from src.etl.infrastructure.checkpoint import CheckpointManifest
+
+
+def test_checkpoint_belongs_to_file(tmp_path):
+    data_file = tmp_path / "biometrics.csv"
+    data_file.write_text("patient_id,glucose\n1,100\n2,110\n")
+    manifest = CheckpointManifest(str(tmp_path / "checkpoints"))
+
+    assert manifest.load(str(data_file)) is None
+
+    manifest.save(file_path=str(data_file), byte_offset=30, row_count=1)
+    checkpoint = manifest.load(str(data_file))
+
+    assert checkpoint.byte_offset == 30
+    assert checkpoint.row_count == 1
+    assert not checkpoint.completed
+
+    # Different content, ingestion must start from scratch
+    data_file.write_text("patient_id,glucose\n3,100\n4,110\n")
+
+    assert manifest.load(str(data_file)) is None
+
+
+def test_each_file_has_its_own_checkpoint(tmp_path):
+    first_file = tmp_path / "first.csv"
+    second_file = tmp_path / "second.csv"
+    first_file.write_text("patient_id,glucose\n1,100\n")
+    second_file.write_text("patient_id,glucose\n2,110\n")
+    manifest = CheckpointManifest(str(tmp_path / "checkpoints"))
+
+    manifest.save(file_path=str(first_file), byte_offset=None, row_count=1,
+                  completed=True)
+    manifest.save(file_path=str(second_file), byte_offset=19, row_count=0)
+
+    assert manifest.load(str(first_file)).completed
+    assert manifest.load(str(second_file)).byte_offset == 19
@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+from pandas import DataFrame, concat, read_csv, to_datetime
+from pandas.testing import assert_frame_equal
+
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe
+from src.etl.infrastructure.columnar_files import iter_columnar_chunks, \
+    iter_columnar_records, read_columnar_file, write_biometrics_parquet
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+feather = pytest.importorskip("pyarrow.feather")
+
+SAMPLE_FILE = "./biometrics_data_sample.csv"
+
+
+@pytest.fixture(params=["parquet", "arrow"])
+def columnar_file(request, tmp_path):
+    df = read_csv(SAMPLE_FILE)
+    df["test_date"] = to_datetime(df["test_date"]).dt.date
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    file_path = str(tmp_path / f"biometrics.{request.param}")
+    if request.param == "parquet":
+        pq.write_table(table, file_path, row_group_size=300)
+    else:
+        feather.write_feather(table, file_path)
+    return file_path
+
+
+def test_same_validation_than_csv(columnar_file):
+    expected, _ = validate_biometrics_dataframe(read_csv(SAMPLE_FILE),
+                                                weight_unit="metric")
+
+    valid, _ = validate_biometrics_dataframe(read_columnar_file(columnar_file),
+                                             weight_unit="metric")
+
+    assert_frame_equal(valid, expected)
+
+
+def test_resumed_chunks_same_as_whole_file(columnar_file):
+    expected = read_columnar_file(columnar_file, columns=["patient_id",
+                                                          "glucose"])
+
+    chunks = list(iter_columnar_chunks(columnar_file, chunk_size=400,
+                                       columns=["patient_id", "glucose",
+                                                "missing"],
+                                       start_row=650))
+
+    assert [end for end, _ in chunks][:2] == [1050, 1450]
+    assert_frame_equal(concat([df for _, df in chunks]), expected.iloc[650:])
+
+
+def test_records_are_dicts(columnar_file):
+    end, records = next(iter_columnar_records(columnar_file, batch_size=5,
+                                              columns=["patient_id"]))
+
+    assert end == 5
+    assert records[0] == {"patient_id": int(read_csv(SAMPLE_FILE,
+                                                     nrows=1)["patient_id"][0])}
+
+
+def test_biometrics_parquet_export_layout(tmp_path):
+    df = DataFrame({
+        "patient_id": [1, 2], "biometrics_id": [1, 2],
+        "test_date": [date(2024, 1, 31), date(2024, 2, 1)],
+        "glucose": [100.0, None], "systolic": [120, 130],
+        "diastolic": [80, 85], "weight": [70000, 71000],
+    })
+
+    write_biometrics_parquet(df, str(tmp_path))
+
+    assert sorted(p.name for p in (tmp_path / "test_year=2024").iterdir()) \
+        == ["test_month=1", "test_month=2"]
+    table = pq.read_table(tmp_path / "test_year=2024" / "test_month=2")
+    assert table.schema.field("test_date").type == pa.date32()
+    assert table.schema.field("glucose").type == pa.int16()
+    assert table.to_pylist()[0]["glucose"] is None
@@ -0,0 +1,48 @@
+from pandas import concat, read_csv
+from pandas.testing import assert_frame_equal
+
+from src.etl.application.biometrics_validation import \
+    validate_biometrics_dataframe
+from src.etl.infrastructure.csv_shards import split_csv_shards, \
+    validate_csv_shard, iter_csv_chunks
+
+SAMPLE_FILE = "./biometrics_data_sample.csv"
+
+
+def test_shards_cover_whole_file():
+    columns, shards = split_csv_shards(file_path=SAMPLE_FILE, shard_size=500)
+
+    assert columns == list(read_csv(SAMPLE_FILE, nrows=0).columns)
+    assert len(shards) > 1
+    for (_, end), (start, _) in zip(shards, shards[1:]):
+        assert end == start
+
+
+def test_shards_same_output_than_serial():
+    expected, _ = validate_biometrics_dataframe(read_csv(SAMPLE_FILE),
+                                                weight_unit="metric")
+
+    columns, shards = split_csv_shards(file_path=SAMPLE_FILE, shard_size=500)
+    result = []
+    rows_read = 0
+    for start, end in shards:
+        valid, _, rows = validate_csv_shard(SAMPLE_FILE, columns, start, end,
+                                            "metric")
+        valid.index += rows_read
+        rows_read += rows
+        result.append(valid)
+
+    assert_frame_equal(concat(result), expected)
+
+
+def test_chunks_resume_from_offset():
+    chunks = list(iter_csv_chunks(file_path=SAMPLE_FILE, chunk_size=300))
+    offset, _ = chunks[2]
+    rows = sum(len(dp) for _, dp in chunks[:3])
+
+    resumed = list(iter_csv_chunks(file_path=SAMPLE_FILE, chunk_size=300,
+                                   start_offset=offset, start_row=rows))
+
+    assert_frame_equal(concat(dp for _, dp in resumed),
+                       concat(dp for _, dp in chunks[3:]))
+    assert_frame_equal(concat(dp for _, dp in chunks), read_csv(SAMPLE_FILE))
@@ -0,0 +1,73 @@
+import json
+
+from src.etl.infrastructure import json_stream
+from src.etl.infrastructure.json_stream import MalformedRecord, \
+    iter_json_records, iter_json_batches
+from src.etl.infrastructure.patient_batch import _get_numbered_patient_batch
+from src.etl.infrastructure.rejected_row_sink import NDJSONRejectedRowSink
+
+SAMPLE_FILE = "./patient_data_sample_20.json"
+
+
+def test_json_array_records():
+    with open(SAMPLE_FILE) as f:
+        expected = json.load(f)
+
+    records = [record for _, record in iter_json_records(SAMPLE_FILE)]
+
+    assert records == expected
+
+
+def test_json_array_resume_small_reads(tmp_path, monkeypatch):
+    # Records split between reads and multi-byte characters
+    monkeypatch.setattr(json_stream, "_READ_SIZE", 7)
+    file_path = tmp_path / "patients.json"
+    expected = [{"patient_id": i, "name": f"Zoë {i}"} for i in range(10)]
+    file_path.write_text(json.dumps(expected, indent=2), encoding="utf-8")
+
+    batches = list(iter_json_batches(str(file_path), batch_size=3))
+    offset, _ = batches[1]
+    resumed = list(iter_json_records(str(file_path), start_offset=offset))
+
+    assert [r for _, batch in batches for r in batch] == expected
+    assert [r for _, r in resumed] == expected[6:]
+
+
+def test_ndjson_resume(tmp_path):
+    file_path = tmp_path / "patients.ndjson"
+    expected = [{"patient_id": i, "name": f"Zoë {i}"} for i in range(5)]
+    file_path.write_text("\n".join(json.dumps(r) for r in expected) + "\n",
+                         encoding="utf-8")
+
+    records = list(iter_json_records(str(file_path)))
+    resumed = list(iter_json_records(str(file_path),
+                                     start_offset=records[1][0]))
+
+    assert [r for _, r in records] == expected
+    assert [r for _, r in resumed] == expected[2:]
+
+
+def test_ndjson_malformed_lines_are_rejected(tmp_path):
+    file_path = tmp_path / "patients.ndjson"
+    file_path.write_text('{"patient_id": 1}\n{"patient_id": \n[1, 2]\n',
+                         encoding="utf-8")
+    sink = NDJSONRejectedRowSink(str(tmp_path / "rejected.ndjson"))
+
+    records = [record for _, record in iter_json_records(str(file_path))]
+    with sink:
+        patients = _get_numbered_patient_batch(
+            rows=enumerate(records, start=1), rejected_sink=sink,
+            source="patients.ndjson"
+        )
+
+    assert isinstance(records[1], MalformedRecord)
+    assert records[1].line == '{"patient_id":'
+    assert patients == []
+    with open(tmp_path / "rejected.ndjson") as f:
+        rejected = [json.loads(line) for line in f]
+    assert [r["line_number"] for r in rejected] == [1, 2, 3]
+    assert rejected[1]["reason"].startswith("invalid JSON: Expecting value")
+    assert rejected[1]["row"] == {"line": '{"patient_id":'}
+    assert rejected[2] == {"source": "patients.ndjson", "line_number": 3,
+                           "reason": "record is not a JSON object",
+                           "row": {"record": [1, 2]}}
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+
+from src.etl.infrastructure import controller
+from src.etl.infrastructure.asyncpg_read_router import AsyncPGReadRouter
+from src.etl.infrastructure.controller import PRIMARY_ROUTE, \
+    _decode_history_token, _decode_patients_token, _encode_history_token, \
+    _encode_patients_token, _next_route
+from test.unit.fake_asyncpg_pool import FakePool
+
+
+def test_patients_token_round_trip():
+    assert _decode_patients_token("0") == (0, None)
+    assert _encode_patients_token(123, None) == "123"
+    assert _encode_patients_token(123, PRIMARY_ROUTE) == "123:primary"
+    assert _decode_patients_token("123:primary") == (123, PRIMARY_ROUTE)
+
+
+def test_history_token_round_trip():
+    test_date = datetime(2024, 1, 2, 3, 4)
+
+    assert _decode_history_token(
+        _encode_history_token(7, test_date, None)
+    ) == (7, test_date, None)
+    assert _decode_history_token(
+        _encode_history_token(7, test_date, PRIMARY_ROUTE)
+    ) == (7, test_date, PRIMARY_ROUTE)
+
+
+def test_next_route_is_the_pool_actually_read(monkeypatch):
+    replica = FakePool(lag=0)
+    router = AsyncPGReadRouter(FakePool(), replica, max_lag=5,
+                               lag_check_interval=0)
+
+    async def next_route(token_route=None):
+        await router.read_pool(use_primary=token_route == PRIMARY_ROUTE)
+        return _next_route(token_route)
+
+    monkeypatch.setattr(controller, "di", {AsyncPGReadRouter: router})
+    assert asyncio.run(next_route()) is None
+    # Replica behind when the page is read, next pages use the primary
+    replica.lag = 30
+    assert asyncio.run(next_route()) == PRIMARY_ROUTE
+    # Never back to the replica, even once it catches up
+    replica.lag = 0
+    assert asyncio.run(next_route(PRIMARY_ROUTE)) == PRIMARY_ROUTE
@@ -0,0 +1,109 @@
+from datetime import date
+
+from pydantic import ValidationError
+
+from src.building_blokcs.bloom_filter import BloomFilter
+from src.etl.application.dto import PatientDTO
+from src.etl.application.patient_service import PatientService
+from src.etl.domain.patient_repository import IPatientRepository
+from src.etl.infrastructure.rejected_row_sink import validation_reason
+
+
+class FakePatientRepository(IPatientRepository):
+
+    def __init__(self, emails=()):
+        self.emails = list(emails)
+        self.inserted = []
+        self.lookups = []
+
+    def get_patients(self, patient_id, limit=10, use_primary=False):
+        return []
+
+    def insert_patient(self, patients):
+        self.copy_patients(patients)
+
+    def copy_patients(self, patients):
+        self.inserted.extend(patient.email for patient in patients)
+        self.emails.extend(patient.email for patient in patients)
+        return len(patients)
+
+    def count_patients(self):
+        return len(self.emails)
+
+    def iter_emails(self, batch_size=10000):
+        return iter(self.emails)
+
+    def get_existing_emails(self, emails):
+        self.lookups.append(list(emails))
+        return set(emails) & set(self.emails)
+
+
+def patient_dto(email):
+    return PatientDTO(patient_id=0, name="Patient",
+                      date_of_birth=date(1980, 1, 1), gender="female",
+                      address="Main street 1", email=email, phone="555-0100",
+                      sex="female")
+
+
+def test_duplicates_in_the_list_are_skipped():
+    repo = FakePatientRepository()
+    service = PatientService(patient_repo=repo)
+
+    errors, duplicates = service.insert_new_patients(
+        [patient_dto("a@example.com"), patient_dto("a@example.com")],
+        email_filter=service.get_email_filter(expected_new_patients=2)
+    )
+
+    assert errors == []
+    assert [dto.email for dto in duplicates] == ["a@example.com"]
+    assert repo.inserted == ["a@example.com"]
+
+
+def test_filter_candidates_are_resolved_with_one_lookup():
+    repo = FakePatientRepository(emails=["stored@example.com"])
+    # Any email in the filter is a candidate, new@example.com is a false
+    # positive: the filter says it may be stored but it is not
+    email_filter = {"stored@example.com", "new@example.com"}
+
+    _, duplicates = PatientService(patient_repo=repo).insert_new_patients(
+        [patient_dto("stored@example.com"), patient_dto("new@example.com"),
+         patient_dto("other@example.com")],
+        email_filter=email_filter
+    )
+
+    assert repo.lookups == [["stored@example.com", "new@example.com"]]
+    assert [dto.email for dto in duplicates] == ["stored@example.com"]
+    assert repo.inserted == ["new@example.com", "other@example.com"]
+
+
+def test_inserted_emails_are_added_to_the_filter():
+    repo = FakePatientRepository()
+    service = PatientService(patient_repo=repo)
+    email_filter = BloomFilter(capacity=10)
+
+    service.insert_new_patients([patient_dto("a@example.com")],
+                                email_filter=email_filter, bulk=True)
+    _, duplicates = service.insert_new_patients(
+        [patient_dto("a@example.com")], email_filter=email_filter
+    )
+
+    assert "a@example.com" in email_filter
+    assert [dto.email for dto in duplicates] == ["a@example.com"]
+    assert repo.lookups[-1] == ["a@example.com"]
+    assert repo.inserted == ["a@example.com"]
+
+
+def test_validation_errors_are_returned_with_the_patient():
+    repo = FakePatientRepository()
+    invalid = PatientDTO.model_construct(**{
+        **patient_dto("a@example.com").model_dump(), "email": "not an email"
+    })
+
+    errors = PatientService(patient_repo=repo).insert_patient(
+        [invalid, patient_dto("b@example.com")]
+    )
+
+    assert [(dto, type(error)) for dto, error in errors] == \
+        [(invalid, ValidationError)]
+    assert "email" in validation_reason(errors[0][1])
+    assert repo.inserted == ["b@example.com"]
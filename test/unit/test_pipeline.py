@@ -0,0 +1,40 @@
+import pytest
+
+from src.etl.infrastructure.pipeline import run_pipeline
+
+
+def test_items_keep_order():
+    written = []
+
+    run_pipeline(source=range(100),
+                 stages=[lambda x: x * 2, written.append])
+
+    assert written == [x * 2 for x in range(100)]
+
+
+def test_backpressure_bounds_items_in_flight():
+    read = []
+    in_flight = []
+
+    def source():
+        for i in range(50):
+            read.append(i)
+            yield i
+
+    def write(item):
+        in_flight.append(len(read) - item)
+
+    run_pipeline(source=source(), stages=[lambda x: x, write], maxsize=2)
+
+    # Two queues of two items plus one item held by each thread
+    assert max(in_flight) <= 8
+
+
+def test_stage_error_is_raised():
+    def validate(item):
+        if item == 5:
+            raise ValueError("invalid chunk")
+        return item
+
+    with pytest.raises(ValueError, match="invalid chunk"):
+        run_pipeline(source=range(1000), stages=[validate, lambda x: None])
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.etl.domain.biometrics import Biometrics
+from src.etl.infrastructure.postgresql_biometrics_repository import \
+    PostgreSQLBiometricsRepository
+
+
+class FakePool:
+    def __init__(self, max_size=10):
+        self.max_size = max_size
+        self.cursor = MagicMock()
+        self.copied = []
+        self.cursor.copy_expert.side_effect = \
+            lambda query, buffer: self.copied.append(buffer.read())
+
+    @contextmanager
+    def connection(self):
+        connection = MagicMock()
+        connection.cursor.return_value = self.cursor
+        yield connection
+
+    def stats(self):
+        return dict(max_size=self.max_size)
+
+
+def biometrics(patient_id, biometrics_id, glucose):
+    return Biometrics(patient_id=patient_id, biometrics_id=biometrics_id,
+                      test_date=datetime(2024, 1, 1), glucose=glucose)
+
+
+def test_upsert_is_one_statement_and_last_entry_wins():
+    pool = FakePool()
+    PostgreSQLBiometricsRepository(pool).upsert_biometrics([
+        biometrics(1, 10, 100),
+        biometrics(1, None, 110),
+        biometrics(1, 10, 120),
+        biometrics(2, None, 130),
+    ])
+
+    rows = pool.copied[0].splitlines()
+    assert rows == ["1,,2024-01-01 00:00:00,110,,,",
+                    "1,10,2024-01-01 00:00:00,120,,,",
+                    "2,,2024-01-01 00:00:00,130,,,"]
+    # Staging table plus the MERGE
+    assert pool.cursor.execute.call_count == 2
+
+
+def test_delete_copies_only_keys():
+    pool = FakePool()
+    PostgreSQLBiometricsRepository(pool).delete_biometrics(
+        [biometrics(1, 10, 100), biometrics(2, 20, 100)]
+    )
+
+    assert pool.copied == ["1,10\r\n2,20\r\n"]
+    assert pool.cursor.execute.call_count == 2
+
+
+def test_streaming_with_one_connection_fails_before_reading():
+    pool = FakePool(max_size=1)
+
+    with pytest.raises(ValueError, match="max_size >= 2"):
+        next(PostgreSQLBiometricsRepository(pool).iter_dataframe_biometrics())
+
+    pool.cursor.execute.assert_not_called()
@@ -0,0 +1,184 @@
+from types import SimpleNamespace
+
+import pytest
+from psycopg2 import OperationalError, extensions
+from psycopg2.errors import FeatureNotSupported, InvalidSqlStatementName
+
+from src.etl.infrastructure import postgresql_connection_pool
+from src.etl.infrastructure.postgresql_connection_pool import \
+    PostgreSQLConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(
+            transaction_status=extensions.TRANSACTION_STATUS_IDLE
+        )
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeThreadedConnectionPool:
+    created = []
+
+    def __init__(self, min_size, max_size, **connect_kwargs):
+        self.idle = []
+        self.closed = []
+        FakeThreadedConnectionPool.created.append(self)
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else FakeConnection()
+
+    def putconn(self, connection, close=False):
+        (self.closed if close else self.idle).append(connection)
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    FakeThreadedConnectionPool.created = []
+    monkeypatch.setattr(postgresql_connection_pool, "ThreadedConnectionPool",
+                        FakeThreadedConnectionPool)
+    monkeypatch.setattr(postgresql_connection_pool, "_inherited_pools", [])
+
+
+def test_lazy_connect_and_reuse():
+    pool = PostgreSQLConnectionPool(max_size=2)
+    assert FakeThreadedConnectionPool.created == []
+
+    with pool.connection() as first:
+        first.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    assert first.rollbacks == 1
+    assert pool.stats()["checkouts"] == 2
+    assert pool.stats()["in_use"] == 0
+
+
+def test_broken_connection_is_discarded():
+    pool = PostgreSQLConnectionPool()
+    with pool.connection() as connection:
+        connection.closed = 2
+
+    with pool.connection() as new_connection:
+        pass
+
+    assert new_connection is not connection
+    assert pool.stats()["discarded"] == 1
+
+
+def test_pool_recreated_after_fork():
+    pool = PostgreSQLConnectionPool()
+    with pool.connection():
+        pass
+
+    # Same as running in a forked process
+    pool._pid = -1
+    with pool.connection():
+        pass
+
+    assert len(FakeThreadedConnectionPool.created) == 2
+    # Still referenced, the parent connections are never finalized
+    inherited = FakeThreadedConnectionPool.created[0]
+    assert postgresql_connection_pool._inherited_pools == [inherited]
+    assert inherited.closed == []
+
+
+def test_checkout_fails_when_no_connection_is_healthy(monkeypatch):
+    pool = PostgreSQLConnectionPool(max_size=2)
+    monkeypatch.setattr(pool, "_is_healthy", lambda connection: False)
+
+    with pytest.raises(OperationalError, match="No healthy"):
+        with pool.connection():
+            pass
+
+    assert pool.stats()["discarded"] == 2
+    assert pool.stats()["in_use"] == 0
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+
+def test_statement_prepared_once_per_connection():
+    pool = PostgreSQLConnectionPool()
+    query = "SELECT * FROM kannact.patients WHERE patient_id>%s LIMIT %s"
+    with pool.connection() as connection:
+        cursor = FakeCursor(connection)
+        pool.execute_prepared(cursor, "get_patients", query, (1, 10))
+        pool.execute_prepared(cursor, "get_patients", query, (2, 10))
+    other_cursor = FakeCursor(FakeConnection())
+    pool.execute_prepared(other_cursor, "get_patients", query, (1, 10))
+
+    assert len(cursor.executed) == 3
+    assert cursor.executed[1][1] == (1, 10)
+    assert len(other_cursor.executed) == 2
+    assert pool.stats()["prepares"] == 2
+    assert pool.stats()["prepared_executes"] == 3
+
+
+def test_prepared_statements_disabled():
+    pool = PostgreSQLConnectionPool(prepare_statements=False)
+    cursor = FakeCursor(FakeConnection())
+    pool.execute_prepared(cursor, "get_patients", "SELECT %s", (1,))
+
+    assert cursor.executed == [("SELECT %s", (1,))]
+    assert pool.stats()["prepares"] == 0
+
+
+class InvalidatingCursor(FakeCursor):
+    def __init__(self, connection, error, fail_at):
+        super().__init__(connection)
+        self.error = error
+        self.fail_at = fail_at
+
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        if len(self.executed) - 1 == self.fail_at:
+            raise self.error
+
+
+@pytest.mark.parametrize("error, statements", [
+    # Result columns changed, the old statement is deallocated first
+    (FeatureNotSupported, 6),
+    # Deallocated in the server (DISCARD ALL)
+    (InvalidSqlStatementName, 5),
+])
+def test_invalidated_statement_is_prepared_again(error, statements):
+    pool = PostgreSQLConnectionPool()
+    connection = FakeConnection()
+    # Fails the EXECUTE of the second call
+    cursor = InvalidatingCursor(connection, error(), fail_at=2)
+    query = "SELECT patient_id FROM kannact.patients WHERE patient_id=%s"
+
+    pool.execute_prepared(cursor, "get_patient", query, (1,))
+    pool.execute_prepared(cursor, "get_patient", query, (2,))
+
+    assert len(cursor.executed) == statements
+    assert cursor.executed[-1][1] == (2,)
+    assert connection.rollbacks == 1
+    assert pool.stats()["prepares"] == 2
+
+
+@pytest.mark.parametrize("query, params", [
+    ("SELECT name FROM kannact.patients WHERE name LIKE 'a%%'", ()),
+    ("SELECT %s, %s", (1,)),
+])
+def test_prepared_query_placeholders_are_checked(query, params):
+    pool = PostgreSQLConnectionPool()
+    cursor = FakeCursor(FakeConnection())
+
+    with pytest.raises(ValueError, match="one %s per parameter"):
+        pool.execute_prepared(cursor, "query", query, params)
+
+    assert cursor.executed == []
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+from psycopg2 import OperationalError
+
+from src.etl.infrastructure.postgresql_read_router import \
+    PostgreSQLReadRouter
+
+
+class FakePool:
+    def __init__(self, lag: float = 0):
+        self.lag = lag
+        self.checks = 0
+
+    @contextmanager
+    def connection(self):
+        self.checks += 1
+        if self.lag is None:
+            raise OperationalError("could not connect to server")
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (self.lag,)
+        yield connection
+
+
+def test_reads_use_fresh_replica():
+    primary, replica = FakePool(), FakePool(lag=1)
+    router = PostgreSQLReadRouter(primary, replica, max_lag=5)
+
+    assert router.read_pool() is replica
+    assert router.read_pool(use_primary=True) is primary
+    assert router.stats()["replica_reads"] == 1
+    assert router.stats()["stale_fallbacks"] == 0
+
+
+def test_stale_or_unreachable_replica_falls_back_to_primary():
+    primary, replica = FakePool(), FakePool(lag=30)
+    router = PostgreSQLReadRouter(primary, replica, max_lag=5,
+                                  lag_check_interval=0)
+    assert router.read_pool() is primary
+
+    replica.lag = None
+    assert router.read_pool() is primary
+    assert router.stats()["stale_fallbacks"] == 2
+
+
+def test_lag_checked_once_per_interval():
+    replica = FakePool()
+    router = PostgreSQLReadRouter(FakePool(), replica,
+                                  lag_check_interval=60)
+    for _ in range(3):
+        router.read_pool()
+
+    assert replica.checks == 1
+
+
+def test_without_replica_reads_use_primary():
+    primary = FakePool()
+    router = PostgreSQLReadRouter(primary)
+
+    assert router.read_pool() is primary
+    assert router.stats()["stale_fallbacks"] == 0
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.building_blokcs.quantile_sketch import HistogramSketch
+
+
+def test_quantiles_same_as_numpy():
+    values = np.random.default_rng(1).integers(55, 300, size=1001)
+    sketch = HistogramSketch(54, 300)
+    sketch.add(values)
+
+    assert sketch.quantile(0.5) == int(np.median(values))
+    assert sketch.quantile(0.95) == int(
+        np.percentile(values, 95, method="inverted_cdf")
+    )
+
+
+def test_merge_and_serialization():
+    first, second = HistogramSketch(50, 230), HistogramSketch(50, 230)
+    first.add([120, 130])
+    second.add([110, 140, 150])
+
+    merged = HistogramSketch.from_bytes(first.merge(second).to_bytes(), 50, 230)
+
+    assert len(merged) == 5
+    assert merged.quantile(0.5) == 130
+    assert HistogramSketch(50, 230).quantile(0.5) is None
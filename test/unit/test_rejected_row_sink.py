@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from src.etl.infrastructure.rejected_row_sink import NDJSONRejectedRowSink
+
+
+def test_rejected_rows_are_appended(tmp_path):
+    file_path = tmp_path / "rejected.ndjson"
+    df = DataFrame({"patient_id": [1, np.nan],
+                    "glucose": [20, 100],
+                    "reason": ["glucose_out_of_range", "patient_id_invalid"]},
+                   index=[3, 7])
+
+    with NDJSONRejectedRowSink(str(file_path), flush_size=1) as sink:
+        sink.put_dataframe(source="biometrics.csv", df=df)
+        sink.put(source="biometrics.csv", line_number=12, reason="bad date",
+                 row={"patient_id": 1, "weight": float("nan")})
+
+    with NDJSONRejectedRowSink(str(file_path)) as sink:
+        sink.put(source="biometrics.csv", line_number=13, reason="bad date",
+                 row={"patient_id": 2})
+
+    entries = [json.loads(line) for line in file_path.read_text().splitlines()]
+
+    assert [e["line_number"] for e in entries] == [5, 9, 12, 13]
+    assert entries[0]["reason"] == "glucose_out_of_range"
+    assert entries[1]["row"]["patient_id"] is None
+    assert entries[2]["row"]["weight"] is None
+
+
+def test_unwritable_path_fails_in_constructor(tmp_path):
+    with pytest.raises(OSError):
+        NDJSONRejectedRowSink(str(tmp_path / "missing" / "rejected.ndjson"))
+
+
+def test_write_errors_are_raised_without_blocking(tmp_path):
+    sink = NDJSONRejectedRowSink(str(tmp_path / "rejected.ndjson"),
+                                 flush_size=1, max_pending_flushes=1)
+    sink._file.close()
+
+    with pytest.raises(ValueError, match="closed file"):
+        for line_number in range(10):
+            sink.put(source="patients.json", line_number=line_number,
+                     reason="bad email", row={"email": "x"})
+        sink.close()
@@ -0,0 +1,267 @@
+"""
+Same behaviour for every repository backend. The PostgreSQL backend is only
+checked when KANNACT_TEST_DSN points to a database with the kannact schema
+(its tables are truncated).
+"""
+import os
+from datetime import date, datetime
+
+import pytest
+from pandas import DataFrame, Index
+
+from src.etl.application.biometrics_columns import BIOMETRICS_DATAFRAME_DTYPES
+from src.etl.domain.biometrics import Biometrics
+from src.etl.domain.patient import Patient
+from src.etl.infrastructure.in_memory_biometrics_repository import \
+    InMemoryBiometricsRepository
+from src.etl.infrastructure.in_memory_patient_repository import \
+    InMemoryPatientRepository
+from src.etl.infrastructure.sqlite_biometrics_repository import \
+    SQLiteBiometricsRepository
+from src.etl.infrastructure.sqlite_database import SQLiteDatabase
+from src.etl.infrastructure.sqlite_patient_repository import \
+    SQLitePatientRepository
+
+TEST_DSN = os.environ.get("KANNACT_TEST_DSN")
+TABLES = ["patients", "biometrics", "biometrics_analytics",
+          "biometrics_analytics_window", "biometrics_analytics_state",
+          "biometrics_watermark", "biometrics_sketch"]
+
+
+def postgresql_repositories():
+    from src.etl.infrastructure.postgresql_biometrics_repository import \
+        PostgreSQLBiometricsRepository
+    from src.etl.infrastructure.postgresql_connection_pool import \
+        PostgreSQLConnectionPool
+    from src.etl.infrastructure.postgresql_patient_repository import \
+        PostgreSQLPatientRepository
+
+    pool = PostgreSQLConnectionPool(dsn=TEST_DSN)
+    with pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "TRUNCATE " + ", ".join(f"kannact.{t}" for t in TABLES)
+                + " RESTART IDENTITY"
+            )
+        connection.commit()
+    return (PostgreSQLBiometricsRepository(pool),
+            PostgreSQLPatientRepository(pool))
+
+
+def sqlite_repositories():
+    database = SQLiteDatabase()
+    return (SQLiteBiometricsRepository(database),
+            SQLitePatientRepository(database))
+
+
+def in_memory_repositories():
+    patient_repo = InMemoryPatientRepository()
+    return InMemoryBiometricsRepository(patient_repo), patient_repo
+
+
+@pytest.fixture(params=[
+    in_memory_repositories,
+    sqlite_repositories,
+    pytest.param(postgresql_repositories, marks=pytest.mark.skipif(
+        not TEST_DSN, reason="KANNACT_TEST_DSN is not set"
+    )),
+], ids=["memory", "sqlite", "postgresql"])
+def repositories(request):
+    return request.param()
+
+
+@pytest.fixture
+def biometrics_repo(repositories):
+    # Biometrics reference patients, ids 1 to 4 are used by the tests
+    repositories[1].copy_patients(
+        [patient(f"patient{i}@example.com") for i in range(4)]
+    )
+    return repositories[0]
+
+
+@pytest.fixture
+def patient_repo(repositories):
+    return repositories[1]
+
+
+def biometrics(patient_id, glucose=100, biometrics_id=None, day=1):
+    return Biometrics(patient_id=patient_id, biometrics_id=biometrics_id,
+                      test_date=datetime(2024, 1, day), glucose=glucose,
+                      systolic=120, diastolic=80, weight=70000)
+
+
+def patient(email):
+    return Patient(name="Patient", date_of_birth=date(1980, 1, 1),
+                   gender="female", address="Main street 1", email=email,
+                   phone="555-0100", sex="female")
+
+
+def glucose(repo, patient_id):
+    return [(b.biometrics_id, b.glucose)
+            for b in repo.get_biometrics(patient_id, limit=100)]
+
+
+def test_biometrics_pages_follow_biometrics_id(biometrics_repo):
+    assert biometrics_repo.copy_biometrics(
+        [biometrics(1, 100), biometrics(2, 110), biometrics(1, 120),
+         biometrics(1, 130)]
+    ) == 4
+
+    first = biometrics_repo.get_biometrics(1, limit=2)
+    last = first[-1]
+    second = biometrics_repo.get_biometrics(
+        1, last.biometrics_id, last.test_date, limit=2
+    )
+
+    assert [(b.biometrics_id, b.glucose) for b in first + second] == \
+        [(1, 100), (3, 120), (4, 130)]
+    assert first[0].test_date == datetime(2024, 1, 1)
+    assert biometrics_repo.get_biometrics(3) == []
+
+
+def test_biometrics_must_reference_a_patient(biometrics_repo):
+    # ValueError (memory), IntegrityError (sqlite3 and psycopg2)
+    with pytest.raises(Exception, match="(?i)foreign key|not present"):
+        biometrics_repo.copy_biometrics([biometrics(1), biometrics(5)])
+    with pytest.raises(Exception, match="(?i)foreign key|not present"):
+        biometrics_repo.upsert_biometrics([biometrics(1, 150, 1),
+                                           biometrics(5)])
+
+    assert biometrics_repo.get_patient_id_range() is None
+
+
+def test_parquet_export_replaces_the_previous_one(biometrics_repo, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    biometrics_repo.copy_biometrics([biometrics(1, 100), biometrics(2, 110),
+                                     biometrics(1, 120, day=2)])
+    root_path = str(tmp_path / "biometrics")
+
+    assert biometrics_repo.export_biometrics_parquet(root_path,
+                                                     chunk_size=2) == 3
+    assert biometrics_repo.export_biometrics_parquet(root_path,
+                                                     chunk_size=2) == 3
+
+    assert pq.read_table(root_path).num_rows == 3
+    assert [p.name for p in tmp_path.iterdir()] == ["biometrics"]
+
+
+def test_update_upsert_and_delete_biometrics(biometrics_repo):
+    biometrics_repo.copy_biometrics([biometrics(1, 100), biometrics(1, 110),
+                                     biometrics(2, 120)])
+
+    # Wrong patient_id does not match
+    biometrics_repo.update_biometrics([biometrics(1, 101, 1),
+                                       biometrics(1, 200, 3)])
+    # Last entry wins, unknown entries are inserted
+    biometrics_repo.upsert_biometrics([biometrics(1, 111, 2),
+                                       biometrics(1, 112, 2),
+                                       biometrics(1, 140)])
+    biometrics_repo.delete_biometrics([biometrics(2, biometrics_id=3)])
+
+    assert glucose(biometrics_repo, 1) == [(1, 101), (2, 112), (4, 140)]
+    assert glucose(biometrics_repo, 2) == []
+
+
+def test_dataframe_biometrics(biometrics_repo):
+    assert biometrics_repo.copy_biometrics_dataframe(DataFrame({
+        "patient_id": [1, 2, 3, 4],
+        "test_date": [date(2024, 1, 1)] * 4,
+        "glucose": [100, None, 120, 130],
+        "systolic": [120] * 4, "diastolic": [80] * 4, "weight": [None] * 4,
+    })) == 4
+
+    df = biometrics_repo.get_dataframe_biometrics(
+        min_biometrics_id=1, max_patient_id=3
+    ).sort_values("biometrics_id")
+    assert df["patient_id"].tolist() == [2, 3]
+    assert df["glucose"].isna().tolist() == [True, False]
+    assert biometrics_repo.get_dataframe_biometrics(
+        patient_ids=[4, 5])["glucose"].tolist() == [130]
+
+    chunks = list(biometrics_repo.iter_dataframe_biometrics(
+        chunk_size=3, max_biometrics_id=4, order_by_patient=True
+    ))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert chunks[0].dtypes.to_dict() == BIOMETRICS_DATAFRAME_DTYPES
+    assert biometrics_repo.get_patient_id_range() == (1, 4)
+    assert biometrics_repo.get_settled_biometrics_id() == 4
+
+
+def test_analytics(biometrics_repo):
+    assert biometrics_repo.get_patient_id_range() is None
+    assert biometrics_repo.get_settled_biometrics_id() is None
+    biometrics_repo.copy_biometrics([biometrics(1, 100), biometrics(1, 111),
+                                     biometrics(2, 120)])
+
+    biometrics_repo.aggregate_biometrics_analytics()
+
+    analytics = biometrics_repo.get_biometrics_analytics(1)
+    assert (analytics.glucose_mean, analytics.glucose_min,
+            analytics.glucose_max) == (105, 100, 111)
+    assert biometrics_repo.get_biometrics_analytics(3) is None
+
+    biometrics_repo.delete_biometrics_analytics([1])
+    assert biometrics_repo.get_biometrics_analytics(1) is None
+    assert biometrics_repo.get_biometrics_analytics(2).glucose_mean == 120
+
+
+def test_analytics_state_and_watermark(biometrics_repo):
+    state = DataFrame({"glucose_count": [2], "glucose_sum": [210]},
+                      index=Index([1], name="patient_id"))
+    assert biometrics_repo.get_biometrics_watermark("job") is None
+
+    biometrics_repo.save_biometrics_analytics_state(state, "job", 7)
+    biometrics_repo.save_biometrics_analytics_state(state * 2, "job")
+
+    saved = biometrics_repo.get_biometrics_analytics_state([1, 2])
+    assert saved.index.tolist() == [1]
+    assert saved.loc[1, "glucose_sum"] == 420
+    assert biometrics_repo.get_biometrics_watermark("job") == 7
+
+
+def test_sketches(biometrics_repo):
+    sketches = DataFrame({"glucose": [b"a"], "systolic": [b"b"],
+                          "diastolic": [b"c"]},
+                         index=Index([1], name="patient_id"))
+
+    biometrics_repo.save_biometrics_sketches(sketches, "sketch", 3)
+
+    saved = biometrics_repo.get_biometrics_sketches([1, 2])
+    assert saved.index.tolist() == [1]
+    assert bytes(saved.loc[1, "systolic"]) == b"b"
+    assert biometrics_repo.get_biometrics_watermark("sketch") == 3
+
+
+def test_windows_are_replaced(biometrics_repo):
+    biometrics_repo.copy_biometrics([biometrics(1, 100, day=1),
+                                     biometrics(1, 120, day=20)])
+    recent = biometrics_repo.get_dataframe_recent_biometrics(date(2024, 1, 10))
+    assert recent["glucose"].tolist() == [120]
+
+    window = DataFrame({"patient_id": [1, 2], "window_days": [7, 7],
+                        "glucose_mean": [120, 130]})
+    biometrics_repo.replace_biometrics_analytics_windows(window,
+                                                         date(2024, 1, 20))
+    biometrics_repo.replace_biometrics_analytics_windows(window[:1],
+                                                         date(2024, 1, 21))
+
+    windows = biometrics_repo.get_biometrics_analytics_windows(1)
+    assert [(w.window_days, w.as_of, w.glucose_mean) for w in windows] == \
+        [(7, date(2024, 1, 21), 120)]
+    assert biometrics_repo.get_biometrics_analytics_windows(2) == []
+
+
+def test_patients(patient_repo):
+    assert patient_repo.copy_patients(
+        [patient(f"patient{i}@example.com") for i in range(3)]
+    ) == 3
+
+    page = patient_repo.get_patients(1, limit=1)
+    assert [p.patient_id for p in page] == [2]
+    assert page[0].email == "patient1@example.com"
+    assert patient_repo.count_patients() == 3
+    assert sorted(patient_repo.iter_emails(batch_size=2)) == \
+        [f"patient{i}@example.com" for i in range(3)]
+    assert patient_repo.get_existing_emails(
+        ["patient2@example.com", "new@example.com"]
+    ) == {"patient2@example.com"}
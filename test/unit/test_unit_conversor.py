@@ -0,0 +1,29 @@
+import numpy as np
+from pandas import Series
+
+from src.building_blokcs.unit_conversor import normalize_weight_to_grams, \
+    pounds_to_grams, kilograms_to_grams
+
+
+def test_same_truncation_than_scalar_functions():
+    values = Series([73.1, 160.0, 1.001, 399.999])
+
+    assert normalize_weight_to_grams(values).tolist() == [
+        kilograms_to_grams(v) for v in values
+    ]
+    assert normalize_weight_to_grams(values, default_unit="imperial").tolist() \
+        == [pounds_to_grams(v) for v in values]
+
+
+def test_mixed_units():
+    values = Series(["160 lb", "72.5 kg", " 72.5KG ", "72500g", 70, "70",
+                     "80 stone", "abc", None], dtype=object)
+    units = Series([None, None, None, None, "lbs", "pounds", None, None,
+                    None])
+
+    grams = normalize_weight_to_grams(values, units=units)
+
+    assert grams[:6].tolist() == [pounds_to_grams(160), 72500, 72500, 72500,
+                                  pounds_to_grams(70), pounds_to_grams(70)]
+    # Unknown unit or value not parsed
+    assert np.isnan(grams[6:]).all()